@@ -0,0 +1,46 @@
+"""Add vehicle_latest_location projection
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'vehicle_latest_location',
+        sa.Column('vehicle_id', sa.String(), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('speed', sa.Float(), nullable=True),
+        sa.Column('heading', sa.Float(), nullable=True),
+        sa.Column('altitude', sa.Float(), nullable=True),
+        sa.Column('accuracy', sa.Float(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('vehicle_id')
+    )
+
+    # Backfill from history: newest fix per vehicle
+    op.execute("""
+        INSERT INTO vehicle_latest_location
+            (vehicle_id, latitude, longitude, speed, heading, altitude, accuracy, timestamp)
+        SELECT DISTINCT ON (vehicle_id)
+            vehicle_id, latitude, longitude, speed, heading, altitude, accuracy, timestamp
+        FROM vehicle_locations
+        ORDER BY vehicle_id, timestamp DESC, id DESC
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('vehicle_latest_location')
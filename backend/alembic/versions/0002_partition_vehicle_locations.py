@@ -0,0 +1,118 @@
+"""Partition vehicle_locations by timestamp
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keep the id sequence alive while the old table is swapped out
+    op.execute("ALTER SEQUENCE vehicle_locations_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE vehicle_locations RENAME TO vehicle_locations_legacy")
+    op.execute("ALTER INDEX IF EXISTS ix_vehicle_locations_id RENAME TO ix_vehicle_locations_legacy_id")
+    op.execute("ALTER INDEX IF EXISTS ix_vehicle_locations_vehicle_id RENAME TO ix_vehicle_locations_legacy_vehicle_id")
+    op.execute("ALTER TABLE vehicle_locations_legacy RENAME CONSTRAINT vehicle_locations_pkey TO vehicle_locations_legacy_pkey")
+
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE vehicle_locations (
+            id BIGINT NOT NULL DEFAULT nextval('vehicle_locations_id_seq'),
+            vehicle_id VARCHAR NOT NULL,
+            latitude DOUBLE PRECISION NOT NULL,
+            longitude DOUBLE PRECISION NOT NULL,
+            speed DOUBLE PRECISION,
+            heading DOUBLE PRECISION,
+            altitude DOUBLE PRECISION,
+            accuracy DOUBLE PRECISION,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("ALTER SEQUENCE vehicle_locations_id_seq OWNED BY vehicle_locations.id")
+    # The serial sequence tops out at 2^31 - 1 even though the column is now BIGINT
+    op.execute("ALTER SEQUENCE vehicle_locations_id_seq AS bigint")
+
+    # Declared on the parent, so every partition gets its own copy
+    op.execute("""
+        CREATE INDEX ix_vehicle_locations_vehicle_id_timestamp
+        ON vehicle_locations (vehicle_id, timestamp DESC)
+    """)
+
+    # Monthly partitions covering existing history plus three months ahead;
+    # PartitionMaintenanceService keeps extending the window from here. Months
+    # and bounds are UTC, like the service's, whatever the session TimeZone.
+    op.execute("""
+        DO $$
+        DECLARE
+            month_start DATE := date_trunc('month', COALESCE(
+                (SELECT min(timestamp) FROM vehicle_locations_legacy), now()
+            ) AT TIME ZONE 'UTC')::date;
+            last_month DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF vehicle_locations '
+                    'FOR VALUES FROM (%L) TO (%L)',
+                    'vehicle_locations_p' || to_char(month_start, 'YYYYMM'),
+                    month_start::timestamp AT TIME ZONE 'UTC',
+                    (month_start + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+        END $$
+    """)
+
+    # Catches fixes with timestamps outside the maintained window (bad device clocks)
+    op.execute("CREATE TABLE vehicle_locations_default PARTITION OF vehicle_locations DEFAULT")
+
+    op.execute("""
+        INSERT INTO vehicle_locations
+            (id, vehicle_id, latitude, longitude, speed, heading, altitude, accuracy, timestamp, created_at)
+        SELECT id, vehicle_id, latitude, longitude, speed, heading, altitude, accuracy, timestamp, created_at
+        FROM vehicle_locations_legacy
+    """)
+    op.drop_table('vehicle_locations_legacy')
+
+
+def downgrade() -> None:
+    # Fails once ids have passed the integer range, which the INTEGER column could not hold anyway
+    op.execute("ALTER SEQUENCE vehicle_locations_id_seq AS integer")
+    op.execute("ALTER SEQUENCE vehicle_locations_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE vehicle_locations RENAME TO vehicle_locations_partitioned")
+
+    op.create_table(
+        'vehicle_locations',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('vehicle_locations_id_seq')"), nullable=False),
+        sa.Column('vehicle_id', sa.String(), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('speed', sa.Float(), nullable=True),
+        sa.Column('heading', sa.Float(), nullable=True),
+        sa.Column('altitude', sa.Float(), nullable=True),
+        sa.Column('accuracy', sa.Float(), nullable=True),
+        sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_vehicle_locations_id', 'vehicle_locations', ['id'], unique=False)
+    op.create_index('ix_vehicle_locations_vehicle_id', 'vehicle_locations', ['vehicle_id'], unique=False)
+    op.execute("""
+        INSERT INTO vehicle_locations
+            (id, vehicle_id, latitude, longitude, speed, heading, altitude, accuracy, timestamp, created_at)
+        SELECT id, vehicle_id, latitude, longitude, speed, heading, altitude, accuracy, timestamp, created_at
+        FROM vehicle_locations_partitioned
+    """)
+    op.execute("ALTER SEQUENCE vehicle_locations_id_seq OWNED BY vehicle_locations.id")
+    op.execute("DROP TABLE vehicle_locations_partitioned CASCADE")
@@ -0,0 +1,39 @@
+"""Add vehicle_location_rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'vehicle_location_rollups',
+        sa.Column('vehicle_id', sa.String(), nullable=False),
+        sa.Column('resolution', sa.String(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('min_speed', sa.Float(), nullable=True),
+        sa.Column('avg_speed', sa.Float(), nullable=True),
+        sa.Column('max_speed', sa.Float(), nullable=True),
+        sa.Column('distance_m', sa.Float(), nullable=True),
+        sa.Column('point_count', sa.Integer(), nullable=False),
+        sa.Column('last_timestamp', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('vehicle_id', 'resolution', 'bucket_start')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('vehicle_location_rollups')
@@ -0,0 +1,58 @@
+"""Add hourly event counters and backfill them from existing events
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'event_counters',
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('event_type', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket_start', 'source', 'event_type')
+    )
+    op.create_table(
+        'vehicle_activity_buckets',
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('vehicle_id', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('bucket_start', 'vehicle_id')
+    )
+
+    # Backfill UTC hours, like EventCounterService.bucket_start (a bare
+    # date_trunc on timestamptz would follow the session TimeZone)
+    op.execute("""
+        INSERT INTO event_counters (bucket_start, source, event_type, count)
+        SELECT date_trunc('hour', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', 'geofence', event_type, count(*)
+        FROM geofence_events
+        GROUP BY 1, 3
+    """)
+    op.execute("""
+        INSERT INTO event_counters (bucket_start, source, event_type, count)
+        SELECT date_trunc('hour', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', 'activity', activity_type, count(*)
+        FROM activity_logs
+        GROUP BY 1, 3
+    """)
+    op.execute("""
+        INSERT INTO vehicle_activity_buckets (bucket_start, vehicle_id)
+        SELECT DISTINCT date_trunc('hour', timestamp AT TIME ZONE 'UTC') AT TIME ZONE 'UTC', vehicle_id
+        FROM activity_logs
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('vehicle_activity_buckets')
+    op.drop_table('event_counters')
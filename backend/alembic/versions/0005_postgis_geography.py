@@ -0,0 +1,65 @@
+"""Add PostGIS geography columns, GiST indexes and a geofences table
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Stored generated columns: existing rows are backfilled by the table rewrite
+# and new rows (INSERT and COPY alike) get them without touching the writers.
+GEOGRAPHY_POINT = (
+    "geography(Point, 4326) GENERATED ALWAYS AS "
+    "(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography) STORED"
+)
+POINT_TABLES = ('vehicle_locations', 'vehicle_latest_location', 'geofence_events')
+
+
+def _postgis_available() -> bool:
+    bind = op.get_bind()
+    return bind.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")
+    ).scalar() is not None
+
+
+def upgrade() -> None:
+    # Fail rather than record 0005 as applied without its columns; the
+    # docker-compose image (postgis/postgis) ships the extension
+    if not _postgis_available():
+        raise RuntimeError(
+            "Migration 0005 needs the PostGIS extension, which this PostgreSQL server "
+            "does not provide. Install PostGIS (e.g. use the postgis/postgis image) and re-run the upgrade."
+        )
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+
+    for table in POINT_TABLES:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS geog {GEOGRAPHY_POINT}")
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_geog ON {table} USING gist (geog)")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS geofences (
+            name varchar PRIMARY KEY,
+            kind varchar NOT NULL,
+            geog geography(Geometry, 4326) NOT NULL,
+            radius double precision,
+            updated_at timestamptz DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_geofences_geog ON geofences USING gist (geog)")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS geofences")
+    for table in POINT_TABLES:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_geog")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS geog")
@@ -1,48 +1,78 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_async_db
 from ..models.vehicle import GeofenceEvent, ActivityLog
+from ..services.event_counter_service import event_counter_service
+from .pagination import fetch_page, keyset, ndjson_response, page_limit
 
 router = APIRouter(prefix="/events", tags=["events"])
 
 
+def _serialize_event(event: GeofenceEvent) -> dict:
+    return {
+        "id": event.id,
+        "vehicle_id": event.vehicle_id,
+        "event_type": event.event_type,
+        "latitude": event.latitude,
+        "longitude": event.longitude,
+        "geofence_name": event.geofence_name,
+        "timestamp": event.timestamp.isoformat(),
+        "notification_sent": event.notification_sent
+    }
+
+
+def _serialize_activity(activity: ActivityLog) -> dict:
+    return {
+        "id": activity.id,
+        "vehicle_id": activity.vehicle_id,
+        "activity_type": activity.activity_type,
+        "description": activity.description,
+        "latitude": activity.latitude,
+        "longitude": activity.longitude,
+        "metadata": activity.metadata,
+        "timestamp": activity.timestamp.isoformat()
+    }
+
+
 @router.get("/geofence")
 async def get_geofence_events(
     hours: int = Query(24, description="Number of hours of events to retrieve"),
     vehicle_id: Optional[str] = Query(None, description="Filter by specific vehicle ID"),
     event_type: Optional[str] = Query(None, description="Filter by event type (enter/exit)"),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, description="Page size (json) or maximum rows (ndjson)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", description="json (paginated) or ndjson (streamed)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get geofence events"""
     since = datetime.utcnow() - timedelta(hours=hours)
     
-    query = db.query(GeofenceEvent).filter(GeofenceEvent.timestamp >= since)
+    query = select(GeofenceEvent).where(GeofenceEvent.timestamp >= since)
     
     if vehicle_id:
-        query = query.filter(GeofenceEvent.vehicle_id == vehicle_id)
+        query = query.where(GeofenceEvent.vehicle_id == vehicle_id)
     
     if event_type:
-        query = query.filter(GeofenceEvent.event_type == event_type)
+        query = query.where(GeofenceEvent.event_type == event_type)
     
-    events = query.order_by(GeofenceEvent.timestamp.desc()).all()
+    query = keyset(query, GeofenceEvent.timestamp, GeofenceEvent.id, cursor=cursor)
+
+    if format == "ndjson":
+        return ndjson_response(query, _serialize_event, limit)
+
+    events, next_cursor = await fetch_page(
+        db, query, page_limit(limit, settings.page_size_default),
+        lambda event: (event.timestamp, event.id)
+    )
     
     return {
-        "events": [
-            {
-                "id": event.id,
-                "vehicle_id": event.vehicle_id,
-                "event_type": event.event_type,
-                "latitude": event.latitude,
-                "longitude": event.longitude,
-                "geofence_name": event.geofence_name,
-                "timestamp": event.timestamp.isoformat(),
-                "notification_sent": event.notification_sent
-            }
-            for event in events
-        ],
-        "count": len(events)
+        "events": [_serialize_event(event) for event in events],
+        "count": len(events),
+        "next_cursor": next_cursor
     }
 
 
@@ -51,73 +81,50 @@ async def get_activity_log(
     hours: int = Query(24, description="Number of hours of activity to retrieve"),
     vehicle_id: Optional[str] = Query(None, description="Filter by specific vehicle ID"),
     activity_type: Optional[str] = Query(None, description="Filter by activity type"),
-    limit: int = Query(100, description="Maximum number of activities to return"),
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, description="Maximum number of activities to return (page size)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", description="json (paginated) or ndjson (streamed)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get activity log"""
     since = datetime.utcnow() - timedelta(hours=hours)
     
-    query = db.query(ActivityLog).filter(ActivityLog.timestamp >= since)
+    query = select(ActivityLog).where(ActivityLog.timestamp >= since)
     
     if vehicle_id:
-        query = query.filter(ActivityLog.vehicle_id == vehicle_id)
+        query = query.where(ActivityLog.vehicle_id == vehicle_id)
     
     if activity_type:
-        query = query.filter(ActivityLog.activity_type == activity_type)
+        query = query.where(ActivityLog.activity_type == activity_type)
     
-    activities = query.order_by(ActivityLog.timestamp.desc()).limit(limit).all()
+    query = keyset(query, ActivityLog.timestamp, ActivityLog.id, cursor=cursor)
+
+    if format == "ndjson":
+        return ndjson_response(query, _serialize_activity, limit)
+
+    activities, next_cursor = await fetch_page(
+        db, query, page_limit(limit, 100),
+        lambda activity: (activity.timestamp, activity.id)
+    )
     
     return {
-        "activities": [
-            {
-                "id": activity.id,
-                "vehicle_id": activity.vehicle_id,
-                "activity_type": activity.activity_type,
-                "description": activity.description,
-                "latitude": activity.latitude,
-                "longitude": activity.longitude,
-                "metadata": activity.metadata,
-                "timestamp": activity.timestamp.isoformat()
-            }
-            for activity in activities
-        ],
-        "count": len(activities)
+        "activities": [_serialize_activity(activity) for activity in activities],
+        "count": len(activities),
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/summary")
 async def get_events_summary(
     hours: int = Query(24, description="Number of hours to summarize"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get summary of events and activities"""
     since = datetime.utcnow() - timedelta(hours=hours)
+    counters = await event_counter_service.summary(db, since)
     
-    # Get geofence event counts
-    geofence_enters = db.query(GeofenceEvent).filter(
-        GeofenceEvent.timestamp >= since,
-        GeofenceEvent.event_type == "enter"
-    ).count()
-    
-    geofence_exits = db.query(GeofenceEvent).filter(
-        GeofenceEvent.timestamp >= since,
-        GeofenceEvent.event_type == "exit"
-    ).count()
-    
-    # Get activity counts by type
-    activities_by_type = db.query(
-        ActivityLog.activity_type,
-        db.func.count(ActivityLog.id).label('count')
-    ).filter(
-        ActivityLog.timestamp >= since
-    ).group_by(ActivityLog.activity_type).all()
-    
-    # Get unique vehicles with activity
-    active_vehicles = db.query(
-        ActivityLog.vehicle_id
-    ).filter(
-        ActivityLog.timestamp >= since
-    ).distinct().count()
+    geofence_enters = counters["geofence"].get("enter", 0)
+    geofence_exits = counters["geofence"].get("exit", 0)
     
     return {
         "summary_period_hours": hours,
@@ -126,10 +133,7 @@ async def get_events_summary(
             "exits": geofence_exits,
             "total": geofence_enters + geofence_exits
         },
-        "activities_by_type": {
-            activity_type: count for activity_type, count in activities_by_type
-        },
-        "active_vehicles": active_vehicles,
+        "activities_by_type": counters["activity"],
+        "active_vehicles": counters["active_vehicles"],
         "generated_at": datetime.utcnow().isoformat()
     }
-
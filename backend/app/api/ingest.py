@@ -0,0 +1,148 @@
+import json
+import math
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Request
+from ..core.config import settings
+from ..core.database import async_pool_stats
+from ..services.ingestion_service import ingestion_service
+from ..services.tracking_service import tracking_service
+
+router = APIRouter(prefix="/ingest", tags=["ingest"])
+
+LOCATION_FIELDS = (
+    "speed", "heading", "altitude", "accuracy",
+    "driver_name", "license_plate", "vehicle_type"
+)
+
+
+def _decode_body(body: bytes, content_encoding: str) -> bytes:
+    """Decompress a gzip body, refusing anything larger than the configured limit"""
+    max_bytes = settings.ingest_max_batch_bytes
+    if "gzip" in content_encoding.lower() or body[:2] == b"\x1f\x8b":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            data = decompressor.decompress(body, max_bytes + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Invalid gzip body")
+        if len(data) > max_bytes or decompressor.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="Batch exceeds maximum size")
+        return data
+
+    if len(body) > max_bytes:
+        raise HTTPException(status_code=413, detail="Batch exceeds maximum size")
+    return body
+
+
+def _coordinate(value, limit: float) -> Optional[float]:
+    # bool is an int subclass; reject it along with NaN/inf and out-of-range values
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    value = float(value)
+    return value if math.isfinite(value) and -limit <= value <= limit else None
+
+
+def _parse_timestamp(value) -> Optional[str]:
+    """ISO 8601 string (naive means UTC) -> aware UTC ISO string; None if unparseable"""
+    if value is None:
+        return datetime.now(timezone.utc).isoformat()
+    if not isinstance(value, str):
+        return None
+    try:
+        timestamp = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc).isoformat()
+
+
+def _parse_fix(line: bytes) -> Optional[Dict]:
+    """Parse one NDJSON line into the standardized location shape"""
+    try:
+        fix = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(fix, dict):
+        return None
+
+    vehicle_id = fix.get("vehicle_id")
+    latitude = _coordinate(fix.get("latitude", fix.get("lat")), 90.0)
+    longitude = _coordinate(fix.get("longitude", fix.get("lng")), 180.0)
+    timestamp = _parse_timestamp(fix.get("timestamp"))
+    if not vehicle_id or latitude is None or longitude is None or timestamp is None:
+        return None
+
+    location = {
+        "vehicle_id": str(vehicle_id),
+        "latitude": latitude,
+        "longitude": longitude,
+        "timestamp": timestamp
+    }
+    for field in LOCATION_FIELDS:
+        location[field] = fix.get(field)
+    for field in ("speed", "heading", "altitude", "accuracy"):
+        if location[field] is None:
+            location[field] = 0.0
+    return location
+
+
+def _parse_batch(data: bytes) -> Tuple[List[Dict], int]:
+    locations = []
+    rejected = 0
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        location = _parse_fix(line)
+        if location:
+            locations.append(location)
+        else:
+            rejected += 1
+    return locations, rejected
+
+
+@router.post("/locations", status_code=202)
+async def ingest_locations(request: Request):
+    """Accept a (optionally gzip-compressed) NDJSON batch of location fixes.
+
+    Each line is one fix in the same shape WhilseyeService produces. The
+    batch is queued for the tracking pipeline and acknowledged immediately;
+    a full queue is reported as 503 so senders back off and retry.
+    """
+    body = await request.body()
+    data = _decode_body(body, request.headers.get("content-encoding", ""))
+    locations, rejected = _parse_batch(data)
+
+    if locations and not ingestion_service.submit(locations):
+        raise HTTPException(
+            status_code=503,
+            detail="Ingestion queue is full, retry later",
+            headers={"Retry-After": str(settings.ingest_retry_after)}
+        )
+
+    return {
+        "accepted": len(locations),
+        "rejected": rejected,
+        "queue_depth": ingestion_service.stats()["queue_depth"]
+    }
+
+
+@router.get("/stats")
+async def get_ingest_stats():
+    """Ingestion queue, tracking pipeline and DB pool saturation counters"""
+    return {
+        "ingest": ingestion_service.stats(),
+        "pipeline": tracking_service.pipeline_stats(),
+        "db_pool": async_pool_stats()
+    }
+
+
+@router.on_event("startup")
+async def start_ingestion_workers():
+    ingestion_service.start()
+
+
+@router.on_event("shutdown")
+async def stop_ingestion_workers():
+    await ingestion_service.stop()
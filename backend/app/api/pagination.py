@@ -0,0 +1,84 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+
+
+def encode_cursor(timestamp: datetime, row_id: Optional[int] = None) -> str:
+    """Opaque cursor for the position just after ``(timestamp, row_id)``"""
+    raw = json.dumps([timestamp.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Optional[int]]:
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), row_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset(query, timestamp_column, id_column=None, cursor: Optional[str] = None):
+    """Order newest first on ``(timestamp, id)`` and resume after ``cursor``.
+
+    ``id_column`` may be omitted when the timestamp alone is unique within
+    the filtered rows (e.g. rollup buckets of one vehicle).
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        if id_column is not None:
+            query = query.where(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+        else:
+            query = query.where(timestamp_column < timestamp)
+
+    if id_column is not None:
+        return query.order_by(timestamp_column.desc(), id_column.desc())
+    return query.order_by(timestamp_column.desc())
+
+
+async def fetch_page(
+    db: AsyncSession,
+    query,
+    limit: int,
+    cursor_key: Callable[[Any], Tuple[datetime, Optional[int]]]
+) -> Tuple[List[Any], Optional[str]]:
+    """Run a keyset-ordered query and return one page plus the next cursor"""
+    result = await db.execute(query.limit(limit + 1))
+    rows = list(result.scalars())
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_key(rows[-1]))
+
+
+def page_limit(limit: Optional[int], default: int) -> int:
+    if limit is None:
+        return default
+    return max(1, min(limit, settings.page_size_max))
+
+
+def ndjson_response(query, serialize: Callable[[Any], Dict], limit: Optional[int] = None) -> StreamingResponse:
+    """Stream query results as NDJSON from a server-side cursor.
+
+    The generator owns its session, so rows are fetched in
+    ``stream_batch_size`` chunks while the response is being written and
+    memory use does not depend on the size of the window.
+    """
+    if limit is not None:
+        query = query.limit(limit)
+
+    async def generate():
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                query.execution_options(yield_per=settings.stream_batch_size)
+            )
+            async for row in result.scalars():
+                yield json.dumps(serialize(row)) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -1,29 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime, timedelta
-from ..core.database import get_db
-from ..models.vehicle import Vehicle, VehicleLocation, GeofenceEvent, ActivityLog
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal, get_async_db
+from ..models.vehicle import VehicleLocation, VehicleLatestLocation, VehicleLocationRollup
 from ..services.tracking_service import tracking_service
 from ..services.geofence_service import geofence_service
+from ..services.vehicle_registry import vehicle_registry
+from ..services.position_index import position_index
+from ..services.eta_service import eta_service
+from ..services.postgis_service import postgis_service
+from .pagination import fetch_page, keyset, ndjson_response, page_limit
 
 router = APIRouter(prefix="/vehicles", tags=["vehicles"])
 
 
 @router.get("/")
-async def get_vehicles(db: Session = Depends(get_db)):
+async def get_vehicles(db: AsyncSession = Depends(get_async_db)):
     """Get all vehicles"""
-    vehicles = db.query(Vehicle).filter(Vehicle.is_active == True).all()
+    vehicles = await vehicle_registry.all_active(db)
     return {
         "vehicles": [
             {
-                "id": v.id,
-                "vehicle_id": v.vehicle_id,
-                "driver_name": v.driver_name,
-                "license_plate": v.license_plate,
-                "vehicle_type": v.vehicle_type,
-                "created_at": v.created_at.isoformat() if v.created_at else None,
-                "updated_at": v.updated_at.isoformat() if v.updated_at else None
+                "id": v["id"],
+                "vehicle_id": v["vehicle_id"],
+                "driver_name": v["driver_name"],
+                "license_plate": v["license_plate"],
+                "vehicle_type": v["vehicle_type"],
+                "created_at": v["created_at"].isoformat() if v["created_at"] else None,
+                "updated_at": v["updated_at"].isoformat() if v["updated_at"] else None
             }
             for v in vehicles
         ]
@@ -50,17 +57,95 @@ async def get_vehicle_locations(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/nearby")
+async def get_nearby_vehicles(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the point of interest"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude of the point of interest"),
+    radius: Optional[float] = Query(None, gt=0, description="Search radius in meters"),
+    k: Optional[int] = Query(None, ge=1, le=1000, description="Return at most the k nearest vehicles")
+):
+    """Vehicles near a point, nearest first, from the live position index"""
+    if radius is None and k is None:
+        raise HTTPException(status_code=400, detail="radius or k is required")
+    
+    vehicles = position_index.nearby(lat, lng, radius=radius, k=k)
+    return {
+        "center": {"latitude": lat, "longitude": lng},
+        "radius": radius,
+        "k": k,
+        "vehicles": [
+            {
+                **vehicle,
+                "timestamp": vehicle["timestamp"].isoformat() if vehicle["timestamp"] else None
+            }
+            for vehicle in vehicles
+        ],
+        "count": len(vehicles)
+    }
+
+
+@router.get("/within")
+async def get_vehicles_within(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude of the point of interest"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude of the point of interest"),
+    radius: float = Query(..., gt=0, description="Search radius in meters"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum vehicles to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stored latest positions near a point, nearest first, from PostGIS (SPATIAL_BACKEND=postgis)"""
+    if geofence_service.spatial_backend != "postgis":
+        raise HTTPException(status_code=503, detail="Requires SPATIAL_BACKEND=postgis with migration 0005 applied")
+
+    vehicles = await postgis_service.vehicles_within(db, lat, lng, radius, limit=limit)
+    return {
+        "center": {"latitude": lat, "longitude": lng},
+        "radius": radius,
+        "vehicles": [
+            {**vehicle, "timestamp": vehicle["timestamp"].isoformat()}
+            for vehicle in vehicles
+        ],
+        "count": len(vehicles)
+    }
+
+
+@router.get("/locations/in-geofence")
+async def get_locations_in_geofence(
+    geofence: str = Query(..., description="Name of a configured geofence"),
+    hours: int = Query(24, description="Number of hours of history to search"),
+    vehicle_id: Optional[str] = Query(None, description="Only this vehicle's fixes"),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum fixes to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stored fixes inside a geofence, from PostGIS (SPATIAL_BACKEND=postgis)"""
+    if geofence_service.spatial_backend != "postgis":
+        raise HTTPException(status_code=503, detail="Requires SPATIAL_BACKEND=postgis with migration 0005 applied")
+    if geofence_service.registry.get(geofence) is None:
+        raise HTTPException(status_code=404, detail="Geofence not found")
+
+    end = datetime.utcnow()
+    locations = await postgis_service.points_in_polygon(
+        db, end - timedelta(hours=hours), end,
+        geofence_name=geofence, vehicle_id=vehicle_id, limit=limit
+    )
+    return {
+        "geofence": geofence,
+        "locations": [
+            {**location, "timestamp": location["timestamp"].isoformat()}
+            for location in locations
+        ],
+        "count": len(locations)
+    }
+
+
 @router.get("/{vehicle_id}/location")
-async def get_vehicle_current_location(vehicle_id: str, db: Session = Depends(get_db)):
+async def get_vehicle_current_location(vehicle_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get current location of a specific vehicle"""
-    location = db.query(VehicleLocation).filter(
-        VehicleLocation.vehicle_id == vehicle_id
-    ).order_by(VehicleLocation.timestamp.desc()).first()
+    location = await db.get(VehicleLatestLocation, vehicle_id)
     
     if not location:
         raise HTTPException(status_code=404, detail="Vehicle location not found")
     
-    vehicle = db.query(Vehicle).filter(Vehicle.vehicle_id == vehicle_id).first()
+    vehicle = await vehicle_registry.get(vehicle_id, db)
     
     return {
         "vehicle_id": location.vehicle_id,
@@ -71,9 +156,60 @@ async def get_vehicle_current_location(vehicle_id: str, db: Session = Depends(ge
         "altitude": location.altitude,
         "accuracy": location.accuracy,
         "timestamp": location.timestamp.isoformat(),
-        "driver_name": vehicle.driver_name if vehicle else None,
-        "license_plate": vehicle.license_plate if vehicle else None,
-        "vehicle_type": vehicle.vehicle_type if vehicle else None
+        "driver_name": vehicle["driver_name"] if vehicle else None,
+        "license_plate": vehicle["license_plate"] if vehicle else None,
+        "vehicle_type": vehicle["vehicle_type"] if vehicle else None
+    }
+
+
+@router.get("/{vehicle_id}/eta")
+async def get_vehicle_eta(vehicle_id: str):
+    """Estimated arrival at the end of the vehicle's route from learned segment speeds"""
+    if not eta_service.enabled:
+        raise HTTPException(status_code=404, detail="No routes configured")
+    
+    estimate = eta_service.get(vehicle_id)
+    if not estimate:
+        raise HTTPException(status_code=404, detail="No ETA for this vehicle (no recent fix on its route)")
+    
+    return {
+        **estimate,
+        "remaining_s": round(estimate["remaining_s"]),
+        "eta": estimate["eta"].isoformat(),
+        "updated_at": estimate["updated_at"].isoformat()
+    }
+
+
+@router.put("/{vehicle_id}/route/{route_id}")
+async def assign_vehicle_route(vehicle_id: str, route_id: str):
+    """Assign a vehicle to a configured route (until restart; persist it in the route file)"""
+    if route_id not in eta_service.registry:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    eta_service.assign(vehicle_id, route_id)
+    return {"vehicle_id": vehicle_id, "route_id": route_id}
+
+
+def _serialize_location(loc: VehicleLocation) -> dict:
+    return {
+        "latitude": loc.latitude,
+        "longitude": loc.longitude,
+        "speed": loc.speed,
+        "heading": loc.heading,
+        "timestamp": loc.timestamp.isoformat()
+    }
+
+
+def _serialize_rollup(rollup: VehicleLocationRollup) -> dict:
+    return {
+        "latitude": rollup.latitude,
+        "longitude": rollup.longitude,
+        "speed": rollup.avg_speed,
+        "min_speed": rollup.min_speed,
+        "max_speed": rollup.max_speed,
+        "distance_m": rollup.distance_m,
+        "point_count": rollup.point_count,
+        "timestamp": rollup.bucket_start.isoformat()
     }
 
 
@@ -81,48 +217,80 @@ async def get_vehicle_current_location(vehicle_id: str, db: Session = Depends(ge
 async def get_vehicle_location_history(
     vehicle_id: str,
     hours: int = Query(24, description="Number of hours of history to retrieve"),
-    db: Session = Depends(get_db)
+    resolution: str = Query("auto", description="raw, minute, hour or auto (picked from the window size)"),
+    limit: Optional[int] = Query(None, description="Page size (json) or maximum rows (ndjson)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    format: str = Query("json", description="json (paginated) or ndjson (streamed)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get location history for a specific vehicle"""
     since = datetime.utcnow() - timedelta(hours=hours)
-    
-    locations = db.query(VehicleLocation).filter(
-        VehicleLocation.vehicle_id == vehicle_id,
-        VehicleLocation.timestamp >= since
-    ).order_by(VehicleLocation.timestamp.desc()).all()
-    
+
+    if resolution == "auto":
+        if hours <= settings.history_raw_max_hours:
+            resolution = "raw"
+        elif hours <= settings.history_minute_max_hours:
+            resolution = "minute"
+        else:
+            resolution = "hour"
+    elif resolution not in ("raw", "minute", "hour"):
+        raise HTTPException(status_code=400, detail="resolution must be raw, minute, hour or auto")
+
+    if resolution != "raw":
+        query = keyset(
+            select(VehicleLocationRollup).where(
+                VehicleLocationRollup.vehicle_id == vehicle_id,
+                VehicleLocationRollup.resolution == resolution,
+                VehicleLocationRollup.bucket_start >= since
+            ),
+            VehicleLocationRollup.bucket_start,
+            cursor=cursor
+        )
+        serialize = _serialize_rollup
+        cursor_key = lambda rollup: (rollup.bucket_start, None)
+    else:
+        query = keyset(
+            select(VehicleLocation).where(
+                VehicleLocation.vehicle_id == vehicle_id,
+                VehicleLocation.timestamp >= since
+            ),
+            VehicleLocation.timestamp,
+            VehicleLocation.id,
+            cursor=cursor
+        )
+        serialize = _serialize_location
+        cursor_key = lambda loc: (loc.timestamp, loc.id)
+
+    if format == "ndjson":
+        return ndjson_response(query, serialize, limit)
+
+    rows, next_cursor = await fetch_page(
+        db, query, page_limit(limit, settings.page_size_default), cursor_key
+    )
     return {
         "vehicle_id": vehicle_id,
-        "history": [
-            {
-                "latitude": loc.latitude,
-                "longitude": loc.longitude,
-                "speed": loc.speed,
-                "heading": loc.heading,
-                "timestamp": loc.timestamp.isoformat()
-            }
-            for loc in locations
-        ],
-        "count": len(locations)
+        "resolution": resolution,
+        "history": [serialize(row) for row in rows],
+        "count": len(rows),
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/{vehicle_id}/geofence-status")
-async def get_vehicle_geofence_status(vehicle_id: str, db: Session = Depends(get_db)):
+async def get_vehicle_geofence_status(vehicle_id: str, db: AsyncSession = Depends(get_async_db)):
     """Check if vehicle is currently inside geofence"""
-    location = db.query(VehicleLocation).filter(
-        VehicleLocation.vehicle_id == vehicle_id
-    ).order_by(VehicleLocation.timestamp.desc()).first()
+    location = await db.get(VehicleLatestLocation, vehicle_id)
     
     if not location:
         raise HTTPException(status_code=404, detail="Vehicle location not found")
     
-    is_inside = geofence_service.is_inside_geofence(location.latitude, location.longitude)
+    fences = geofence_service.fences_containing(location.latitude, location.longitude)
     distance = geofence_service.get_distance_to_geofence(location.latitude, location.longitude)
     
     return {
         "vehicle_id": vehicle_id,
-        "is_inside_geofence": is_inside,
+        "is_inside_geofence": bool(fences),
+        "geofences": [fence.name for fence in fences],
         "distance_to_geofence": distance,
         "geofence_center": {
             "latitude": geofence_service.plant_gate_lat,
@@ -136,3 +304,11 @@ async def get_vehicle_geofence_status(vehicle_id: str, db: Session = Depends(get
         }
     }
 
+
+@router.on_event("startup")
+async def warm_vehicle_state():
+    async with AsyncSessionLocal() as db:
+        await vehicle_registry.load(db)
+        await geofence_service.load_membership(db)
+        await position_index.load(db)
+    eta_service.start()
@@ -11,7 +11,10 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Async database setup
 async_engine = create_async_engine(
     settings.database_url.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=settings.debug
+    echo=settings.debug,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout
 )
 AsyncSessionLocal = sessionmaker(
     async_engine, class_=AsyncSession, expire_on_commit=False
@@ -34,3 +37,17 @@ async def get_async_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+
+def async_pool_stats() -> dict:
+    """Connection usage of the async pool that serves API and ingestion queries"""
+    pool = async_engine.sync_engine.pool
+    capacity = settings.db_pool_size + settings.db_max_overflow
+    checked_out = pool.checkedout()
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": settings.db_max_overflow,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturation": checked_out / capacity if capacity else 0.0
+    }
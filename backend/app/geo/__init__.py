@@ -0,0 +1,7 @@
+from .eta import EtaEngine, SegmentSpeedProfile
+from .poi_index import PoiIndex
+from .route_corridor import RouteCorridor
+from .route_registry import Route, RouteRegistry
+from .speed_zones import SpeedZoneMap
+
+__all__ = ["EtaEngine", "PoiIndex", "Route", "RouteCorridor", "RouteRegistry", "SegmentSpeedProfile", "SpeedZoneMap"]
@@ -0,0 +1,190 @@
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .route_corridor import RouteCorridor
+from .route_registry import RouteRegistry
+
+HOURS = 24
+
+
+class SegmentSpeedProfile:
+    """Learned travel time along one route, per chainage bin and hour of day.
+
+    The route is cut into ``bin_length`` bins. Each observation between two
+    consecutive fixes adds its meters and seconds to the bins it crossed,
+    under the hour of day it started in. ``rebuild`` turns the sums into a
+    pace (seconds per meter) per bin and hour - shrunk towards the bin's
+    all-day pace and then ``default_speed`` where data is thin - and into
+    per-hour suffix sums, so the remaining time from any chainage is one
+    partial bin plus one table lookup.
+    """
+
+    def __init__(self, corridor: RouteCorridor, bin_length: float = 1000.0, default_speed: float = 40.0):
+        self.corridor = corridor
+        self.length = corridor.length
+        self.bin_length = bin_length
+        self.bins = max(1, int(math.ceil(self.length / bin_length)))
+        self.default_pace = 3.6 / default_speed  # seconds per meter
+        self._meters = [[0.0] * self.bins for _ in range(HOURS)]
+        self._seconds = [[0.0] * self.bins for _ in range(HOURS)]
+        self._pace: List[List[float]] = []
+        self._suffix: List[List[float]] = []
+        self.dirty = True
+        self.rebuild()
+
+    def _bin_span(self, index: int) -> float:
+        return min((index + 1) * self.bin_length, self.length) - index * self.bin_length
+
+    def observe(self, start_chainage: float, end_chainage: float, seconds: float, hour: int):
+        """Record ``seconds`` spent moving from one chainage to a later one"""
+        start = max(0.0, min(start_chainage, self.length))
+        end = max(0.0, min(end_chainage, self.length))
+        if end <= start or seconds <= 0:
+            return
+        pace = seconds / (end - start)
+        meters, totals = self._meters[hour % HOURS], self._seconds[hour % HOURS]
+        index = min(int(start // self.bin_length), self.bins - 1)
+        while start < end and index < self.bins:
+            bin_end = min((index + 1) * self.bin_length, end)
+            covered = bin_end - start
+            meters[index] += covered
+            totals[index] += covered * pace
+            start = bin_end
+            index += 1
+        self.dirty = True
+
+    def rebuild(self):
+        """Recompute paces and suffix sums from the observations so far"""
+        all_day = []
+        for index in range(self.bins):
+            meters = sum(self._meters[hour][index] for hour in range(HOURS))
+            seconds = sum(self._seconds[hour][index] for hour in range(HOURS))
+            prior = self._bin_span(index)  # one traversal's worth of weight
+            all_day.append((seconds + prior * self.default_pace) / (meters + prior))
+
+        self._pace, self._suffix = [], []
+        for hour in range(HOURS):
+            paces = []
+            for index in range(self.bins):
+                prior = self._bin_span(index)
+                paces.append((self._seconds[hour][index] + prior * all_day[index]) /
+                             (self._meters[hour][index] + prior))
+            suffix = [0.0] * (self.bins + 1)
+            for index in range(self.bins - 1, -1, -1):
+                suffix[index] = suffix[index + 1] + self._bin_span(index) * paces[index]
+            self._pace.append(paces)
+            self._suffix.append(suffix)
+        self.dirty = False
+
+    def remaining_seconds(self, chainage: float, hour: int) -> float:
+        """Travel time from ``chainage`` to the end of the route, leaving at ``hour``"""
+        chainage = max(0.0, min(chainage, self.length))
+        index = min(int(chainage // self.bin_length), self.bins - 1)
+        bin_end = min((index + 1) * self.bin_length, self.length)
+        hour %= HOURS
+        return (bin_end - chainage) * self._pace[hour][index] + self._suffix[hour][index + 1]
+
+    def speed_profile(self, hour: int) -> List[float]:
+        """Learned speed (km/h) per bin for an hour of day"""
+        return [3.6 / pace for pace in self._pace[hour % HOURS]]
+
+
+class EtaEngine:
+    """Destination ETAs for vehicles on registered routes, updated fix by fix.
+
+    Each fix is projected onto the vehicle's assigned route. The step from
+    the vehicle's previous fix teaches that route's SegmentSpeedProfile, and
+    the remaining time is read from the profile, so the cost per fix does not
+    grow with route length. Gaps longer than ``max_gap`` seconds (parked
+    overnight, lost signal) are not learned from. Profiles are rebuilt at
+    most every ``rebuild_interval`` seconds.
+    """
+
+    def __init__(self, registry: RouteRegistry, bin_length: float = 1000.0, default_speed: float = 40.0,
+                 max_gap: float = 900.0, rebuild_interval: float = 300.0):
+        self.registry = registry
+        self.bin_length = bin_length
+        self.default_speed = default_speed
+        self.max_gap = max_gap
+        self.rebuild_interval = rebuild_interval
+        self._profiles: Dict[str, SegmentSpeedProfile] = {}
+        self._last_fix: Dict[str, Tuple[str, float, datetime]] = {}
+        self._estimates: Dict[str, Dict] = {}
+        self._last_rebuild = time.monotonic()
+
+    def profile(self, route_id: str) -> Optional[SegmentSpeedProfile]:
+        route = self.registry.get(route_id)
+        if route is None:
+            return None
+        profile = self._profiles.get(route_id)
+        if profile is None or profile.corridor is not route.corridor:
+            profile = SegmentSpeedProfile(route.corridor, self.bin_length, self.default_speed)
+            self._profiles[route_id] = profile
+        return profile
+
+    def rebuild(self):
+        for profile in self._profiles.values():
+            if profile.dirty:
+                profile.rebuild()
+        self._last_rebuild = time.monotonic()
+
+    def update(self, vehicle_id: str, latitude: float, longitude: float, timestamp: datetime,
+               learn: bool = True, last_fix: Optional[Dict] = None) -> Optional[Dict]:
+        """Feed one fix; returns the vehicle's current estimate (None when off its route).
+
+        Pass a ``last_fix`` dict of your own to replay history: steps are
+        paired against it instead of the live fixes and no estimate is kept,
+        so a replay can run alongside live updates.
+        """
+        replay = last_fix is not None
+        if last_fix is None:
+            last_fix = self._last_fix
+        route_id = self.registry.route_id_for(vehicle_id)
+        profile = self.profile(route_id) if route_id else None
+        if profile is None:
+            return None
+        projection = profile.corridor.project(latitude, longitude)
+        if projection is None:
+            return None
+        chainage = projection["chainage"]
+
+        last = last_fix.get(vehicle_id)
+        elapsed = None
+        if last and last[0] == route_id:
+            try:
+                elapsed = (timestamp - last[2]).total_seconds()
+            except TypeError:
+                pass  # naive vs aware timestamps: don't learn from the pair
+        if elapsed is not None and elapsed < 0:
+            return None if replay else self._estimates.get(vehicle_id)  # out-of-order fix
+        if learn and elapsed and elapsed <= self.max_gap:
+            profile.observe(last[1], chainage, elapsed, last[2].hour)
+        last_fix[vehicle_id] = (route_id, chainage, timestamp)
+
+        if time.monotonic() - self._last_rebuild >= self.rebuild_interval:
+            self.rebuild()
+        if replay:
+            return None
+
+        remaining = profile.remaining_seconds(chainage, timestamp.hour)
+        estimate = {
+            "vehicle_id": vehicle_id,
+            "route_id": route_id,
+            "chainage_m": chainage,
+            "remaining_m": profile.length - chainage,
+            "progress": projection["progress"],
+            "remaining_s": remaining,
+            "eta": timestamp + timedelta(seconds=remaining),
+            "updated_at": timestamp
+        }
+        self._estimates[vehicle_id] = estimate
+        return estimate
+
+    def estimate(self, vehicle_id: str) -> Optional[Dict]:
+        return self._estimates.get(vehicle_id)
+
+    def forget(self, vehicle_id: str):
+        self._last_fix.pop(vehicle_id, None)
+        self._estimates.pop(vehicle_id, None)
@@ -0,0 +1,192 @@
+import heapq
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .distance import EARTH_RADIUS_M
+
+LEAF_SIZE = 8
+
+
+def _unit_vector(latitude: float, longitude: float) -> Tuple[float, float, float]:
+    lat, lng = math.radians(latitude), math.radians(longitude)
+    return math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat)
+
+
+def _chord_sq(a: Sequence[float], b: Sequence[float]) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def _chord_to_meters(chord_sq: float) -> float:
+    return 2 * EARTH_RADIUS_M * math.asin(min(math.sqrt(chord_sq) / 2, 1.0))
+
+
+def _meters_to_chord(meters: float) -> float:
+    return 2 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2)
+
+
+class _KDTree:
+    """Static 3D k-d tree over unit vectors, stored as one array of points.
+
+    Straight-line (chord) distance between unit vectors grows monotonically
+    with great-circle distance, so nearest-by-chord is nearest on the globe
+    and there is no special casing at the antimeridian or the poles.
+    """
+
+    def __init__(self, points: List[Tuple[float, float, float, int]]):
+        self._points = points
+        self._axes: Dict[int, int] = {}
+        self._build(0, len(points))
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _build(self, lo: int, hi: int):
+        if hi - lo <= LEAF_SIZE:
+            return
+        chunk = self._points[lo:hi]
+        axis = max(range(3), key=lambda a: max(p[a] for p in chunk) - min(p[a] for p in chunk))
+        chunk.sort(key=lambda p: p[axis])
+        self._points[lo:hi] = chunk
+        mid = (lo + hi) // 2
+        self._axes[mid] = axis
+        self._build(lo, mid)
+        self._build(mid + 1, hi)
+
+    def _search(self, lo: int, hi: int, query, visit, bound):
+        if hi - lo <= LEAF_SIZE:
+            for i in range(lo, hi):
+                visit(self._points[i])
+            return
+        mid = (lo + hi) // 2
+        axis = self._axes[mid]
+        diff = query[axis] - self._points[mid][axis]
+        visit(self._points[mid])
+        near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+        self._search(near[0], near[1], query, visit, bound)
+        if diff * diff <= bound():
+            self._search(far[0], far[1], query, visit, bound)
+
+    def knn(self, query, k: int) -> List[Tuple[float, int]]:
+        """(squared chord, item index) of the ``k`` nearest points, nearest first"""
+        heap: List[Tuple[float, int]] = []  # max-heap on negated distance
+
+        def visit(point):
+            d2 = _chord_sq(query, point)
+            if len(heap) < k:
+                heapq.heappush(heap, (-d2, point[3]))
+            elif d2 < -heap[0][0]:
+                heapq.heapreplace(heap, (-d2, point[3]))
+
+        def bound():
+            return -heap[0][0] if len(heap) >= k else float('inf')
+
+        if k > 0 and self._points:
+            self._search(0, len(self._points), query, visit, bound)
+        return sorted((-d2, index) for d2, index in heap)
+
+    def within(self, query, chord: float) -> List[Tuple[float, int]]:
+        """(squared chord, item index) of every point within ``chord``"""
+        limit = chord * chord
+        found: List[Tuple[float, int]] = []
+
+        def visit(point):
+            d2 = _chord_sq(query, point)
+            if d2 <= limit:
+                found.append((d2, point[3]))
+
+        if self._points:
+            self._search(0, len(self._points), query, visit, lambda: limit)
+        return found
+
+
+class PoiIndex:
+    """Nearest-neighbour lookups over named POI layers.
+
+    Each layer (landmarks, gas stations, toll gates, ...) is built once into
+    a k-d tree on unit-sphere coordinates. Repeated nearest queries are
+    answered from a per-cell cache: for each lat/lng grid cell the index
+    remembers every POI that could be among the k nearest to *any* point in
+    that cell, so a lookup only ranks that short list and stays exact.
+    """
+
+    def __init__(self, cell_size: float = 0.01, max_cached_cells: int = 50000):
+        self.cell_size = cell_size  # degrees
+        self.max_cached_cells = max_cached_cells
+        self._layers: Dict[str, List[Dict]] = {}
+        self._vectors: Dict[str, List[Tuple[float, float, float]]] = {}
+        self._trees: Dict[str, _KDTree] = {}
+        self._cache: Dict[Tuple[str, int, int, int], List[int]] = {}
+
+    @property
+    def layers(self) -> List[str]:
+        return list(self._layers)
+
+    def add_layer(self, layer: str, pois: Iterable[Dict]):
+        """(Re)build a layer from dicts with ``latitude`` and ``longitude``"""
+        items = list(pois)
+        vectors = [_unit_vector(p["latitude"], p["longitude"]) for p in items]
+        self._layers[layer] = items
+        self._vectors[layer] = vectors
+        self._trees[layer] = _KDTree([(x, y, z, i) for i, (x, y, z) in enumerate(vectors)])
+        self._cache = {key: value for key, value in self._cache.items() if key[0] != layer}
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self.cell_size)), int(math.floor(longitude / self.cell_size))
+
+    def _candidates(self, layer: str, latitude: float, longitude: float, k: int) -> List[int]:
+        row, col = self._cell(latitude, longitude)
+        key = (layer, row, col, k)
+        candidates = self._cache.get(key)
+        if candidates is not None:
+            return candidates
+
+        tree = self._trees[layer]
+        if len(tree) <= k:
+            candidates = list(range(len(tree)))
+        else:
+            # Any point in the cell is within `half_diagonal` of its centre, so
+            # its k nearest are within kth + 2 * half_diagonal of the centre
+            # (with a little slack for the cell edges bowing out between corners)
+            south, west = row * self.cell_size, col * self.cell_size
+            center = _unit_vector(south + self.cell_size / 2, west + self.cell_size / 2)
+            half_diagonal = max(
+                math.sqrt(_chord_sq(center, _unit_vector(south + dr * self.cell_size, west + dc * self.cell_size)))
+                for dr in (0, 1) for dc in (0, 1)
+            ) * 1.01
+            kth = math.sqrt(tree.knn(center, k)[-1][0])
+            candidates = [index for _, index in tree.within(center, kth + 2 * half_diagonal)]
+
+        if len(self._cache) >= self.max_cached_cells:
+            self._cache.clear()
+        self._cache[key] = candidates
+        return candidates
+
+    def nearest(self, latitude: float, longitude: float, layer: str, k: int = 1,
+                max_distance: Optional[float] = None) -> List[Tuple[float, Dict]]:
+        """(distance in meters, POI) for the ``k`` nearest POIs of a layer, nearest first"""
+        if layer not in self._layers or k <= 0:
+            return []
+        query = _unit_vector(latitude, longitude)
+        vectors = self._vectors[layer]
+        ranked = sorted(
+            (_chord_sq(query, vectors[index]), index)
+            for index in self._candidates(layer, latitude, longitude, k)
+        )[:k]
+        results = [(_chord_to_meters(d2), self._layers[layer][index]) for d2, index in ranked]
+        if max_distance is not None:
+            results = [(distance, poi) for distance, poi in results if distance <= max_distance]
+        return results
+
+    def within(self, latitude: float, longitude: float, radius: float,
+               layers: Optional[Sequence[str]] = None) -> List[Tuple[float, str, Dict]]:
+        """(distance in meters, layer, POI) for every POI within ``radius`` meters, nearest first"""
+        query = _unit_vector(latitude, longitude)
+        chord = _meters_to_chord(radius)
+        results = []
+        for layer in (self.layers if layers is None else layers):
+            tree = self._trees.get(layer)
+            if tree is None:
+                continue
+            for d2, index in tree.within(query, chord):
+                results.append((_chord_to_meters(d2), layer, self._layers[layer][index]))
+        results.sort(key=lambda result: result[0])
+        return results
@@ -0,0 +1,205 @@
+import bisect
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+from .distance import METERS_PER_DEGREE
+
+# How far (in corridor widths) is_on_route looks for the route around an
+# off-corridor point before reporting the search limit as the deviation
+DEVIATION_SEARCH_CELLS = 10
+
+
+class RouteCorridor:
+    """A route polyline compiled for constant-time on-route checks.
+
+    Waypoints are projected onto a local plane, the legs between them are
+    split into short segments, and every segment is registered in the grid
+    cells within ``corridor_width`` meters of it. A point then only needs
+    the handful of segments in its own cell to get its cross-track distance
+    and its chainage (distance along the route from the first waypoint).
+    """
+
+    def __init__(self, waypoints: Sequence[Dict], corridor_width: float = 500.0, segment_length: float = 250.0):
+        if len(waypoints) < 2:
+            raise ValueError("A route needs at least two waypoints")
+
+        self.waypoints = list(waypoints)
+        self.corridor_width = corridor_width
+        self.cell_size = corridor_width
+        self._origin_lat = sum(w["latitude"] for w in waypoints) / len(waypoints)
+        self._origin_lng = waypoints[0]["longitude"]
+        self._x_scale = METERS_PER_DEGREE * math.cos(math.radians(self._origin_lat))
+
+        # (x1, y1, dx, dy, length, start chainage, leg index)
+        self._segments: List[Tuple[float, float, float, float, float, float, int]] = []
+        self.waypoint_chainage: List[float] = [0.0]
+        chainage = 0.0
+        points = [self._to_plane(w["latitude"], w["longitude"]) for w in waypoints]
+        for leg, ((x1, y1), (x2, y2)) in enumerate(zip(points, points[1:])):
+            leg_length = math.hypot(x2 - x1, y2 - y1)
+            pieces = max(1, int(math.ceil(leg_length / segment_length)))
+            for piece in range(pieces):
+                sx = x1 + (x2 - x1) * piece / pieces
+                sy = y1 + (y2 - y1) * piece / pieces
+                ex = x1 + (x2 - x1) * (piece + 1) / pieces
+                ey = y1 + (y2 - y1) * (piece + 1) / pieces
+                length = leg_length / pieces
+                self._segments.append((sx, sy, ex - sx, ey - sy, length, chainage, leg))
+                chainage += length
+            self.waypoint_chainage.append(chainage)
+        self.length = chainage
+        self._segment_starts = [segment[5] for segment in self._segments]
+
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for index, (sx, sy, dx, dy, _, _, _) in enumerate(self._segments):
+            min_col, min_row = self._cell(min(sx, sx + dx) - corridor_width, min(sy, sy + dy) - corridor_width)
+            max_col, max_row = self._cell(max(sx, sx + dx) + corridor_width, max(sy, sy + dy) + corridor_width)
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    self._cells.setdefault((col, row), []).append(index)
+
+    def to_state(self) -> Dict:
+        """The compiled corridor as plain JSON-serializable data (see ``from_state``)"""
+        return {
+            "waypoints": self.waypoints,
+            "corridor_width": self.corridor_width,
+            "origin": [self._origin_lat, self._origin_lng, self._x_scale],
+            "segments": self._segments,
+            "waypoint_chainage": self.waypoint_chainage,
+            "length": self.length,
+            "cells": [[col, row, indexes] for (col, row), indexes in self._cells.items()]
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "RouteCorridor":
+        """Rebuild a corridor from ``to_state`` output without recompiling it"""
+        corridor = cls.__new__(cls)
+        corridor.waypoints = list(state["waypoints"])
+        corridor.corridor_width = corridor.cell_size = float(state["corridor_width"])
+        corridor._origin_lat, corridor._origin_lng, corridor._x_scale = map(float, state["origin"])
+        corridor._segments = [tuple(segment) for segment in state["segments"]]
+        corridor.waypoint_chainage = list(state["waypoint_chainage"])
+        corridor.length = float(state["length"])
+        corridor._segment_starts = [segment[5] for segment in corridor._segments]
+        corridor._cells = {(col, row): indexes for col, row, indexes in state["cells"]}
+        return corridor
+
+    def _to_plane(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        return ((longitude - self._origin_lng) * self._x_scale,
+                (latitude - self._origin_lat) * METERS_PER_DEGREE)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    @staticmethod
+    def _project_onto(segment, x: float, y: float) -> Tuple[float, float]:
+        """Cross-track distance to a segment and the chainage of the foot point"""
+        sx, sy, dx, dy, length, start, _ = segment
+        t = ((x - sx) * dx + (y - sy) * dy) / (length * length) if length else 0.0
+        t = max(0.0, min(1.0, t))
+        return math.hypot(x - (sx + t * dx), y - (sy + t * dy)), start + t * length
+
+    def _ring(self, col: int, row: int, ring: int):
+        """Segment indexes registered in the cells exactly ``ring`` cells from (col, row)"""
+        if ring == 0:
+            yield from self._cells.get((col, row), ())
+            return
+        for c in range(col - ring, col + ring + 1):
+            for r in ((row - ring, row + ring) if abs(c - col) < ring else range(row - ring, row + ring + 1)):
+                yield from self._cells.get((c, r), ())
+
+    def project(self, latitude: float, longitude: float, exhaustive: bool = False,
+                search_radius: Optional[float] = None) -> Optional[Dict]:
+        """Snap a point to the route.
+
+        Returns the cross-track ``distance`` in meters, the ``chainage`` of the
+        closest point on the route, ``progress`` (0-100) and the waypoints on
+        either side. Points farther than ``search_radius`` (default: the
+        corridor width) from the route return ``None``; larger radii search
+        grid rings outward from the point's cell. ``exhaustive`` scans every
+        segment instead.
+        """
+        x, y = self._to_plane(latitude, longitude)
+        best_distance, best_chainage, best_leg = float('inf'), 0.0, 0
+
+        def visit(index):
+            nonlocal best_distance, best_chainage, best_leg
+            segment = self._segments[index]
+            distance, chainage = self._project_onto(segment, x, y)
+            if distance < best_distance:
+                best_distance, best_chainage, best_leg = distance, chainage, segment[6]
+
+        if exhaustive:
+            for index in range(len(self._segments)):
+                visit(index)
+        else:
+            radius = self.corridor_width if search_radius is None else search_radius
+            col, row = self._cell(x, y)
+            seen = set()
+            ring = 0
+            while True:
+                for index in self._ring(col, row, ring):
+                    if index not in seen:
+                        seen.add(index)
+                        visit(index)
+                # Segments are registered a corridor width (one cell) around
+                # themselves, so rings 0..k have found every segment within
+                # max(k, 1) cells of the point
+                reach = max(ring, 1) * self.cell_size
+                if best_distance <= reach or reach >= radius:
+                    break
+                ring += 1
+            if best_distance > radius:
+                return None
+
+        nearest = min(
+            (best_leg, best_leg + 1),
+            key=lambda i: abs(self.waypoint_chainage[i] - best_chainage)
+        )
+        return {
+            "distance": best_distance,
+            "chainage": best_chainage,
+            "progress": 100.0 * best_chainage / self.length if self.length else 0.0,
+            "previous_waypoint": self.waypoints[best_leg]["name"],
+            "next_waypoint": self.waypoints[best_leg + 1]["name"],
+            "nearest_waypoint": self.waypoints[nearest]["name"],
+            "waypoint_index": nearest
+        }
+
+    def is_on_route(self, latitude: float, longitude: float,
+                    max_deviation: Optional[float] = None) -> Tuple[bool, Optional[str], float]:
+        """(on route, nearest waypoint, cross-track distance) for a point.
+
+        Off-route points search grid rings up to ``DEVIATION_SEARCH_CELLS``
+        corridor widths out (or ``max_deviation``, if larger); beyond that the
+        search limit is reported as the distance, a lower bound.
+        """
+        max_deviation = self.corridor_width if max_deviation is None else max_deviation
+        limit = max(max_deviation, DEVIATION_SEARCH_CELLS * self.cell_size)
+        projection = self.project(latitude, longitude, search_radius=limit)
+        if projection is None:
+            return False, None, limit
+        if projection["distance"] > max_deviation:
+            return False, None, projection["distance"]
+        return True, projection["nearest_waypoint"], projection["distance"]
+
+    def route_progress(self, latitude: float, longitude: float) -> Optional[float]:
+        """Percentage of the route covered at the closest point to a location"""
+        projection = self.project(latitude, longitude)
+        return None if projection is None else projection["progress"]
+
+    def position_at(self, chainage: float) -> Tuple[float, float]:
+        """(latitude, longitude) of the point ``chainage`` meters along the route"""
+        chainage = max(0.0, min(chainage, self.length))
+        index = max(0, bisect.bisect_right(self._segment_starts, chainage) - 1)
+        sx, sy, dx, dy, length, start, _ = self._segments[index]
+        t = (chainage - start) / length if length else 0.0
+        x, y = sx + t * dx, sy + t * dy
+        return (self._origin_lat + y / METERS_PER_DEGREE,
+                self._origin_lng + x / self._x_scale)
+
+    def advance(self, latitude: float, longitude: float, distance: float) -> Tuple[float, float]:
+        """Snap a point to the route and move it ``distance`` meters towards the end"""
+        projection = self.project(latitude, longitude)
+        if projection is None:
+            projection = self.project(latitude, longitude, exhaustive=True)
+        return self.position_at(projection["chainage"] + distance)
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from .distance import METERS_PER_DEGREE
+from .route_corridor import RouteCorridor
+
+logger = logging.getLogger(__name__)
+
+# Bump when the compiled layout of RouteCorridor changes to invalidate caches
+CACHE_VERSION = 2
+DEFAULT_ENDPOINT_RADIUS = 200  # meters
+
+
+def _local_xy(waypoints: Sequence[Dict]) -> List[tuple]:
+    origin_lat = waypoints[0]["latitude"]
+    x_scale = METERS_PER_DEGREE * math.cos(math.radians(origin_lat))
+    return [((w["longitude"] - waypoints[0]["longitude"]) * x_scale,
+             (w["latitude"] - origin_lat) * METERS_PER_DEGREE) for w in waypoints]
+
+
+def _offset(point, start, end) -> float:
+    (px, py), (sx, sy), (ex, ey) = point, start, end
+    dx, dy = ex - sx, ey - sy
+    length_sq = dx * dx + dy * dy
+    if not length_sq:
+        return math.hypot(px - sx, py - sy)
+    t = max(0.0, min(1.0, ((px - sx) * dx + (py - sy) * dy) / length_sq))
+    return math.hypot(px - (sx + t * dx), py - (sy + t * dy))
+
+
+def simplify(waypoints: Sequence[Dict], tolerance: float) -> List[Dict]:
+    """Douglas-Peucker simplification that never drops named waypoints"""
+    if tolerance <= 0 or len(waypoints) < 3:
+        return list(waypoints)
+
+    points = _local_xy(waypoints)
+    keep = [i == 0 or i == len(waypoints) - 1 or bool(w.get("name")) for i, w in enumerate(waypoints)]
+    anchors = [i for i, kept in enumerate(keep) if kept]
+    stack = list(zip(anchors, anchors[1:]))
+    while stack:
+        first, last = stack.pop()
+        farthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            offset = _offset(points[i], points[first], points[last])
+            if offset > distance:
+                farthest, distance = i, offset
+        if farthest is not None:
+            keep[farthest] = True
+            stack.extend(((first, farthest), (farthest, last)))
+    return [w for w, kept in zip(waypoints, keep) if kept]
+
+
+def _endpoint(value: Optional[Dict], waypoint: Dict) -> Dict:
+    endpoint = {
+        "latitude": waypoint["latitude"],
+        "longitude": waypoint["longitude"],
+        "name": waypoint["name"],
+        "radius": DEFAULT_ENDPOINT_RADIUS
+    }
+    endpoint.update(value or {})
+    return endpoint
+
+
+class Route:
+    """A registered plant-to-consumer lane and its compiled corridor"""
+
+    def __init__(self, route_id: str, name: str, corridor: RouteCorridor,
+                 plant: Dict, destination: Dict, properties: Optional[Dict] = None):
+        self.route_id = route_id
+        self.name = name
+        self.corridor = corridor
+        self.plant = plant
+        self.destination = destination
+        self.properties = properties or {}
+
+    @property
+    def waypoints(self) -> List[Dict]:
+        return self.corridor.waypoints
+
+    @property
+    def landmarks(self) -> List[Dict]:
+        """Waypoints named in the source, as opposed to generated vertex labels"""
+        return [w for w in self.corridor.waypoints if not w.get("generated")]
+
+    @property
+    def length_km(self) -> float:
+        return round(self.corridor.length / 1000, 1)
+
+    def to_dict(self) -> Dict:
+        return {
+            "route_id": self.route_id,
+            "name": self.name,
+            "plant_stockyard": self.plant,
+            "destination": self.destination,
+            "waypoints": self.landmarks,
+            "vertices": len(self.corridor.waypoints),
+            "length_km": self.length_km,
+            "corridor_width_m": self.corridor.corridor_width
+        }
+
+
+class RouteRegistry:
+    """Named routes, vehicle-to-route assignments and a disk cache of compiled geometry.
+
+    Routes come from code or from GeoJSON / GPX files. Each route is
+    simplified and compiled into a RouteCorridor once; when ``cache_dir`` is
+    set the compiled corridor is written as JSON under a hash of its inputs,
+    so later starts load it instead of recompiling. Vehicles without an assignment
+    fall back to the default route (the first one registered unless another
+    is registered with ``default=True``).
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, corridor_width: float = 500.0,
+                 segment_length: float = 250.0, simplify_tolerance: float = 10.0):
+        self.cache_dir = cache_dir
+        self.corridor_width = corridor_width
+        self.segment_length = segment_length
+        self.simplify_tolerance = simplify_tolerance
+        self.default_route_id: Optional[str] = None
+        self._routes: Dict[str, Route] = {}
+        self._assignments: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def __iter__(self) -> Iterator[Route]:
+        return iter(self._routes.values())
+
+    def __contains__(self, route_id: str) -> bool:
+        return route_id in self._routes
+
+    def get(self, route_id: str) -> Optional[Route]:
+        return self._routes.get(route_id)
+
+    @property
+    def default(self) -> Optional[Route]:
+        return self._routes.get(self.default_route_id) if self.default_route_id else None
+
+    def register(self, route_id: str, waypoints: Sequence[Dict], name: Optional[str] = None,
+                 plant: Optional[Dict] = None, destination: Optional[Dict] = None,
+                 corridor_width: Optional[float] = None, default: bool = False,
+                 properties: Optional[Dict] = None) -> Route:
+        """Compile (or load from cache) and register a route"""
+        corridor_width = self.corridor_width if corridor_width is None else corridor_width
+        corridor = self._compile(route_id, waypoints, corridor_width)
+        route = Route(
+            route_id=route_id,
+            name=name or route_id,
+            corridor=corridor,
+            plant=_endpoint(plant, corridor.waypoints[0]),
+            destination=_endpoint(destination, corridor.waypoints[-1]),
+            properties=properties
+        )
+        self._routes[route_id] = route
+        if default or self.default_route_id is None:
+            self.default_route_id = route_id
+        return route
+
+    def remove(self, route_id: str):
+        self._routes.pop(route_id, None)
+        self._assignments = {v: r for v, r in self._assignments.items() if r != route_id}
+        if self.default_route_id == route_id:
+            self.default_route_id = next(iter(self._routes), None)
+
+    # Vehicle assignment
+
+    def assign(self, vehicle_id: str, route_id: str):
+        if route_id not in self._routes:
+            raise KeyError(f"Unknown route: {route_id}")
+        self._assignments[vehicle_id] = route_id
+
+    def unassign(self, vehicle_id: str):
+        self._assignments.pop(vehicle_id, None)
+
+    def route_id_for(self, vehicle_id: str) -> Optional[str]:
+        return self._assignments.get(vehicle_id, self.default_route_id)
+
+    def route_for(self, vehicle_id: str) -> Optional[Route]:
+        """The vehicle's assigned route, or the default route"""
+        route_id = self.route_id_for(vehicle_id)
+        return self._routes.get(route_id) if route_id else None
+
+    def vehicles_on(self, route_id: str) -> List[str]:
+        return [v for v, r in self._assignments.items() if r == route_id]
+
+    # Compilation and cache
+
+    def _cache_path(self, route_id: str, waypoints: Sequence[Dict], corridor_width: float) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        key = json.dumps({
+            "version": CACHE_VERSION,
+            "waypoints": waypoints,
+            "corridor_width": corridor_width,
+            "segment_length": self.segment_length,
+            "simplify_tolerance": self.simplify_tolerance
+        }, sort_keys=True, default=str)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", route_id)
+        return os.path.join(self.cache_dir, f"{safe_id}.{digest}.json")
+
+    def _compile(self, route_id: str, waypoints: Sequence[Dict], corridor_width: float) -> RouteCorridor:
+        waypoints = list(waypoints)
+        cache_path = self._cache_path(route_id, waypoints, corridor_width)
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    return RouteCorridor.from_state(json.load(f))
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable route cache {cache_path}: {e}")
+
+        simplified = [dict(w) for w in simplify(waypoints, self.simplify_tolerance)]
+        corridor = RouteCorridor(simplified, corridor_width=corridor_width, segment_length=self.segment_length)
+        for waypoint, chainage in zip(corridor.waypoints, corridor.waypoint_chainage):
+            if not waypoint.get("name"):
+                waypoint["name"] = f"{route_id} km {chainage / 1000:.1f}"
+                waypoint["generated"] = True
+        logger.info(f"Compiled route {route_id}: {len(waypoints)} points -> {len(simplified)} vertices, "
+                    f"{corridor.length / 1000:.1f} km")
+
+        if cache_path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(corridor.to_state(), f, separators=(",", ":"))
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                logger.warning(f"Could not write route cache {cache_path}: {e}")
+        return corridor
+
+    # File loaders
+
+    def load(self, path: str) -> List[Route]:
+        """Register every route in a GeoJSON (.geojson/.json) or GPX (.gpx) file"""
+        if path.lower().endswith(".gpx"):
+            return self.load_gpx(path)
+        return self.load_geojson(path)
+
+    def load_directory(self, directory: str) -> List[Route]:
+        """Load every route file in a directory, skipping (and logging) files that fail to parse"""
+        routes = []
+        for filename in sorted(os.listdir(directory)):
+            if filename.lower().endswith((".geojson", ".json", ".gpx")):
+                path = os.path.join(directory, filename)
+                try:
+                    routes.extend(self.load(path))
+                except Exception as e:
+                    logger.error(f"Skipping route file {path}: {str(e)}")
+        logger.info(f"Loaded {len(routes)} routes from {directory}")
+        return routes
+
+    def load_geojson(self, path: str) -> List[Route]:
+        """LineString features become routes.
+
+        Feature properties: ``id``/``name``, ``corridor_width``, ``plant`` and
+        ``destination`` objects, and ``waypoints`` - a list aligned with the
+        coordinates holding a name (or object with ``name``, ``speed_limit``,
+        ...) for the named stops and null for plain vertices.
+        """
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("type") == "FeatureCollection":
+            features = data.get("features", [])
+        else:
+            features = [data] if data.get("type") == "Feature" else []
+
+        routes = []
+        for index, feature in enumerate(features):
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") == "LineString":
+                coordinates = geometry["coordinates"]
+            elif geometry.get("type") == "MultiLineString":
+                coordinates = [c for line in geometry["coordinates"] for c in line]
+            else:
+                continue
+
+            properties = dict(feature.get("properties") or {})
+            route_id = str(properties.pop("id", None) or feature.get("id") or
+                           f"{os.path.splitext(os.path.basename(path))[0]}-{index}")
+            labels = properties.pop("waypoints", None) or []
+            waypoints = []
+            for i, (longitude, latitude, *_) in enumerate(coordinates):
+                waypoint = {"latitude": float(latitude), "longitude": float(longitude)}
+                label = labels[i] if i < len(labels) else None
+                if isinstance(label, dict):
+                    waypoint.update(label)
+                elif label:
+                    waypoint["name"] = label
+                waypoints.append(waypoint)
+
+            routes.append(self.register(
+                route_id,
+                waypoints,
+                name=properties.pop("name", None),
+                plant=properties.pop("plant", None),
+                destination=properties.pop("destination", None),
+                corridor_width=properties.pop("corridor_width", None),
+                properties=properties
+            ))
+        return routes
+
+    def load_gpx(self, path: str) -> List[Route]:
+        """Each ``<rte>`` (named ``<rtept>`` stops) or ``<trk>`` becomes a route"""
+        root = ET.parse(path).getroot()
+
+        def children(element, tag):
+            return [child for child in element if child.tag.rsplit("}", 1)[-1] == tag]
+
+        def text(element, tag):
+            found = children(element, tag)
+            return found[0].text.strip() if found and found[0].text else None
+
+        def point(element):
+            waypoint = {"latitude": float(element.get("lat")), "longitude": float(element.get("lon"))}
+            name = text(element, "name")
+            if name:
+                waypoint["name"] = name
+            return waypoint
+
+        base = os.path.splitext(os.path.basename(path))[0]
+        routes = []
+        for index, element in enumerate(children(root, "rte") + children(root, "trk")):
+            if element.tag.endswith("rte"):
+                waypoints = [point(p) for p in children(element, "rtept")]
+            else:
+                waypoints = [point(p) for seg in children(element, "trkseg") for p in children(seg, "trkpt")]
+            if len(waypoints) < 2:
+                continue
+            name = text(element, "name")
+            routes.append(self.register(name or f"{base}-{index}", waypoints, name=name))
+        return routes
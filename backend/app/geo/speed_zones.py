@@ -0,0 +1,79 @@
+import math
+from typing import Dict, Optional, Sequence, Tuple
+from .distance import METERS_PER_DEGREE, haversine_m
+from .route_corridor import RouteCorridor
+
+
+class SpeedZoneMap:
+    """Speed limits rasterized onto a grid once, looked up with a single probe.
+
+    Zones (circular buffers around toll gates, towns, etc. and per-waypoint
+    limits along a route corridor) are burned into grid cells as they are
+    added; where zones overlap the most restrictive limit wins. Cells no zone
+    touches fall back to ``default_limit``. Limits are resolved to the cell
+    centre, so zone edges are accurate to about half a cell.
+    """
+
+    def __init__(self, reference_latitude: float, default_limit: float = 80, cell_size: float = 200.0):
+        self.default_limit = default_limit
+        self.cell_size = cell_size  # meters
+        self._lat_step = cell_size / METERS_PER_DEGREE
+        self._lng_step = self._lat_step / math.cos(math.radians(reference_latitude))
+        self._cells: Dict[Tuple[int, int], float] = {}
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self._lat_step)), int(math.floor(longitude / self._lng_step))
+
+    def _center(self, row: int, col: int) -> Tuple[float, float]:
+        return (row + 0.5) * self._lat_step, (col + 0.5) * self._lng_step
+
+    def _cells_around(self, latitude: float, longitude: float, radius: float):
+        lat_span = radius / METERS_PER_DEGREE
+        lng_span = lat_span / max(math.cos(math.radians(latitude)), 1e-6)
+        min_row, min_col = self._cell(latitude - lat_span, longitude - lng_span)
+        max_row, max_col = self._cell(latitude + lat_span, longitude + lng_span)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                yield row, col
+
+    def _burn(self, cell: Tuple[int, int], limit: float):
+        current = self._cells.get(cell)
+        if current is None or limit < current:
+            self._cells[cell] = limit
+
+    def add_circle(self, latitude: float, longitude: float, radius: float, limit: float):
+        """Limit within ``radius`` meters of a point"""
+        for row, col in self._cells_around(latitude, longitude, radius):
+            center_lat, center_lng = self._center(row, col)
+            if haversine_m(latitude, longitude, center_lat, center_lng) <= radius:
+                self._burn((row, col), limit)
+
+    def add_route(self, corridor: RouteCorridor, limits: Sequence[Optional[float]], width: Optional[float] = None):
+        """Per-waypoint limits along a route.
+
+        Every cell within ``width`` meters of the route (default: the
+        corridor width) takes the limit of the waypoint nearest to it along
+        the route; waypoints without a limit leave their stretch untouched.
+        """
+        width = corridor.corridor_width if width is None else width
+        visited = set()
+        steps = max(1, int(math.ceil(corridor.length / self.cell_size)))
+        for step in range(steps + 1):
+            latitude, longitude = corridor.position_at(corridor.length * step / steps)
+            for cell in self._cells_around(latitude, longitude, width):
+                if cell in visited:
+                    continue
+                visited.add(cell)
+                projection = corridor.project(*self._center(*cell), exhaustive=width > corridor.corridor_width)
+                if projection is None or projection["distance"] > width:
+                    continue
+                limit = limits[projection["waypoint_index"]]
+                if limit is not None:
+                    self._burn(cell, limit)
+
+    def limit_at(self, latitude: float, longitude: float) -> float:
+        """Speed limit for a location: one dictionary probe"""
+        return self._cells.get(self._cell(latitude, longitude), self.default_limit)
@@ -1,4 +1,4 @@
-from .vehicle import Vehicle, VehicleLocation, GeofenceEvent, ActivityLog
+from .vehicle import Vehicle, VehicleLocation, VehicleLatestLocation, VehicleLocationRollup, GeofenceEvent, ActivityLog, EventCounter, VehicleActivityBucket
 
-__all__ = ["Vehicle", "VehicleLocation", "GeofenceEvent", "ActivityLog"]
+__all__ = ["Vehicle", "VehicleLocation", "VehicleLatestLocation", "VehicleLocationRollup", "GeofenceEvent", "ActivityLog", "EventCounter", "VehicleActivityBucket"]
 
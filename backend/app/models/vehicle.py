@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, Text, Index
 from sqlalchemy.sql import func
 from ..core.database import Base
 
@@ -17,19 +17,58 @@ class Vehicle(Base):
 
 
 class VehicleLocation(Base):
+    """Raw fix history, range-partitioned on ``timestamp`` (see PartitionMaintenanceService)"""
     __tablename__ = "vehicle_locations"
     
-    id = Column(Integer, primary_key=True, index=True)
-    vehicle_id = Column(String, index=True, nullable=False)
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    vehicle_id = Column(String, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     speed = Column(Float, default=0.0)
     heading = Column(Float, default=0.0)
     altitude = Column(Float, default=0.0)
     accuracy = Column(Float, default=0.0)
-    timestamp = Column(DateTime(timezone=True), nullable=False)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_vehicle_locations_vehicle_id_timestamp", "vehicle_id", timestamp.desc()),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+
+class VehicleLatestLocation(Base):
+    """Latest known fix per vehicle, upserted during ingestion"""
+    __tablename__ = "vehicle_latest_location"
+    
+    vehicle_id = Column(String, primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    speed = Column(Float, default=0.0)
+    heading = Column(Float, default=0.0)
+    altitude = Column(Float, default=0.0)
+    accuracy = Column(Float, default=0.0)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class VehicleLocationRollup(Base):
+    """Per-vehicle location aggregates at minute or hour resolution"""
+    __tablename__ = "vehicle_location_rollups"
+    
+    vehicle_id = Column(String, primary_key=True)
+    resolution = Column(String, primary_key=True)  # 'minute' or 'hour'
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    latitude = Column(Float, nullable=False)  # last position in the bucket
+    longitude = Column(Float, nullable=False)
+    min_speed = Column(Float)
+    avg_speed = Column(Float)
+    max_speed = Column(Float)
+    distance_m = Column(Float, default=0.0)
+    point_count = Column(Integer, nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 class GeofenceEvent(Base):
     __tablename__ = "geofence_events"
@@ -58,3 +97,20 @@ class ActivityLog(Base):
     timestamp = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+
+class EventCounter(Base):
+    """Hourly event counts per source ('geofence' or 'activity') and type"""
+    __tablename__ = "event_counters"
+    
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    source = Column(String, primary_key=True)
+    event_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class VehicleActivityBucket(Base):
+    """Vehicles with at least one activity in an hourly bucket"""
+    __tablename__ = "vehicle_activity_buckets"
+    
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    vehicle_id = Column(String, primary_key=True)
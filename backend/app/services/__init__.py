@@ -2,11 +2,13 @@ from .whilseye_service import whilseye_service
 from .geofence_service import geofence_service
 from .notification_service import notification_service
 from .tracking_service import tracking_service
+from .ingestion_service import ingestion_service
 
 __all__ = [
     "whilseye_service",
     "geofence_service", 
     "notification_service",
-    "tracking_service"
+    "tracking_service",
+    "ingestion_service"
 ]
 
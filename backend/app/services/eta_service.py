@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..core.database import AsyncSessionLocal
+from ..geo import EtaEngine, RouteRegistry
+from ..models.vehicle import VehicleLocation
+
+logger = logging.getLogger(__name__)
+
+
+def _as_utc(value) -> Optional[datetime]:
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class EtaService:
+    """Destination ETAs for vehicles on configured routes.
+
+    Routes come from ``ROUTES_DIR`` (GeoJSON/GPX, compiled geometry cached in
+    ``ROUTE_CACHE_DIR``); a route's ``vehicles`` property assigns vehicles to
+    it and everything else runs on the first route loaded. Segment speed
+    profiles are learned from ``VehicleLocation`` history on startup and then
+    kept current from live fixes. Hours of day are UTC.
+    """
+
+    def __init__(self):
+        self.registry = RouteRegistry(cache_dir=settings.route_cache_dir or None)
+        self.engine = EtaEngine(
+            self.registry,
+            bin_length=settings.eta_bin_length,
+            default_speed=settings.eta_default_speed
+        )
+        self._learn_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.registry) > 0
+
+    def load_routes(self):
+        if not settings.routes_dir:
+            logger.info("No ROUTES_DIR configured; ETA estimates are disabled")
+            return
+        for route in self.registry.load_directory(settings.routes_dir):
+            for vehicle_id in route.properties.get("vehicles", []):
+                self.registry.assign(vehicle_id, route.route_id)
+
+    def start(self):
+        """Load routes, then learn from history in the background"""
+        self.load_routes()
+        if self.enabled and self._learn_task is None:
+            self._learn_task = asyncio.create_task(self._learn_in_background())
+
+    async def _learn_in_background(self):
+        try:
+            await self.learn_history()
+        except Exception as e:
+            logger.error(f"Error learning segment speeds from history: {str(e)}")
+
+    async def learn_history(self, db: Optional[AsyncSession] = None):
+        """Replay the last ``ETA_HISTORY_DAYS`` of fixes through the engine.
+
+        The replay pairs fixes in its own map, apart from the live fixes that
+        keep arriving meanwhile, so it neither skips active vehicles nor
+        publishes estimates from old positions.
+        """
+        if not self.enabled:
+            return
+        if db is None:
+            async with AsyncSessionLocal() as db:
+                return await self.learn_history(db)
+
+        since = datetime.now(timezone.utc) - timedelta(days=settings.eta_history_days)
+        query = (
+            select(VehicleLocation.vehicle_id, VehicleLocation.latitude,
+                   VehicleLocation.longitude, VehicleLocation.timestamp)
+            .where(VehicleLocation.timestamp >= since)
+            .order_by(VehicleLocation.vehicle_id, VehicleLocation.timestamp)
+            .execution_options(yield_per=settings.stream_batch_size)
+        )
+        fixes = 0
+        replayed: Dict = {}
+        result = await db.stream(query)
+        async for vehicle_id, latitude, longitude, timestamp in result:
+            self.engine.update(vehicle_id, latitude, longitude, _as_utc(timestamp), last_fix=replayed)
+            fixes += 1
+        self.engine.rebuild()
+        logger.info(f"Learned segment speeds from {fixes} fixes over {settings.eta_history_days} days")
+
+    def update_many(self, locations: Iterable[Dict]):
+        """Advance estimates with a batch of live fixes"""
+        if not self.enabled:
+            return
+        for location in locations:
+            timestamp = _as_utc(location.get("timestamp"))
+            if not location.get("vehicle_id") or timestamp is None:
+                continue
+            self.engine.update(location["vehicle_id"], location["latitude"], location["longitude"], timestamp)
+
+    def get(self, vehicle_id: str) -> Optional[Dict]:
+        return self.engine.estimate(vehicle_id)
+
+    def assign(self, vehicle_id: str, route_id: str):
+        self.registry.assign(vehicle_id, route_id)
+        self.engine.forget(vehicle_id)
+
+
+# Create a singleton instance
+eta_service = EtaService()
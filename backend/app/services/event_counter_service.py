@@ -0,0 +1,114 @@
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from sqlalchemy import func, literal, select, union
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.vehicle import ActivityLog, EventCounter, GeofenceEvent, VehicleActivityBucket
+
+logger = logging.getLogger(__name__)
+
+
+class EventCounterService:
+    """Hourly event counters maintained on the write path.
+
+    Summaries sum whole buckets from ``event_counters`` and only scan the
+    raw event tables for the partial hour at the start of the window, so
+    their cost grows with the number of buckets rather than events.
+    """
+
+    bucket_size = timedelta(hours=1)
+
+    @staticmethod
+    def _as_utc(timestamp: datetime) -> datetime:
+        # Naive timestamps are UTC, like everything else the tracker writes
+        if timestamp.tzinfo is None:
+            return timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(timezone.utc)
+
+    def bucket_start(self, timestamp: datetime) -> datetime:
+        """The UTC hour a timestamp falls in (offsets like +05:30 don't split buckets)"""
+        return self._as_utc(timestamp).replace(minute=0, second=0, microsecond=0)
+
+    def _first_full_bucket(self, since: datetime) -> datetime:
+        start = self.bucket_start(since)
+        return start if start == since else start + self.bucket_size
+
+    async def record(self, db: AsyncSession, events: List[GeofenceEvent], activities: List[ActivityLog]):
+        """Add freshly written events to their buckets, in the caller's transaction"""
+        counts = Counter()
+        for event in events:
+            counts[(self.bucket_start(event.timestamp), "geofence", event.event_type)] += 1
+        for activity in activities:
+            counts[(self.bucket_start(activity.timestamp), "activity", activity.activity_type)] += 1
+        if not counts:
+            return
+
+        statement = pg_insert(EventCounter).values([
+            {"bucket_start": bucket, "source": source, "event_type": event_type, "count": count}
+            for (bucket, source, event_type), count in counts.items()
+        ])
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["bucket_start", "source", "event_type"],
+            set_={"count": EventCounter.count + statement.excluded.count}
+        ))
+
+        presence = {(self.bucket_start(a.timestamp), a.vehicle_id) for a in activities}
+        if presence:
+            statement = pg_insert(VehicleActivityBucket).values([
+                {"bucket_start": bucket, "vehicle_id": vehicle_id}
+                for bucket, vehicle_id in presence
+            ])
+            await db.execute(statement.on_conflict_do_nothing(
+                index_elements=["bucket_start", "vehicle_id"]
+            ))
+
+    async def summary(self, db: AsyncSession, since: datetime) -> Dict:
+        """Event counts by source/type and distinct active vehicles since ``since``"""
+        since = self._as_utc(since)
+        boundary = self._first_full_bucket(since)
+
+        queries = [
+            select(EventCounter.source, EventCounter.event_type, func.sum(EventCounter.count))
+            .where(EventCounter.bucket_start >= boundary)
+            .group_by(EventCounter.source, EventCounter.event_type)
+        ]
+        vehicle_sources = [
+            select(VehicleActivityBucket.vehicle_id)
+            .where(VehicleActivityBucket.bucket_start >= boundary)
+        ]
+        if since < boundary:
+            queries.append(
+                select(literal("geofence"), GeofenceEvent.event_type, func.count())
+                .where(GeofenceEvent.timestamp >= since, GeofenceEvent.timestamp < boundary)
+                .group_by(GeofenceEvent.event_type)
+            )
+            queries.append(
+                select(literal("activity"), ActivityLog.activity_type, func.count())
+                .where(ActivityLog.timestamp >= since, ActivityLog.timestamp < boundary)
+                .group_by(ActivityLog.activity_type)
+            )
+            vehicle_sources.append(
+                select(ActivityLog.vehicle_id)
+                .where(ActivityLog.timestamp >= since, ActivityLog.timestamp < boundary)
+            )
+
+        counts = {"geofence": Counter(), "activity": Counter()}
+        for query in queries:
+            result = await db.execute(query)
+            for source, event_type, count in result.all():
+                counts[source][event_type] += int(count)
+
+        vehicles = (union(*vehicle_sources) if len(vehicle_sources) > 1 else vehicle_sources[0]).subquery()
+        active_vehicles = await db.scalar(select(func.count(func.distinct(vehicles.c.vehicle_id))))
+
+        return {
+            "geofence": dict(counts["geofence"]),
+            "activity": dict(counts["activity"]),
+            "active_vehicles": active_vehicles or 0
+        }
+
+
+# Create a singleton instance
+event_counter_service = EventCounterService()
@@ -0,0 +1,19 @@
+import math
+from typing import Tuple
+import numpy as np
+from ..geo.distance import EARTH_RADIUS_M, METERS_PER_DEGREE
+
+
+def degrees_for(meters: float, latitude: float) -> Tuple[float, float]:
+    """Latitude and longitude span of ``meters`` around ``latitude``"""
+    lat_deg = meters / METERS_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    return lat_deg, lat_deg / cos_lat
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters; accepts scalars or broadcastable arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    h = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
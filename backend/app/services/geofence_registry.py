@@ -0,0 +1,328 @@
+import json
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from geopy.distance import geodesic
+from .geo import METERS_PER_DEGREE, degrees_for, haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Haversine differs from the ellipsoidal geodesic by up to ~0.5%; points whose
+# haversine distance is this close to a circle's edge are re-checked exactly.
+BOUNDARY_TOLERANCE = 0.005
+BOUNDARY_TOLERANCE_M = 1.0
+
+
+class Geofence(ABC):
+    """A named area with a bounding box used for index prefiltering"""
+
+    kind = "geofence"
+
+    def __init__(self, name: str, bbox: Tuple[float, float, float, float], properties: Optional[Dict] = None):
+        self.name = name
+        self.bbox = bbox  # (min_lat, min_lng, max_lat, max_lng)
+        self.properties = properties or {}
+
+    def bbox_contains(self, latitude: float, longitude: float, margin_m: float = 0.0) -> bool:
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        lat_pad, lng_pad = degrees_for(margin_m, latitude) if margin_m else (0.0, 0.0)
+        return (min_lat - lat_pad <= latitude <= max_lat + lat_pad and
+                min_lng - lng_pad <= longitude <= max_lng + lng_pad)
+
+    @abstractmethod
+    def contains(self, latitude: float, longitude: float) -> bool:
+        ...
+
+    @abstractmethod
+    def distance_to(self, latitude: float, longitude: float) -> float:
+        """Meters from the point to the fence, 0 when inside"""
+
+    def to_dict(self) -> Dict:
+        return {"name": self.name, "type": self.kind, **self.properties}
+
+
+class CircleGeofence(Geofence):
+    kind = "circle"
+
+    def __init__(self, name: str, latitude: float, longitude: float, radius: float, properties: Optional[Dict] = None):
+        lat_deg, lng_deg = degrees_for(radius, latitude)
+        super().__init__(
+            name,
+            (latitude - lat_deg, longitude - lng_deg, latitude + lat_deg, longitude + lng_deg),
+            properties
+        )
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius  # meters
+
+    def distance_to_center(self, latitude: float, longitude: float) -> float:
+        return geodesic((self.latitude, self.longitude), (latitude, longitude)).meters
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        return self.distance_to_center(latitude, longitude) <= self.radius
+
+    def distance_to(self, latitude: float, longitude: float) -> float:
+        return max(0.0, self.distance_to_center(latitude, longitude) - self.radius)
+
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        data.update({
+            "center": {"latitude": self.latitude, "longitude": self.longitude},
+            "radius": self.radius
+        })
+        return data
+
+
+class PolygonGeofence(Geofence):
+    """Polygon given as (lat, lng) rings; the first ring is the outer boundary, the rest are holes"""
+
+    kind = "polygon"
+
+    def __init__(self, name: str, rings: Sequence[Sequence[Tuple[float, float]]], properties: Optional[Dict] = None):
+        rings = [[(float(lat), float(lng)) for lat, lng in ring] for ring in rings if len(ring) >= 3]
+        if not rings:
+            raise ValueError(f"Polygon geofence {name} needs at least three vertices")
+        outer = rings[0]
+        super().__init__(
+            name,
+            (min(p[0] for p in outer), min(p[1] for p in outer),
+             max(p[0] for p in outer), max(p[1] for p in outer)),
+            properties
+        )
+        self.rings = rings
+        self._ring_arrays = [np.array(ring, dtype=float) for ring in rings]
+
+    @staticmethod
+    def _ring_contains(ring: List[Tuple[float, float]], latitude: float, longitude: float) -> bool:
+        """Even-odd ray casting in the lat/lng plane"""
+        inside = False
+        j = len(ring) - 1
+        for i in range(len(ring)):
+            lat_i, lng_i = ring[i]
+            lat_j, lng_j = ring[j]
+            if (lat_i > latitude) != (lat_j > latitude):
+                crossing = lng_i + (latitude - lat_i) * (lng_j - lng_i) / (lat_j - lat_i)
+                if longitude < crossing:
+                    inside = not inside
+            j = i
+        return inside
+
+    @staticmethod
+    def _ring_contains_many(ring: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Vectorized ray casting: loops over edges, evaluates all points at once"""
+        inside = np.zeros(latitudes.shape, dtype=bool)
+        lat_j, lng_j = ring[-1]
+        for lat_i, lng_i in ring:
+            if lat_i != lat_j:
+                straddles = (lat_i > latitudes) != (lat_j > latitudes)
+                crossing = lng_i + (latitudes - lat_i) * (lng_j - lng_i) / (lat_j - lat_i)
+                inside ^= straddles & (longitudes < crossing)
+            lat_j, lng_j = lat_i, lng_i
+        return inside
+
+    def contains_many(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        inside = self._ring_contains_many(self._ring_arrays[0], latitudes, longitudes)
+        for hole in self._ring_arrays[1:]:
+            inside &= ~self._ring_contains_many(hole, latitudes, longitudes)
+        return inside
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if not self.bbox_contains(latitude, longitude):
+            return False
+        if not self._ring_contains(self.rings[0], latitude, longitude):
+            return False
+        return not any(self._ring_contains(hole, latitude, longitude) for hole in self.rings[1:])
+
+    def distance_to(self, latitude: float, longitude: float) -> float:
+        if self.contains(latitude, longitude):
+            return 0.0
+
+        # Local equirectangular projection around the point, in meters
+        cos_lat = math.cos(math.radians(latitude))
+        best = float('inf')
+        for ring in self.rings:
+            points = [((lng - longitude) * cos_lat * METERS_PER_DEGREE, (lat - latitude) * METERS_PER_DEGREE)
+                      for lat, lng in ring]
+            for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+                dx, dy = x2 - x1, y2 - y1
+                length = dx * dx + dy * dy
+                t = 0.0 if length == 0 else max(0.0, min(1.0, -(x1 * dx + y1 * dy) / length))
+                best = min(best, math.hypot(x1 + t * dx, y1 + t * dy))
+        return best
+
+    def to_dict(self) -> Dict:
+        data = super().to_dict()
+        data["coordinates"] = [[[lat, lng] for lat, lng in ring] for ring in self.rings]
+        return data
+
+
+class GeofenceRegistry:
+    """Geofences indexed on a uniform lat/lng grid.
+
+    Each fence is registered in every cell its bounding box overlaps, so a
+    lookup touches one cell (or the few cells under a search radius) and then
+    tests only the fences registered there.
+    """
+
+    def __init__(self, cell_size: float = 0.01):
+        self.cell_size = cell_size  # degrees
+        self._fences: Dict[str, Geofence] = {}
+        self._cells: Dict[Tuple[int, int], List[Geofence]] = {}
+
+    def __len__(self) -> int:
+        return len(self._fences)
+
+    def __iter__(self):
+        return iter(self._fences.values())
+
+    def get(self, name: str) -> Optional[Geofence]:
+        return self._fences.get(name)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self.cell_size)), int(math.floor(longitude / self.cell_size))
+
+    def _cells_for(self, bbox: Tuple[float, float, float, float]) -> Iterable[Tuple[int, int]]:
+        min_row, min_col = self._cell(bbox[0], bbox[1])
+        max_row, max_col = self._cell(bbox[2], bbox[3])
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                yield row, col
+
+    def add(self, fence: Geofence):
+        if fence.name in self._fences:
+            self.remove(fence.name)
+        self._fences[fence.name] = fence
+        for cell in self._cells_for(fence.bbox):
+            self._cells.setdefault(cell, []).append(fence)
+
+    def remove(self, name: str):
+        fence = self._fences.pop(name, None)
+        if fence is None:
+            return
+        for cell in self._cells_for(fence.bbox):
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                continue
+            bucket[:] = [f for f in bucket if f is not fence]
+            if not bucket:
+                del self._cells[cell]
+
+    def clear(self):
+        self._fences.clear()
+        self._cells.clear()
+
+    def candidates(self, latitude: float, longitude: float, margin_m: float = 0.0) -> List[Geofence]:
+        """Fences whose bounding box (grown by ``margin_m``) covers the point"""
+        if margin_m:
+            lat_deg, lng_deg = degrees_for(margin_m, latitude)
+            cells = self._cells_for((latitude - lat_deg, longitude - lng_deg, latitude + lat_deg, longitude + lng_deg))
+        else:
+            cells = [self._cell(latitude, longitude)]
+
+        seen: Set[str] = set()
+        found = []
+        for cell in cells:
+            for fence in self._cells.get(cell, ()):
+                if fence.name not in seen and fence.bbox_contains(latitude, longitude, margin_m):
+                    seen.add(fence.name)
+                    found.append(fence)
+        return found
+
+    def containing(self, latitude: float, longitude: float) -> List[Geofence]:
+        return [fence for fence in self.candidates(latitude, longitude) if fence.contains(latitude, longitude)]
+
+    def containing_batch(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> List[List[Geofence]]:
+        """Geofences containing each point, evaluated for the whole batch at once.
+
+        Candidate (point, fence) pairs come from the grid; circles are then
+        tested with one vectorized haversine pass (exact geodesic only for
+        pairs within the tolerance band around the edge) and polygons with a
+        vectorized ray cast per fence over its candidate points.
+        """
+        lats = np.asarray(latitudes, dtype=float)
+        lngs = np.asarray(longitudes, dtype=float)
+        results: List[List[Geofence]] = [[] for _ in range(len(lats))]
+        if not len(lats):
+            return results
+
+        rows = np.floor(lats / self.cell_size).astype(np.int64).tolist()
+        cols = np.floor(lngs / self.cell_size).astype(np.int64).tolist()
+        pair_points, pair_fences = [], []
+        for index, cell in enumerate(zip(rows, cols)):
+            for fence in self._cells.get(cell, ()):
+                pair_points.append(index)
+                pair_fences.append(fence)
+        if not pair_fences:
+            return results
+
+        points = np.array(pair_points)
+        pair_lats, pair_lngs = lats[points], lngs[points]
+        bboxes = np.array([fence.bbox for fence in pair_fences])
+        inside = ((bboxes[:, 0] <= pair_lats) & (pair_lats <= bboxes[:, 2]) &
+                  (bboxes[:, 1] <= pair_lngs) & (pair_lngs <= bboxes[:, 3]))
+
+        circles = np.array([isinstance(fence, CircleGeofence) for fence in pair_fences])
+        circle_pairs = np.nonzero(inside & circles)[0]
+        if len(circle_pairs):
+            centers = np.array([(pair_fences[k].latitude, pair_fences[k].longitude, pair_fences[k].radius)
+                                for k in circle_pairs])
+            distances = haversine_m(pair_lats[circle_pairs], pair_lngs[circle_pairs], centers[:, 0], centers[:, 1])
+            inside[circle_pairs] = distances <= centers[:, 2]
+            near_edge = np.abs(distances - centers[:, 2]) <= centers[:, 2] * BOUNDARY_TOLERANCE + BOUNDARY_TOLERANCE_M
+            for k in circle_pairs[near_edge]:
+                inside[k] = pair_fences[k].contains(pair_lats[k], pair_lngs[k])
+
+        polygon_pairs: Dict[str, List[int]] = {}
+        for k in np.nonzero(inside & ~circles)[0]:
+            polygon_pairs.setdefault(pair_fences[k].name, []).append(k)
+        for name, pairs in polygon_pairs.items():
+            pairs = np.array(pairs)
+            fence = pair_fences[pairs[0]]
+            if isinstance(fence, PolygonGeofence):
+                inside[pairs] = fence.contains_many(pair_lats[pairs], pair_lngs[pairs])
+            else:
+                inside[pairs] = [fence.contains(pair_lats[k], pair_lngs[k]) for k in pairs]
+
+        for k in np.nonzero(inside)[0]:
+            results[pair_points[k]].append(pair_fences[k])
+        return results
+
+    def within(self, latitude: float, longitude: float, distance_m: float) -> List[Geofence]:
+        """Fences within ``distance_m`` meters of the point (including those containing it)"""
+        return [
+            fence for fence in self.candidates(latitude, longitude, distance_m)
+            if fence.distance_to(latitude, longitude) <= distance_m
+        ]
+
+    def load_geojson(self, path: str) -> int:
+        """Add fences from a GeoJSON FeatureCollection.
+
+        Polygons become polygon fences; Points need a ``radius`` property in
+        meters and become circles. Fences are named by the ``name`` property.
+        """
+        with open(path) as f:
+            collection = json.load(f)
+
+        loaded = 0
+        for index, feature in enumerate(collection.get("features", [])):
+            geometry = feature.get("geometry") or {}
+            properties = dict(feature.get("properties") or {})
+            name = properties.pop("name", None) or feature.get("id") or f"geofence-{index}"
+            try:
+                if geometry.get("type") == "Polygon":
+                    rings = [[(lat, lng) for lng, lat, *_ in ring] for ring in geometry["coordinates"]]
+                    self.add(PolygonGeofence(name, rings, properties))
+                elif geometry.get("type") == "Point" and "radius" in properties:
+                    lng, lat = geometry["coordinates"][:2]
+                    self.add(CircleGeofence(name, lat, lng, float(properties.pop("radius")), properties))
+                else:
+                    logger.warning(f"Skipping geofence {name}: unsupported geometry {geometry.get('type')}")
+                    continue
+                loaded += 1
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping geofence {name}: {str(e)}")
+
+        logger.info(f"Loaded {loaded} geofences from {path}")
+        return loaded
@@ -1,10 +1,13 @@
+import asyncio
 import math
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from datetime import datetime
-from geopy.distance import geodesic
-from sqlalchemy.orm import Session
-from ..models.vehicle import VehicleLocation, GeofenceEvent, ActivityLog
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models.vehicle import VehicleLatestLocation, GeofenceEvent, ActivityLog
 from ..core.config import settings
+from .geofence_registry import CircleGeofence, Geofence, GeofenceRegistry
+from .postgis_service import postgis_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,32 +19,116 @@ class GeofenceService:
         self.plant_gate_lng = settings.geofence_lng
         self.geofence_radius = settings.geofence_radius  # meters
 
-    def is_inside_geofence(self, latitude: float, longitude: float) -> bool:
-        """Check if a location is inside the plant gate geofence"""
+        # vehicle_id -> names of the fences it is currently inside
+        self._membership: Dict[str, Set[str]] = {}
+        self._membership_loaded = False
+        self._membership_lock = asyncio.Lock()
+
+        # 'memory' (in-process registry) or 'postgis'; settled when membership is loaded
+        self.spatial_backend = "memory"
+
+        self.registry = GeofenceRegistry(cell_size=settings.geofence_grid_cell)
+        self.plant_gate = CircleGeofence("Plant Gate", self.plant_gate_lat, self.plant_gate_lng, self.geofence_radius)
+        self.registry.add(self.plant_gate)
+        if settings.geofences_file:
+            try:
+                self.registry.load_geojson(settings.geofences_file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading geofences from {settings.geofences_file}: {str(e)}")
+
+    def fences_containing(self, latitude: float, longitude: float) -> List[Geofence]:
+        """Geofences containing a location, tested against nearby candidates only"""
         try:
-            plant_gate = (self.plant_gate_lat, self.plant_gate_lng)
-            vehicle_location = (latitude, longitude)
-            
-            distance = geodesic(plant_gate, vehicle_location).meters
-            return distance <= self.geofence_radius
+            return self.registry.containing(latitude, longitude)
         except Exception as e:
             logger.error(f"Error checking geofence: {str(e)}")
-            return False
+            return []
+
+    def is_inside_geofence(self, latitude: float, longitude: float) -> bool:
+        """Check if a location is inside any geofence"""
+        return bool(self.fences_containing(latitude, longitude))
+
+    def is_near_geofence(self, latitude: float, longitude: float, distance: float) -> bool:
+        """Check if a location is within ``distance`` meters of any geofence"""
+        return bool(self.registry.within(latitude, longitude, distance))
 
     def get_distance_to_geofence(self, latitude: float, longitude: float) -> float:
         """Get distance in meters to the plant gate geofence center"""
         try:
-            plant_gate = (self.plant_gate_lat, self.plant_gate_lng)
-            vehicle_location = (latitude, longitude)
-            return geodesic(plant_gate, vehicle_location).meters
+            return self.plant_gate.distance_to_center(latitude, longitude)
         except Exception as e:
             logger.error(f"Error calculating distance: {str(e)}")
             return float('inf')
 
-    async def check_geofence_events(self, db: Session, vehicle_locations: List[Dict]) -> List[GeofenceEvent]:
-        """Check for geofence entry/exit events"""
+    def _event(self, vehicle_id: str, event_type: str, geofence_name: str,
+               latitude: float, longitude: float, timestamp: datetime) -> GeofenceEvent:
+        return GeofenceEvent(
+            vehicle_id=vehicle_id,
+            event_type=event_type,
+            latitude=latitude,
+            longitude=longitude,
+            geofence_name=geofence_name,
+            timestamp=timestamp
+        )
+
+    async def _select_backend(self, db: AsyncSession):
+        if settings.spatial_backend != "postgis":
+            self.spatial_backend = "memory"
+            return
+        if not await postgis_service.available(db):
+            logger.warning("SPATIAL_BACKEND=postgis but the PostGIS migration is not applied; using in-process geofences")
+            self.spatial_backend = "memory"
+            return
+        await postgis_service.sync_geofences(self.registry)
+        self.spatial_backend = "postgis"
+
+    async def containing_names(self, db: AsyncSession, latitudes: List[float], longitudes: List[float]) -> List[Set[str]]:
+        """Names of the geofences containing each point, from the active backend"""
+        if self.spatial_backend == "postgis":
+            return await postgis_service.containing_batch(db, latitudes, longitudes)
+        return [
+            {fence.name for fence in fences}
+            for fences in self.registry.containing_batch(latitudes, longitudes)
+        ]
+
+    async def load_membership(self, db: AsyncSession):
+        """Warm the membership map from every vehicle's latest stored fix"""
+        await self._select_backend(db)
+        result = await db.execute(
+            select(VehicleLatestLocation.vehicle_id, VehicleLatestLocation.latitude, VehicleLatestLocation.longitude)
+        )
+        rows = result.all()
+        containing = await self.containing_names(db, [row[1] for row in rows], [row[2] for row in rows])
+        self._membership = {row[0]: names for row, names in zip(rows, containing)}
+        self._membership_loaded = True
+        logger.info(f"Loaded geofence membership for {len(self._membership)} vehicles")
+
+    async def ensure_membership_loaded(self, db: AsyncSession):
+        if self._membership_loaded:
+            return
+        async with self._membership_lock:
+            if not self._membership_loaded:
+                await self.load_membership(db)
+
+    def invalidate_membership(self):
+        """Drop the membership map so it is rebuilt from the DB on next use"""
+        self._membership.clear()
+        self._membership_loaded = False
+
+    def membership(self, vehicle_id: str) -> Set[str]:
+        return set(self._membership.get(vehicle_id, ()))
+
+    async def check_geofence_events(self, db: AsyncSession, vehicle_locations: List[Dict]) -> List[GeofenceEvent]:
+        """Check for geofence entry/exit events against every nearby geofence.
+
+        Previous membership comes from the in-memory map, so apart from the
+        one-off warm-up no queries are issued. The map is updated as events
+        are detected; callers invalidate it if the batch fails to commit.
+        """
         events = []
-        
+        await self.ensure_membership_loaded(db)
+
+        fixes = []
         for location_data in vehicle_locations:
             vehicle_id = location_data.get("vehicle_id")
             if not vehicle_id:
@@ -62,59 +149,28 @@ class GeofenceService:
             except:
                 timestamp = datetime.utcnow()
 
-            # Check if vehicle is currently inside geofence
-            is_inside = self.is_inside_geofence(latitude, longitude)
-            
-            # Get the last known location for this vehicle
-            last_location = db.query(VehicleLocation).filter(
-                VehicleLocation.vehicle_id == vehicle_id
-            ).order_by(VehicleLocation.timestamp.desc()).first()
-            
-            if last_location:
-                was_inside = self.is_inside_geofence(last_location.latitude, last_location.longitude)
-                
-                # Check for entry event
-                if not was_inside and is_inside:
-                    event = GeofenceEvent(
-                        vehicle_id=vehicle_id,
-                        event_type="enter",
-                        latitude=latitude,
-                        longitude=longitude,
-                        geofence_name="Plant Gate",
-                        timestamp=timestamp
-                    )
-                    events.append(event)
-                    logger.info(f"Vehicle {vehicle_id} entered geofence")
-                
-                # Check for exit event
-                elif was_inside and not is_inside:
-                    event = GeofenceEvent(
-                        vehicle_id=vehicle_id,
-                        event_type="exit",
-                        latitude=latitude,
-                        longitude=longitude,
-                        geofence_name="Plant Gate",
-                        timestamp=timestamp
-                    )
-                    events.append(event)
-                    logger.info(f"Vehicle {vehicle_id} exited geofence")
-            
-            elif is_inside:
-                # First time seeing this vehicle and it's inside
-                event = GeofenceEvent(
-                    vehicle_id=vehicle_id,
-                    event_type="enter",
-                    latitude=latitude,
-                    longitude=longitude,
-                    geofence_name="Plant Gate",
-                    timestamp=timestamp
-                )
-                events.append(event)
-                logger.info(f"Vehicle {vehicle_id} initially detected inside geofence")
+            fixes.append((vehicle_id, latitude, longitude, timestamp))
+
+        # Containment for every fix in the batch in one vectorized pass (or one query)
+        containing = await self.containing_names(db, [fix[1] for fix in fixes], [fix[2] for fix in fixes])
+
+        for (vehicle_id, latitude, longitude, timestamp), inside in zip(fixes, containing):
+            # First time seeing this vehicle: report the fences it starts in
+            was_inside = self._membership.get(vehicle_id, set())
+
+            for name in inside - was_inside:
+                events.append(self._event(vehicle_id, "enter", name, latitude, longitude, timestamp))
+                logger.info(f"Vehicle {vehicle_id} entered geofence {name}")
+
+            for name in was_inside - inside:
+                events.append(self._event(vehicle_id, "exit", name, latitude, longitude, timestamp))
+                logger.info(f"Vehicle {vehicle_id} exited geofence {name}")
+
+            self._membership[vehicle_id] = inside
         
         return events
 
-    async def create_activity_log(self, db: Session, event: GeofenceEvent) -> ActivityLog:
+    async def create_activity_log(self, db: AsyncSession, event: GeofenceEvent) -> ActivityLog:
         """Create an activity log entry for a geofence event"""
         description = f"Vehicle {event.vehicle_id} {'entered' if event.event_type == 'enter' else 'exited'} {event.geofence_name}"
         
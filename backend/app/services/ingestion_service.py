@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from ..core.config import settings
+from .tracking_service import tracking_service
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionService:
+    """Bounded hand-off between the push ingestion API and the tracking pipeline.
+
+    The API enqueues validated batches and returns immediately; a small pool
+    of workers drains the queue into ``TrackingService.submit_locations``.
+    When the queue is full, ``submit`` refuses the batch so the caller can
+    push back on the sender instead of buffering without limit.
+    """
+
+    def __init__(self):
+        self.max_queue_size = settings.ingest_queue_size
+        self.worker_count = settings.ingest_workers
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: List[asyncio.Task] = []
+        self.batches_processed = 0
+        self.locations_processed = 0
+        self.batches_failed = 0
+
+    def submit(self, locations: List[Dict]) -> bool:
+        """Enqueue a batch of standardized fixes; False if the queue is full"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        try:
+            self.queue.put_nowait(locations)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _worker(self, worker_id: int):
+        while True:
+            locations = await self.queue.get()
+            try:
+                await tracking_service.submit_locations(locations)
+                self.batches_processed += 1
+                self.locations_processed += len(locations)
+            except Exception as e:
+                self.batches_failed += 1
+                logger.error(f"Ingestion worker {worker_id} failed to process batch: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def start(self):
+        """Start the ingestion workers"""
+        if self.workers:
+            return
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        tracking_service.start_pipeline()
+        self.workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.worker_count)
+        ]
+        logger.info(f"Started {self.worker_count} ingestion workers (queue size {self.max_queue_size})")
+
+    async def stop(self):
+        """Drain queued batches and stop the workers"""
+        if self.queue is not None and self.workers:
+            await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        logger.info("Ingestion workers stopped")
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and throughput counters"""
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "queue_capacity": self.max_queue_size,
+            "workers": len(self.workers),
+            "batches_processed": self.batches_processed,
+            "locations_processed": self.locations_processed,
+            "batches_failed": self.batches_failed
+        }
+
+
+# Create a singleton instance
+ingestion_service = IngestionService()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from ..core.config import settings
+from ..core.database import engine
+from ..models.vehicle import VehicleLocation
+
+logger = logging.getLogger(__name__)
+
+PARTITION_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class PartitionMaintenanceService:
+    """Keeps the time partitions of ``vehicle_locations`` rolling.
+
+    Creates partitions ``partitions_ahead`` periods into the future so inserts
+    never land in the default partition, and detaches (and by default drops)
+    partitions that fall entirely outside the retention window, so expiring
+    history is a catalog operation instead of a bulk DELETE.
+    """
+
+    def __init__(self):
+        self.table = VehicleLocation.__tablename__
+        self.interval = settings.location_partition_interval  # 'month' or 'day'
+        self.partitions_ahead = settings.location_partitions_ahead
+        self.retention_days = settings.location_retention_days
+        self.retention_action = settings.location_retention_action  # 'drop' or 'detach'
+        self.maintenance_interval = settings.partition_maintenance_interval  # seconds
+        self.is_running = False
+
+    def _period_start(self, moment: datetime) -> datetime:
+        if self.interval == "day":
+            return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def _next_period(self, start: datetime) -> datetime:
+        if self.interval == "day":
+            return start + timedelta(days=1)
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+
+    def _partition_name(self, start: datetime) -> str:
+        suffix = start.strftime("%Y%m%d" if self.interval == "day" else "%Y%m")
+        return f"{self.table}_p{suffix}"
+
+    def existing_partitions(self, connection) -> List[Tuple[str, datetime, datetime]]:
+        """Name and [start, end) bounds of every range partition"""
+        rows = connection.execute(text("""
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :table
+        """), {"table": self.table})
+
+        partitions = []
+        for name, bound in rows:
+            match = PARTITION_BOUND_RE.search(bound or "")
+            if not match:
+                continue  # the DEFAULT partition
+            start = datetime.fromisoformat(match.group(1))
+            end = datetime.fromisoformat(match.group(2))
+            partitions.append((name, start, end))
+        return partitions
+
+    def create_future_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """Create any missing partitions from the current period up to the look-ahead"""
+        now = now or datetime.now(timezone.utc)
+        with engine.connect() as connection:
+            existing = self.existing_partitions(connection)
+
+        created = []
+        start = self._period_start(now)
+        for _ in range(self.partitions_ahead + 1):
+            end = self._next_period(start)
+            overlaps = any(p_start < end and start < p_end for _, p_start, p_end in existing)
+            if not overlaps:
+                name = self._partition_name(start)
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(text(
+                            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{self.table}" '
+                            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                        ))
+                    created.append(name)
+                    logger.info(f"Created partition {name}")
+                except Exception as e:
+                    # Usually rows for this range already sit in the default partition
+                    logger.error(f"Failed to create partition {name}: {str(e)}")
+            start = end
+        return created
+
+    def expire_partitions(self, now: Optional[datetime] = None) -> List[str]:
+        """Detach (and drop) partitions whose whole range is past retention"""
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - timedelta(days=self.retention_days)
+        with engine.connect() as connection:
+            existing = self.existing_partitions(connection)
+
+        expired = []
+        for name, _, end in existing:
+            if end > cutoff:
+                continue
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(f'ALTER TABLE "{self.table}" DETACH PARTITION "{name}"'))
+                    if self.retention_action == "drop":
+                        connection.execute(text(f'DROP TABLE "{name}"'))
+                expired.append(name)
+                logger.info(f"Expired partition {name} ({self.retention_action})")
+            except Exception as e:
+                logger.error(f"Failed to expire partition {name}: {str(e)}")
+        return expired
+
+    def run_maintenance(self) -> Dict[str, List[str]]:
+        """Run one maintenance pass"""
+        return {
+            "created": self.create_future_partitions(),
+            "expired": self.expire_partitions()
+        }
+
+    async def start(self):
+        """Run maintenance periodically until stopped"""
+        if self.is_running:
+            return
+        self.is_running = True
+        try:
+            while self.is_running:
+                try:
+                    await asyncio.to_thread(self.run_maintenance)
+                except Exception as e:
+                    logger.error(f"Partition maintenance failed: {str(e)}")
+                await asyncio.sleep(self.maintenance_interval)
+        except asyncio.CancelledError:
+            logger.info("Partition maintenance cancelled")
+        finally:
+            self.is_running = False
+
+    def stop(self):
+        self.is_running = False
+
+
+# Create a singleton instance
+partition_service = PartitionMaintenanceService()
+
+
+if __name__ == "__main__":
+    # One-shot run for cron: python -m app.services.partition_service
+    logging.basicConfig(level=logging.INFO)
+    print(partition_service.run_maintenance())
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineStage:
+    """One stage of the tracking pipeline: a bounded queue and its workers.
+
+    ``put`` waits for room when the queue is full, which pushes back on the
+    upstream stage. Stages created with ``drop_when_full`` never wait; items
+    that do not fit are counted as dropped so a slow downstream (e.g. a Slack
+    webhook) cannot stall the stages feeding it.
+
+    Stages created with ``batched`` pass the handler a list: a worker drains
+    up to ``coalesce`` queued items at once, so a backlog is handled in fewer,
+    larger units of work (e.g. one transaction). Otherwise the handler gets
+    one item at a time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int = 1,
+        max_queue_size: int = 100,
+        drop_when_full: bool = False,
+        batched: bool = False,
+        coalesce: int = 1
+    ):
+        self.name = name
+        self.handler = handler
+        self.worker_count = max(1, workers)
+        self.max_queue_size = max_queue_size
+        self.drop_when_full = drop_when_full
+        self.batched = batched
+        self.coalesce = max(1, coalesce) if batched else 1
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.workers: List[asyncio.Task] = []
+        self.busy_workers = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth_seen = 0
+
+    def _record_depth(self):
+        self.max_depth_seen = max(self.max_depth_seen, self.queue.qsize())
+
+    def offer(self, item: Any) -> bool:
+        """Enqueue without waiting; False (and counted as dropped) if full"""
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._record_depth()
+        return True
+
+    async def put(self, item: Any):
+        """Enqueue, waiting for room unless the stage drops on overflow"""
+        if self.drop_when_full:
+            if not self.offer(item):
+                logger.warning(f"Pipeline stage '{self.name}' is full, dropping item")
+            return
+        await self.queue.put(item)
+        self._record_depth()
+
+    async def _worker(self, worker_id: int):
+        while True:
+            items = [await self.queue.get()]
+            while len(items) < self.coalesce and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+
+            self.busy_workers += 1
+            try:
+                await self.handler(items if self.batched else items[0])
+                self.processed += len(items)
+            except Exception as e:
+                self.failed += len(items)
+                logger.error(f"Pipeline stage '{self.name}' worker {worker_id} failed: {str(e)}")
+            finally:
+                self.busy_workers -= 1
+                for _ in items:
+                    self.queue.task_done()
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self.workers)
+
+    def start(self):
+        """Start the stage workers"""
+        if self.workers:
+            return
+        self.workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.worker_count)
+        ]
+
+    async def stop(self, drain: bool = True):
+        """Stop the workers, optionally after the queue has been drained"""
+        if drain and self.workers:
+            await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters for this stage"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.max_queue_size,
+            "max_depth_seen": self.max_depth_seen,
+            "workers": len(self.workers),
+            "busy_workers": self.busy_workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped
+        }
@@ -0,0 +1,114 @@
+import time
+import logging
+from typing import Dict, List, Optional
+from ..core.config import settings
+from .geofence_service import geofence_service
+
+logger = logging.getLogger(__name__)
+
+
+class PollingScheduler:
+    """Decides which vehicles are due for a location poll on each tick.
+
+    Every vehicle gets its own poll interval derived from its last fix:
+    moving vehicles and vehicles close to a geofence are polled at the fast
+    interval, vehicles that have been stationary for consecutive fixes drop
+    to the slow interval, and everything else uses the default interval.
+    """
+
+    def __init__(self):
+        self.fast_interval = settings.polling_interval_fast
+        self.default_interval = settings.polling_interval
+        self.slow_interval = settings.polling_interval_slow
+        self.moving_speed_threshold = settings.moving_speed_threshold  # km/h
+        self.geofence_buffer = settings.geofence_proximity_buffer  # meters
+        self.parked_after = 2  # consecutive stationary fixes before slowing down
+        self._next_due: Dict[str, float] = {}
+        self._stationary_fixes: Dict[str, int] = {}
+        self._intervals: Dict[str, float] = {}
+        self._polled_at: Dict[str, float] = {}
+
+    @property
+    def tick_interval(self) -> float:
+        """Scheduler resolution; no vehicle is polled more often than this"""
+        return min(self.fast_interval, self.default_interval, self.slow_interval)
+
+    @staticmethod
+    def _vehicle_key(vehicle: Dict) -> Optional[str]:
+        return vehicle.get("id") or vehicle.get("vehicle_id")
+
+    def due_vehicles(self, vehicles: List[Dict], now: Optional[float] = None) -> List[Dict]:
+        """Return the roster entries whose next poll is due.
+
+        ``now`` should be the tick's start time: the next poll of each due
+        vehicle is scheduled from it, not from when its fix is persisted, so
+        intervals stay aligned with the tick grid.
+        """
+        now = time.monotonic() if now is None else now
+        due = []
+        roster_ids = set()
+        for vehicle in vehicles:
+            vehicle_id = self._vehicle_key(vehicle)
+            if not vehicle_id:
+                continue
+            roster_ids.add(vehicle_id)
+            if self._next_due.get(vehicle_id, now) <= now:
+                due.append(vehicle)
+                self._polled_at[vehicle_id] = now
+
+        for vehicle_id in set(self._next_due) - roster_ids:
+            self.forget(vehicle_id)
+        return due
+
+    def interval_for(self, location: Dict) -> float:
+        """Pick the poll interval for a vehicle from its latest fix"""
+        vehicle_id = location.get("vehicle_id")
+        speed = location.get("speed") or 0.0
+        latitude = location.get("latitude")
+        longitude = location.get("longitude")
+
+        if latitude is not None and longitude is not None:
+            if geofence_service.is_near_geofence(latitude, longitude, self.geofence_buffer):
+                self._stationary_fixes[vehicle_id] = 0
+                return self.fast_interval
+
+        if speed >= self.moving_speed_threshold:
+            self._stationary_fixes[vehicle_id] = 0
+            return self.fast_interval
+
+        stationary = self._stationary_fixes.get(vehicle_id, 0) + 1
+        self._stationary_fixes[vehicle_id] = stationary
+        if stationary >= self.parked_after:
+            return self.slow_interval
+        return self.default_interval
+
+    def record_location(self, location: Dict, now: Optional[float] = None):
+        """Schedule the vehicle's next poll from a freshly received fix.
+
+        Polled vehicles are scheduled from the start of the tick that polled
+        them; pushed fixes (never polled) from ``now``.
+        """
+        vehicle_id = location.get("vehicle_id")
+        if not vehicle_id:
+            return
+        polled_at = self._polled_at.pop(vehicle_id, None)
+        if polled_at is None:
+            polled_at = time.monotonic() if now is None else now
+        interval = self.interval_for(location)
+        self._intervals[vehicle_id] = interval
+        self._next_due[vehicle_id] = polled_at + interval
+
+    def forget(self, vehicle_id: str):
+        """Drop scheduling state for a vehicle that left the roster"""
+        self._next_due.pop(vehicle_id, None)
+        self._stationary_fixes.pop(vehicle_id, None)
+        self._intervals.pop(vehicle_id, None)
+        self._polled_at.pop(vehicle_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of vehicles currently on each poll interval"""
+        return {
+            "fast": sum(1 for i in self._intervals.values() if i == self.fast_interval),
+            "default": sum(1 for i in self._intervals.values() if i == self.default_interval),
+            "slow": sum(1 for i in self._intervals.values() if i == self.slow_interval),
+        }
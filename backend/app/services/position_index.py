@@ -0,0 +1,248 @@
+import logging
+import math
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..models.vehicle import VehicleLatestLocation
+from .geo import METERS_PER_DEGREE, haversine_m
+
+logger = logging.getLogger(__name__)
+
+# Roughly how many vehicles one vectorized distance pass handles in the time
+# of a single grid-cell probe
+FULL_SCAN_PROBE_RATIO = 4
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return None
+
+
+class PositionIndex:
+    """Current vehicle positions bucketed on a uniform lat/lng grid.
+
+    Coordinates live in NumPy arrays indexed by a per-vehicle slot and each
+    grid cell holds the slots inside it. Radius queries scan only the cells
+    under the search circle; k-nearest queries grow a square of cells ring by
+    ring until the k-th distance is closer than anything outside the square.
+    Distances for the candidate slots are computed in one vectorized pass.
+    """
+
+    def __init__(self, cell_size: float = 0.01, capacity: int = 1024):
+        self.cell_size = cell_size  # degrees
+        self._positions: Dict[str, Dict] = {}
+        self._slots: Dict[str, int] = {}
+        self._vehicle_ids: List[Optional[str]] = [None] * capacity
+        self._free_slots: List[int] = []
+        self._size = 0
+        self._latitudes = np.full(capacity, np.nan)
+        self._longitudes = np.full(capacity, np.nan)
+        self._vehicle_cells: Dict[str, Tuple[int, int]] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self.cell_size)), int(math.floor(longitude / self.cell_size))
+
+    def _allocate_slot(self, vehicle_id: str) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            if self._size == len(self._latitudes):
+                grow = len(self._latitudes)
+                self._latitudes = np.concatenate([self._latitudes, np.full(grow, np.nan)])
+                self._longitudes = np.concatenate([self._longitudes, np.full(grow, np.nan)])
+                self._vehicle_ids.extend([None] * grow)
+            slot = self._size
+            self._size += 1
+        self._slots[vehicle_id] = slot
+        self._vehicle_ids[slot] = vehicle_id
+        return slot
+
+    def _leave_cell(self, vehicle_id: str, slot: int):
+        cell = self._vehicle_cells.pop(vehicle_id, None)
+        if cell is None:
+            return
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(slot)
+            if not members:
+                del self._cells[cell]
+
+    def update(self, location: Dict):
+        """Move a vehicle to its latest fix; older fixes are ignored"""
+        vehicle_id = location.get("vehicle_id")
+        latitude = location.get("latitude")
+        longitude = location.get("longitude")
+        if not vehicle_id or latitude is None or longitude is None:
+            return
+
+        timestamp = _as_datetime(location.get("timestamp"))
+        current = self._positions.get(vehicle_id)
+        if current and timestamp and current["timestamp"]:
+            try:
+                if timestamp < current["timestamp"]:
+                    return
+            except TypeError:
+                pass  # naive vs aware timestamps: take the newer arrival
+
+        slot = self._slots.get(vehicle_id)
+        if slot is None:
+            slot = self._allocate_slot(vehicle_id)
+
+        cell = self._cell(latitude, longitude)
+        if self._vehicle_cells.get(vehicle_id) != cell:
+            self._leave_cell(vehicle_id, slot)
+            self._cells.setdefault(cell, set()).add(slot)
+            self._vehicle_cells[vehicle_id] = cell
+
+        self._latitudes[slot] = latitude
+        self._longitudes[slot] = longitude
+        self._positions[vehicle_id] = {
+            "vehicle_id": vehicle_id,
+            "latitude": float(latitude),
+            "longitude": float(longitude),
+            "speed": location.get("speed", 0.0),
+            "heading": location.get("heading", 0.0),
+            "timestamp": timestamp
+        }
+
+    def update_many(self, locations: Iterable[Dict]):
+        for location in locations:
+            self.update(location)
+
+    async def load(self, db: AsyncSession):
+        """(Re)load current positions from the latest-location projection"""
+        result = await db.execute(select(VehicleLatestLocation))
+        self.clear()
+        for location in result.scalars():
+            self.update({
+                "vehicle_id": location.vehicle_id,
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "speed": location.speed,
+                "heading": location.heading,
+                "timestamp": location.timestamp
+            })
+        logger.info(f"Position index loaded with {len(self._positions)} vehicles")
+
+    def remove(self, vehicle_id: str):
+        self._positions.pop(vehicle_id, None)
+        slot = self._slots.pop(vehicle_id, None)
+        if slot is None:
+            return
+        self._leave_cell(vehicle_id, slot)
+        self._latitudes[slot] = np.nan
+        self._longitudes[slot] = np.nan
+        self._vehicle_ids[slot] = None
+        self._free_slots.append(slot)
+
+    def clear(self):
+        self.__init__(self.cell_size)
+
+    def _ring(self, center: Tuple[int, int], radius: int) -> Iterable[Tuple[int, int]]:
+        """Cells at Chebyshev distance exactly ``radius`` from ``center``"""
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    def _ring_clearance(self, latitude: float, rings: int) -> float:
+        """Meters the searched square extends beyond the query point, at minimum"""
+        edge_lat = min(abs(latitude) + rings * self.cell_size, 89.9)
+        return rings * self.cell_size * METERS_PER_DEGREE * math.cos(math.radians(edge_lat))
+
+    def _distances(self, latitude: float, longitude: float, slots: np.ndarray) -> np.ndarray:
+        return haversine_m(latitude, longitude, self._latitudes[slots], self._longitudes[slots])
+
+    def nearby(self, latitude: float, longitude: float, radius: Optional[float] = None,
+               k: Optional[int] = None) -> List[Dict]:
+        """Vehicles within ``radius`` meters and/or the ``k`` nearest, nearest first"""
+        if radius is None and k is None:
+            raise ValueError("radius or k is required")
+
+        center = self._cell(latitude, longitude)
+        max_rings = None
+        if radius is not None:
+            lat_span = radius / METERS_PER_DEGREE
+            edge_lat = min(abs(latitude) + lat_span, 89.9)
+            lng_span = lat_span / max(math.cos(math.radians(edge_lat)), 1e-6)
+            max_rings = int(math.ceil(max(lat_span, lng_span) / self.cell_size)) + 1
+
+        slot_chunks: List[np.ndarray] = []
+        distance_chunks: List[np.ndarray] = []
+        found = 0
+        rings = 0
+        while True:
+            # A vectorized pass over the whole fleet is cheaper per vehicle
+            # than a dict probe per cell, so stop growing the square early
+            probe_budget = min(len(self._cells), len(self._positions) // FULL_SCAN_PROBE_RATIO)
+            if rings and (2 * rings + 1) ** 2 > probe_budget:
+                slots = np.flatnonzero(~np.isnan(self._latitudes[:self._size]))
+                slot_chunks = [slots]
+                distance_chunks = [self._distances(latitude, longitude, slots)]
+                break
+
+            ring_slots = [slot for cell in self._ring(center, rings) for slot in self._cells.get(cell, ())]
+            rings += 1
+            if ring_slots:
+                slots = np.fromiter(ring_slots, dtype=np.intp, count=len(ring_slots))
+                slot_chunks.append(slots)
+                distance_chunks.append(self._distances(latitude, longitude, slots))
+                found += len(ring_slots)
+
+            if max_rings is not None and rings > max_rings:
+                break
+            if found >= len(self._positions):
+                break
+            if k is not None and found >= k:
+                kth = np.partition(np.concatenate(distance_chunks), k - 1)[k - 1]
+                if kth <= self._ring_clearance(latitude, rings - 1):
+                    break
+
+        if not slot_chunks:
+            return []
+        slots = np.concatenate(slot_chunks)
+        distances = np.concatenate(distance_chunks)
+        if radius is not None:
+            within = distances <= radius
+            slots, distances = slots[within], distances[within]
+        if k is not None and len(distances) > k:
+            nearest = np.argpartition(distances, k - 1)[:k]
+            slots, distances = slots[nearest], distances[nearest]
+        order = np.argsort(distances, kind="stable")
+
+        results = []
+        for index in order.tolist():
+            position = dict(self._positions[self._vehicle_ids[slots[index]]])
+            position["distance_m"] = float(distances[index])
+            results.append(position)
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "vehicles": len(self._positions),
+            "occupied_cells": len(self._cells),
+            "cell_size": self.cell_size
+        }
+
+
+# Create a singleton instance
+position_index = PositionIndex(cell_size=settings.position_grid_cell)
@@ -0,0 +1,165 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import Float, String, bindparam, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.database import AsyncSessionLocal
+from .geofence_registry import CircleGeofence, GeofenceRegistry, PolygonGeofence
+
+logger = logging.getLogger(__name__)
+
+POINT_SQL = "ST_SetSRID(ST_MakePoint(:longitude, :latitude), 4326)::geography"
+
+CONTAINING_BATCH_SQL = text("""
+    SELECT p.idx, g.name
+    FROM unnest(:latitudes, :longitudes) WITH ORDINALITY AS p(latitude, longitude, idx)
+    JOIN geofences g
+      ON ST_Covers(g.geog, ST_SetSRID(ST_MakePoint(p.longitude, p.latitude), 4326)::geography)
+""").bindparams(
+    bindparam("latitudes", type_=ARRAY(Float)),
+    bindparam("longitudes", type_=ARRAY(Float))
+)
+
+UPSERT_CIRCLE_SQL = text(f"""
+    INSERT INTO geofences (name, kind, geog, radius, updated_at)
+    VALUES (:name, 'circle', ST_Buffer({POINT_SQL}, :radius), :radius, now())
+    ON CONFLICT (name) DO UPDATE
+    SET kind = excluded.kind, geog = excluded.geog, radius = excluded.radius, updated_at = now()
+""")
+
+UPSERT_POLYGON_SQL = text("""
+    INSERT INTO geofences (name, kind, geog, radius, updated_at)
+    VALUES (:name, 'polygon', ST_GeogFromText(:wkt), NULL, now())
+    ON CONFLICT (name) DO UPDATE
+    SET kind = excluded.kind, geog = excluded.geog, radius = NULL, updated_at = now()
+""")
+
+POINT_TABLES = ('vehicle_locations', 'vehicle_latest_location', 'geofence_events')
+
+SCHEMA_CHECK_SQL = text("""
+    SELECT to_regclass('geofences') IS NOT NULL
+       AND (SELECT count(*) FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND column_name = 'geog' AND table_name = ANY(:tables)) = :table_count
+""").bindparams(bindparam("tables", type_=ARRAY(String)))
+
+DELETE_STALE_SQL = text("DELETE FROM geofences WHERE name <> ALL(:names)").bindparams(
+    bindparam("names", type_=ARRAY(String))
+)
+
+
+def polygon_wkt(rings: Sequence[Sequence[Tuple[float, float]]]) -> str:
+    """WKT for (lat, lng) rings; rings are closed if needed"""
+    parts = []
+    for ring in rings:
+        ring = list(ring)
+        if ring[0] != ring[-1]:
+            ring.append(ring[0])
+        parts.append("(" + ", ".join(f"{lng} {lat}" for lat, lng in ring) + ")")
+    return f"SRID=4326;POLYGON({', '.join(parts)})"
+
+
+class PostgisService:
+    """Spatial queries pushed into PostGIS.
+
+    Relies on the generated ``geog`` columns, GiST indexes and ``geofences``
+    table created by migration 0005. Used as an optional backend next to the
+    in-process geofence registry when ``SPATIAL_BACKEND=postgis``.
+    """
+
+    def __init__(self):
+        self._available: Optional[bool] = None
+
+    async def available(self, db: AsyncSession) -> bool:
+        """Whether migration 0005's geofences table and ``geog`` columns exist here"""
+        if self._available is None:
+            result = await db.execute(SCHEMA_CHECK_SQL, {
+                "tables": list(POINT_TABLES), "table_count": len(POINT_TABLES)
+            })
+            self._available = bool(result.scalar())
+        return self._available
+
+    async def sync_geofences(self, registry: GeofenceRegistry):
+        """Mirror the in-process registry into the geofences table, in its own transaction"""
+        circles = [
+            {"name": f.name, "latitude": f.latitude, "longitude": f.longitude, "radius": f.radius}
+            for f in registry if isinstance(f, CircleGeofence)
+        ]
+        polygons = [
+            {"name": f.name, "wkt": polygon_wkt(f.rings)}
+            for f in registry if isinstance(f, PolygonGeofence)
+        ]
+        async with AsyncSessionLocal() as db:
+            async with db.begin():
+                if circles:
+                    await db.execute(UPSERT_CIRCLE_SQL, circles)
+                if polygons:
+                    await db.execute(UPSERT_POLYGON_SQL, polygons)
+                await db.execute(DELETE_STALE_SQL, {"names": [f.name for f in registry]})
+        logger.info(f"Synced {len(circles)} circle and {len(polygons)} polygon geofences to PostGIS")
+
+    async def containing_batch(self, db: AsyncSession, latitudes: Sequence[float],
+                               longitudes: Sequence[float]) -> List[Set[str]]:
+        """Names of the geofences containing each point, in one indexed query"""
+        results: List[Set[str]] = [set() for _ in range(len(latitudes))]
+        if not results:
+            return results
+        rows = await db.execute(CONTAINING_BATCH_SQL, {
+            "latitudes": [float(v) for v in latitudes],
+            "longitudes": [float(v) for v in longitudes]
+        })
+        for idx, name in rows:
+            results[idx - 1].add(name)
+        return results
+
+    async def vehicles_within(self, db: AsyncSession, latitude: float, longitude: float,
+                              radius: float, limit: int = 100) -> List[Dict]:
+        """Latest positions within ``radius`` meters of a point, nearest first"""
+        result = await db.execute(
+            text(f"""
+                SELECT vehicle_id, latitude, longitude, speed, heading, timestamp,
+                       ST_Distance(geog, {POINT_SQL}) AS distance_m
+                FROM vehicle_latest_location
+                WHERE ST_DWithin(geog, {POINT_SQL}, :radius)
+                ORDER BY geog <-> {POINT_SQL}
+                LIMIT :limit
+            """),
+            {"latitude": latitude, "longitude": longitude, "radius": radius, "limit": limit}
+        )
+        return [dict(row._mapping) for row in result]
+
+    async def points_in_polygon(self, db: AsyncSession, start: datetime, end: datetime,
+                                rings: Optional[Sequence[Sequence[Tuple[float, float]]]] = None,
+                                geofence_name: Optional[str] = None,
+                                vehicle_id: Optional[str] = None, limit: int = 10000) -> List[Dict]:
+        """Stored fixes inside a polygon (or a named geofence) during ``[start, end)``"""
+        if (rings is None) == (geofence_name is None):
+            raise ValueError("Pass exactly one of rings or geofence_name")
+
+        if rings is not None:
+            area_sql = "ST_GeogFromText(:wkt)"
+            params = {"wkt": polygon_wkt(rings)}
+        else:
+            area_sql = "(SELECT geog FROM geofences WHERE name = :geofence_name)"
+            params = {"geofence_name": geofence_name}
+
+        vehicle_sql = "AND vehicle_id = :vehicle_id" if vehicle_id else ""
+        params.update({"start": start, "end": end, "vehicle_id": vehicle_id, "limit": limit})
+        result = await db.execute(
+            text(f"""
+                SELECT id, vehicle_id, latitude, longitude, speed, heading, timestamp
+                FROM vehicle_locations
+                WHERE timestamp >= :start AND timestamp < :end
+                  {vehicle_sql}
+                  AND ST_Covers({area_sql}, geog)
+                ORDER BY timestamp
+                LIMIT :limit
+            """),
+            params
+        )
+        return [dict(row._mapping) for row in result]
+
+
+# Create a singleton instance
+postgis_service = PostgisService()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import func, text
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.vehicle import VehicleLocation, VehicleLocationRollup
+from .geo import EARTH_RADIUS_M
+
+logger = logging.getLogger(__name__)
+
+# Great-circle distance from each fix to the vehicle's previous fix, in meters
+STEP_DISTANCE_SQL = f"""
+    2 * {EARTH_RADIUS_M} * asin(sqrt(
+        power(sin(radians(latitude - lag(latitude) OVER w) / 2), 2) +
+        cos(radians(lag(latitude) OVER w)) * cos(radians(latitude)) *
+        power(sin(radians(longitude - lag(longitude) OVER w) / 2), 2)
+    ))
+"""
+
+MINUTE_ROLLUP_SQL = f"""
+    INSERT INTO vehicle_location_rollups
+        (vehicle_id, resolution, bucket_start, latitude, longitude,
+         min_speed, avg_speed, max_speed, distance_m, point_count, last_timestamp)
+    SELECT
+        vehicle_id,
+        'minute',
+        date_trunc('minute', timestamp),
+        (array_agg(latitude ORDER BY timestamp DESC))[1],
+        (array_agg(longitude ORDER BY timestamp DESC))[1],
+        min(speed), avg(speed), max(speed),
+        COALESCE(sum(step_m), 0),
+        count(*),
+        max(timestamp)
+    FROM (
+        SELECT vehicle_id, latitude, longitude, speed, timestamp,
+               {STEP_DISTANCE_SQL} AS step_m
+        FROM vehicle_locations
+        WHERE timestamp >= :lookback_start AND timestamp < :end
+        WINDOW w AS (PARTITION BY vehicle_id ORDER BY timestamp)
+    ) steps
+    WHERE timestamp >= :start
+    GROUP BY vehicle_id, date_trunc('minute', timestamp)
+    ON CONFLICT (vehicle_id, resolution, bucket_start) DO UPDATE SET
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        min_speed = excluded.min_speed,
+        avg_speed = excluded.avg_speed,
+        max_speed = excluded.max_speed,
+        distance_m = excluded.distance_m,
+        point_count = excluded.point_count,
+        last_timestamp = excluded.last_timestamp,
+        updated_at = now()
+"""
+
+# UTC hour of a minute bucket; a bare date_trunc on timestamptz would use the
+# session TimeZone and disagree with the UTC window computed by _floor
+HOUR_BUCKET_SQL = "date_trunc('hour', bucket_start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+
+HOUR_ROLLUP_SQL = f"""
+    INSERT INTO vehicle_location_rollups
+        (vehicle_id, resolution, bucket_start, latitude, longitude,
+         min_speed, avg_speed, max_speed, distance_m, point_count, last_timestamp)
+    SELECT
+        vehicle_id,
+        'hour',
+        {HOUR_BUCKET_SQL},
+        (array_agg(latitude ORDER BY last_timestamp DESC))[1],
+        (array_agg(longitude ORDER BY last_timestamp DESC))[1],
+        min(min_speed),
+        sum(avg_speed * point_count) / NULLIF(sum(point_count), 0),
+        max(max_speed),
+        sum(distance_m),
+        sum(point_count),
+        max(last_timestamp)
+    FROM vehicle_location_rollups
+    WHERE resolution = 'minute' AND bucket_start >= :start AND bucket_start < :end
+    GROUP BY vehicle_id, {HOUR_BUCKET_SQL}
+    ON CONFLICT (vehicle_id, resolution, bucket_start) DO UPDATE SET
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        min_speed = excluded.min_speed,
+        avg_speed = excluded.avg_speed,
+        max_speed = excluded.max_speed,
+        distance_m = excluded.distance_m,
+        point_count = excluded.point_count,
+        last_timestamp = excluded.last_timestamp,
+        updated_at = now()
+"""
+
+
+class RollupService:
+    """Maintains minute and hour aggregates of the raw location history.
+
+    Each pass re-aggregates everything from a little before the last
+    rolled-up bucket up to now, so late fixes are folded in and the upserts
+    stay idempotent. A cold start catches up in ``max_chunk`` sized steps.
+    """
+
+    def __init__(self):
+        self.interval = settings.rollup_interval  # seconds
+        self.late_margin = timedelta(minutes=settings.rollup_late_minutes)
+        self.distance_lookback = timedelta(minutes=15)
+        self.max_chunk = timedelta(days=1)
+        self.is_running = False
+
+    @staticmethod
+    def _floor(moment: datetime, resolution: str) -> datetime:
+        # Buckets are UTC; database values come back in the session time zone
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+        moment = moment.replace(second=0, microsecond=0)
+        if resolution == "hour":
+            moment = moment.replace(minute=0)
+        return moment
+
+    def _catch_up_start(self, db, resolution: str, now: datetime) -> Optional[datetime]:
+        last_bucket = db.query(func.max(VehicleLocationRollup.bucket_start)).filter(
+            VehicleLocationRollup.resolution == resolution
+        ).scalar()
+        if last_bucket is not None:
+            return self._floor(min(last_bucket, now - self.late_margin), resolution)
+
+        if resolution == "minute":
+            first_fix = db.query(func.min(VehicleLocation.timestamp)).scalar()
+        else:
+            first_fix = db.query(func.min(VehicleLocationRollup.bucket_start)).filter(
+                VehicleLocationRollup.resolution == "minute"
+            ).scalar()
+        return self._floor(first_fix, resolution) if first_fix else None
+
+    def _roll_up(self, db, resolution: str, now: datetime) -> int:
+        start = self._catch_up_start(db, resolution, now)
+        if start is None:
+            return 0
+        # The current bucket is still filling up; it is rolled up on a later pass
+        end = self._floor(now, resolution)
+        buckets = 0
+        while start < end:
+            chunk_end = min(start + self.max_chunk, end)
+            if resolution == "minute":
+                result = db.execute(text(MINUTE_ROLLUP_SQL), {
+                    "lookback_start": start - self.distance_lookback,
+                    "start": start,
+                    "end": chunk_end
+                })
+            else:
+                result = db.execute(text(HOUR_ROLLUP_SQL), {"start": start, "end": chunk_end})
+            db.commit()
+            buckets += result.rowcount or 0
+            start = chunk_end
+        return buckets
+
+    def run_rollups(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Run one rollup pass: minutes from raw fixes, then hours from minutes"""
+        now = now or datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            return {
+                "minute": self._roll_up(db, "minute", now),
+                "hour": self._roll_up(db, "hour", now)
+            }
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def start(self):
+        """Run rollups periodically until stopped"""
+        if self.is_running:
+            return
+        self.is_running = True
+        try:
+            while self.is_running:
+                try:
+                    buckets = await asyncio.to_thread(self.run_rollups)
+                    logger.debug(f"Location rollups updated: {buckets}")
+                except Exception as e:
+                    logger.error(f"Location rollup failed: {str(e)}")
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            logger.info("Location rollups cancelled")
+        finally:
+            self.is_running = False
+
+    def stop(self):
+        self.is_running = False
+
+
+# Create a singleton instance
+rollup_service = RollupService()
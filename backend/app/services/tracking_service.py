@@ -1,14 +1,23 @@
 import asyncio
 import logging
-from datetime import datetime
-from typing import List, Dict
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..core.database import SessionLocal, AsyncSessionLocal
-from ..models.vehicle import Vehicle, VehicleLocation, GeofenceEvent
+from ..core.database import AsyncSessionLocal
+from ..models.vehicle import Vehicle, VehicleLocation, VehicleLatestLocation, GeofenceEvent, ActivityLog
 from .whilseye_service import whilseye_service
 from .geofence_service import geofence_service
+from .event_counter_service import event_counter_service
+from .position_index import position_index
+from .eta_service import eta_service
 from .notification_service import notification_service
+from .polling_scheduler import PollingScheduler
+from .pipeline import PipelineStage
+from .vehicle_registry import vehicle_registry
+from .partition_service import partition_service
+from .rollup_service import rollup_service
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -17,128 +26,319 @@ logger = logging.getLogger(__name__)
 class TrackingService:
     def __init__(self):
         self.polling_interval = settings.polling_interval
+        self.scheduler = PollingScheduler()
         self.is_running = False
         self.speed_limit = 80.0  # km/h
 
-    async def update_vehicle_locations(self):
+        # Fixes flow persist -> notify through bounded queues. Persisting waits
+        # for room (backpressure on the poller and ingestion workers); the
+        # notify stage drops on overflow so webhooks can never stall writes.
+        self.persist_stage = PipelineStage(
+            "persist",
+            self._persist_batches,
+            workers=settings.pipeline_persist_workers,
+            max_queue_size=settings.pipeline_persist_queue_size,
+            batched=True,
+            coalesce=settings.pipeline_persist_coalesce
+        )
+        self.notify_stage = PipelineStage(
+            "notify",
+            self._send_notification,
+            workers=settings.pipeline_notify_workers,
+            max_queue_size=settings.pipeline_notify_queue_size,
+            drop_when_full=True
+        )
+
+    async def update_vehicle_locations(self, tick_start: Optional[float] = None):
         """Fetch and update vehicle locations from WHILSEYE API"""
         try:
-            # Get locations from WHILSEYE API
-            locations = await whilseye_service.get_all_vehicle_locations()
+            # Only poll the vehicles whose adaptive interval has elapsed
+            vehicles = await whilseye_service.get_vehicles()
+            due_vehicles = self.scheduler.due_vehicles(vehicles, now=tick_start)
+            if not due_vehicles:
+                return
+
+            locations = [
+                location
+                async for location in whilseye_service.iter_vehicle_locations(vehicles=due_vehicles)
+            ]
             
             if not locations:
                 logger.warning("No vehicle locations received from WHILSEYE API")
                 return
 
-            # Use sync session for database operations
-            db = SessionLocal()
-            try:
-                # Process each location
-                for location_data in locations:
-                    await self._process_vehicle_location(db, location_data)
-                
-                # Check for geofence events
-                events = await geofence_service.check_geofence_events(db, locations)
-                
-                # Process geofence events
-                for event in events:
-                    await self._process_geofence_event(db, event)
-                
-                # Check for speed alerts
-                await self._check_speed_alerts(db, locations)
-                
-                db.commit()
-                logger.info(f"Successfully processed {len(locations)} vehicle locations")
-                
-            except Exception as e:
-                db.rollback()
-                logger.error(f"Error processing vehicle locations: {str(e)}")
-                raise
-            finally:
-                db.close()
+            await self.submit_locations(locations)
+            logger.info(
+                f"Polled {len(locations)} of {len(vehicles)} vehicles "
+                f"(intervals: {self.scheduler.stats()})"
+            )
                 
         except Exception as e:
             logger.error(f"Error updating vehicle locations: {str(e)}")
 
-    async def _process_vehicle_location(self, db: Session, location_data: Dict):
-        """Process a single vehicle location update"""
-        vehicle_id = location_data.get("vehicle_id")
-        if not vehicle_id:
-            return
+    def start_pipeline(self):
+        """Start the pipeline stage workers (idempotent)"""
+        self.notify_stage.start()
+        self.persist_stage.start()
 
-        # Ensure vehicle exists
-        vehicle = db.query(Vehicle).filter(Vehicle.vehicle_id == vehicle_id).first()
-        if not vehicle:
-            vehicle = Vehicle(
-                vehicle_id=vehicle_id,
-                driver_name=location_data.get("driver_name"),
-                license_plate=location_data.get("license_plate"),
-                vehicle_type=location_data.get("vehicle_type", "truck")
-            )
-            db.add(vehicle)
-            db.flush()
+    async def stop_pipeline(self):
+        """Drain and stop the pipeline, upstream stage first"""
+        await self.persist_stage.stop()
+        await self.notify_stage.stop()
+
+    def pipeline_stats(self) -> Dict[str, Dict]:
+        """Per-stage queue depth and throughput counters"""
+        return {
+            "persist": self.persist_stage.stats(),
+            "notify": self.notify_stage.stats()
+        }
+
+    async def submit_locations(self, locations: List[Dict]):
+        """Hand a batch of standardized fixes to the pipeline.
+
+        Shared by the polling loop and the push ingestion workers; waits while
+        the persist stage is at capacity.
+        """
+        self.start_pipeline()
+        await self.persist_stage.put(locations)
 
-        # Parse timestamp
-        timestamp_str = location_data.get("timestamp")
+    async def _persist_batches(self, batches: List[List[Dict]]):
+        """Persist stage: write fixes, detect geofence events, queue notifications.
+
+        Every batch drained from the queue is written in a single transaction
+        on the async engine, so the event loop keeps serving API traffic
+        while a cycle is being stored. If that transaction fails, each batch
+        is retried on its own so one bad batch does not drop the others.
+        """
+        locations = [location for batch in batches for location in batch]
+        failed = 0
+        try:
+            events = await self._write_locations(locations)
+        except Exception:
+            if len(batches) == 1:
+                raise
+            logger.warning(f"Writing {len(batches)} coalesced batches failed, retrying them one at a time")
+            locations, events = [], []
+            for batch in batches:
+                try:
+                    events.extend(await self._write_locations(batch))
+                    locations.extend(batch)
+                except Exception:
+                    failed += 1
+
+        await self._after_write(locations, events)
+        if failed:
+            raise RuntimeError(f"{failed} of {len(batches)} coalesced batches could not be persisted")
+
+    async def _write_locations(self, locations: List[Dict]) -> List[GeofenceEvent]:
+        """Write fixes and their geofence events in one transaction; returns the events"""
+        try:
+            async with AsyncSessionLocal() as db:
+                async with db.begin():
+                    # Check for geofence events against the in-memory membership state
+                    events = await geofence_service.check_geofence_events(db, locations)
+
+                    # Write the whole batch with a fixed number of statements
+                    rows = self._location_rows(locations)
+                    await self._upsert_vehicles(db, locations)
+                    await self._insert_locations(db, rows)
+                    await self._upsert_latest_locations(db, rows)
+                    
+                    # Process geofence events
+                    activities = []
+                    for event in events:
+                        activities.append(await self._process_geofence_event(db, event))
+                    await event_counter_service.record(db, events, activities)
+            logger.info(f"Successfully processed {len(locations)} vehicle locations in one transaction")
+            return events
+            
+        except Exception as e:
+            # Vehicles cached from the rolled-back upsert may not exist, and
+            # membership transitions from the batch were never recorded
+            vehicle_registry.invalidate()
+            geofence_service.invalidate_membership()
+            logger.error(f"Error processing vehicle locations: {str(e)}")
+            raise
+
+    async def _after_write(self, locations: List[Dict], events: List[GeofenceEvent]):
+        """Post-commit work; nothing here may fail the already committed write"""
+        # Events are committed: queue their notifications before anything else
+        for event in events:
+            await self.notify_stage.put({"type": "geofence", "event": event})
+
+        try:
+            for location_data in locations:
+                self.scheduler.record_location(location_data)
+            position_index.update_many(locations)
+            eta_service.update_many(locations)
+        except Exception as e:
+            logger.error(f"Error updating in-memory state after persisting locations: {str(e)}")
+
+        try:
+            await self._check_speed_alerts(locations)
+        except Exception as e:
+            logger.error(f"Error checking speed alerts: {str(e)}")
+
+    @staticmethod
+    def _parse_timestamp(timestamp_str) -> datetime:
+        # Always aware UTC, so polled (naive) and pushed ("Z") fixes compare cleanly
         try:
             if isinstance(timestamp_str, str):
                 timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+            elif isinstance(timestamp_str, datetime):
+                timestamp = timestamp_str
             else:
-                timestamp = timestamp_str or datetime.utcnow()
-        except:
-            timestamp = datetime.utcnow()
-
-        # Create location record
-        location = VehicleLocation(
-            vehicle_id=vehicle_id,
-            latitude=location_data.get("latitude"),
-            longitude=location_data.get("longitude"),
-            speed=location_data.get("speed", 0.0),
-            heading=location_data.get("heading", 0.0),
-            altitude=location_data.get("altitude", 0.0),
-            accuracy=location_data.get("accuracy", 0.0),
-            timestamp=timestamp
+                return datetime.now(timezone.utc)
+        except ValueError:
+            return datetime.now(timezone.utc)
+        if timestamp.tzinfo is None:
+            return timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(timezone.utc)
+
+    def _location_rows(self, locations: List[Dict]) -> List[Dict]:
+        """Build VehicleLocation insert rows for a batch of fixes"""
+        return [
+            {
+                "vehicle_id": location_data["vehicle_id"],
+                "latitude": location_data.get("latitude"),
+                "longitude": location_data.get("longitude"),
+                "speed": location_data.get("speed", 0.0),
+                "heading": location_data.get("heading", 0.0),
+                "altitude": location_data.get("altitude", 0.0),
+                "accuracy": location_data.get("accuracy", 0.0),
+                "timestamp": self._parse_timestamp(location_data.get("timestamp"))
+            }
+            for location_data in locations
+            if location_data.get("vehicle_id")
+        ]
+
+    async def _upsert_vehicles(self, db: AsyncSession, locations: List[Dict]):
+        """Create any unknown vehicles in a single INSERT ... ON CONFLICT DO NOTHING"""
+        await vehicle_registry.ensure_loaded(db)
+        vehicles = {}
+        for location_data in locations:
+            vehicle_id = location_data.get("vehicle_id")
+            if vehicle_id and vehicle_id not in vehicles and vehicle_id not in vehicle_registry:
+                vehicles[vehicle_id] = {
+                    "vehicle_id": vehicle_id,
+                    "driver_name": location_data.get("driver_name"),
+                    "license_plate": location_data.get("license_plate"),
+                    "vehicle_type": location_data.get("vehicle_type") or "truck",
+                    "is_active": True
+                }
+        if not vehicles:
+            return
+
+        statement = pg_insert(Vehicle).values(list(vehicles.values()))
+        await db.execute(statement.on_conflict_do_nothing(index_elements=["vehicle_id"]))
+        await vehicle_registry.refresh(db, vehicles.keys())
+
+    async def _insert_locations(self, db: AsyncSession, rows: List[Dict]):
+        """Insert location rows with one multi-row INSERT, or COPY for large batches"""
+        if not rows:
+            return
+
+        connection = await db.connection()
+        if len(rows) >= settings.bulk_copy_threshold and connection.dialect.driver == "asyncpg":
+            await self._copy_locations(connection, rows)
+        else:
+            await db.execute(insert(VehicleLocation), rows)
+
+    async def _upsert_latest_locations(self, db: AsyncSession, rows: List[Dict]):
+        """Advance the per-vehicle latest-position projection in one statement"""
+        latest = {}
+        for row in rows:
+            current = latest.get(row["vehicle_id"])
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                latest[row["vehicle_id"]] = row
+        if not latest:
+            return
+
+        statement = pg_insert(VehicleLatestLocation).values(list(latest.values()))
+        excluded = statement.excluded
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["vehicle_id"],
+            set_={
+                "latitude": excluded.latitude,
+                "longitude": excluded.longitude,
+                "speed": excluded.speed,
+                "heading": excluded.heading,
+                "altitude": excluded.altitude,
+                "accuracy": excluded.accuracy,
+                "timestamp": excluded.timestamp,
+                "updated_at": func.now()
+            },
+            # Late or replayed fixes must not move a vehicle backwards
+            where=VehicleLatestLocation.timestamp <= excluded.timestamp
+        ))
+
+    @staticmethod
+    async def _copy_locations(connection, rows: List[Dict]):
+        """Stream location rows into PostgreSQL with asyncpg's binary COPY"""
+        columns = list(rows[0].keys())
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            VehicleLocation.__tablename__,
+            records=[tuple(row[column] for column in columns) for row in rows],
+            columns=columns
         )
-        
-        db.add(location)
 
-    async def _process_geofence_event(self, db: Session, event: GeofenceEvent):
+    async def _process_geofence_event(self, db: AsyncSession, event: GeofenceEvent) -> ActivityLog:
         """Process a geofence event"""
         # Add event to database
         db.add(event)
-        db.flush()
+        await db.flush()
         
         # Create activity log
         activity = await geofence_service.create_activity_log(db, event)
-        
-        # Send notifications
-        try:
-            notification_result = await notification_service.send_geofence_notification(event)
-            
-            # Update event with notification status
-            event.notification_sent = any(notification_result.values())
-            
-            logger.info(f"Geofence event processed for vehicle {event.vehicle_id}: {event.event_type}")
-            
-        except Exception as e:
-            logger.error(f"Error sending notifications for geofence event: {str(e)}")
+        logger.info(f"Geofence event processed for vehicle {event.vehicle_id}: {event.event_type}")
+        return activity
 
-    async def _check_speed_alerts(self, db: Session, locations: List[Dict]):
-        """Check for speed limit violations"""
+    async def _check_speed_alerts(self, locations: List[Dict]):
+        """Check for speed limit violations and queue alerts"""
         for location_data in locations:
             speed = location_data.get("speed", 0.0)
             vehicle_id = location_data.get("vehicle_id")
             
             if speed > self.speed_limit and vehicle_id:
-                try:
-                    await notification_service.send_speed_alert(
-                        vehicle_id=vehicle_id,
-                        speed=speed,
-                        speed_limit=self.speed_limit
-                    )
-                    logger.info(f"Speed alert sent for vehicle {vehicle_id}: {speed} km/h")
-                except Exception as e:
-                    logger.error(f"Error sending speed alert: {str(e)}")
+                await self.notify_stage.put({
+                    "type": "speed_alert",
+                    "vehicle_id": vehicle_id,
+                    "speed": speed
+                })
+
+    async def _send_notification(self, job: Dict):
+        """Notify stage: deliver one queued geofence or speed notification"""
+        if job["type"] == "geofence":
+            event = job["event"]
+            try:
+                notification_result = await notification_service.send_geofence_notification(event)
+            except Exception as e:
+                logger.error(f"Error sending notifications for geofence event: {str(e)}")
+                return
+
+            # Update event with notification status
+            if any(notification_result.values()):
+                async with AsyncSessionLocal() as db:
+                    async with db.begin():
+                        await db.execute(
+                            update(GeofenceEvent)
+                            .where(GeofenceEvent.id == event.id)
+                            .values(notification_sent=True)
+                        )
+
+        elif job["type"] == "speed_alert":
+            vehicle_id = job["vehicle_id"]
+            speed = job["speed"]
+            try:
+                await notification_service.send_speed_alert(
+                    vehicle_id=vehicle_id,
+                    speed=speed,
+                    speed_limit=self.speed_limit
+                )
+                logger.info(f"Speed alert sent for vehicle {vehicle_id}: {speed} km/h")
+            except Exception as e:
+                logger.error(f"Error sending speed alert: {str(e)}")
 
     async def start_tracking(self):
         """Start the vehicle tracking service"""
@@ -147,18 +347,44 @@ class TrackingService:
             return
 
         self.is_running = True
-        logger.info(f"Starting vehicle tracking service (polling every {self.polling_interval} seconds)")
+        self.start_pipeline()
+        background_tasks = [
+            asyncio.create_task(partition_service.start()),
+            asyncio.create_task(rollup_service.start())
+        ]
+        tick = self.scheduler.tick_interval
+        logger.info(
+            f"Starting vehicle tracking service (tick every {tick} seconds, per-vehicle intervals "
+            f"{self.scheduler.fast_interval}/{self.scheduler.default_interval}/{self.scheduler.slow_interval} seconds)"
+        )
         
         try:
+            loop = asyncio.get_running_loop()
+            next_tick = loop.time()
             while self.is_running:
-                await self.update_vehicle_locations()
-                await asyncio.sleep(self.polling_interval)
+                # Same clock as time.monotonic(), which the scheduler uses
+                await self.update_vehicle_locations(tick_start=loop.time())
+
+                # Ticks are anchored to the start time so the schedule never drifts;
+                # a cycle that overruns its slot swallows the missed ticks instead of
+                # letting them queue up behind it.
+                next_tick += tick
+                now = loop.time()
+                if now >= next_tick:
+                    missed = int((now - next_tick) // tick) + 1
+                    logger.warning(f"Polling cycle overran its slot, coalescing {missed} tick(s)")
+                    next_tick += missed * tick
+                await asyncio.sleep(next_tick - now)
         except asyncio.CancelledError:
             logger.info("Vehicle tracking service cancelled")
         except Exception as e:
             logger.error(f"Error in tracking service: {str(e)}")
         finally:
             self.is_running = False
+            partition_service.stop()
+            rollup_service.stop()
+            for task in background_tasks:
+                task.cancel()
 
     def stop_tracking(self):
         """Stop the vehicle tracking service"""
@@ -167,24 +393,20 @@ class TrackingService:
 
     async def get_recent_locations(self, limit: int = 100) -> List[Dict]:
         """Get recent vehicle locations for the frontend"""
-        db = SessionLocal()
-        try:
-            # Get latest location for each vehicle
-            subquery = db.query(
-                VehicleLocation.vehicle_id,
-                VehicleLocation.timestamp.label('max_timestamp')
-            ).group_by(VehicleLocation.vehicle_id).subquery()
-            
-            locations = db.query(VehicleLocation).join(
-                subquery,
-                (VehicleLocation.vehicle_id == subquery.c.vehicle_id) &
-                (VehicleLocation.timestamp == subquery.c.max_timestamp)
-            ).limit(limit).all()
+        async with AsyncSessionLocal() as db:
+            # Latest location for each vehicle comes from the maintained projection
+            result = await db.execute(
+                select(VehicleLatestLocation)
+                .order_by(VehicleLatestLocation.timestamp.desc())
+                .limit(limit)
+            )
+            locations = list(result.scalars())
             
             # Convert to dict format
+            vehicles = await vehicle_registry.get_many((loc.vehicle_id for loc in locations), db)
             result = []
             for loc in locations:
-                vehicle = db.query(Vehicle).filter(Vehicle.vehicle_id == loc.vehicle_id).first()
+                vehicle = vehicles.get(loc.vehicle_id)
                 result.append({
                     "vehicle_id": loc.vehicle_id,
                     "latitude": loc.latitude,
@@ -192,15 +414,12 @@ class TrackingService:
                     "speed": loc.speed,
                     "heading": loc.heading,
                     "timestamp": loc.timestamp.isoformat(),
-                    "driver_name": vehicle.driver_name if vehicle else None,
-                    "license_plate": vehicle.license_plate if vehicle else None,
-                    "vehicle_type": vehicle.vehicle_type if vehicle else None
+                    "driver_name": vehicle["driver_name"] if vehicle else None,
+                    "license_plate": vehicle["license_plate"] if vehicle else None,
+                    "vehicle_type": vehicle["vehicle_type"] if vehicle else None
                 })
             
             return result
-            
-        finally:
-            db.close()
 
 
 # Create a singleton instance
@@ -0,0 +1,152 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..core.config import settings
+from ..models.vehicle import Vehicle
+
+logger = logging.getLogger(__name__)
+
+
+class VehicleRegistry:
+    """In-memory cache of Vehicle metadata keyed by ``vehicle_id``.
+
+    Loaded once from the database, kept up to date by invalidating entries
+    whenever vehicles are written, and bounded to ``max_size`` entries with
+    least-recently-used eviction. Entries are plain dicts so they can be
+    shared freely across sessions.
+    """
+
+    def __init__(self):
+        self.max_size = settings.vehicle_registry_size
+        self._vehicles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._loaded = False
+        # True while every vehicle in the database fits in the cache
+        self._complete = False
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _to_dict(vehicle: Vehicle) -> Dict:
+        return {
+            "id": vehicle.id,
+            "vehicle_id": vehicle.vehicle_id,
+            "driver_name": vehicle.driver_name,
+            "license_plate": vehicle.license_plate,
+            "vehicle_type": vehicle.vehicle_type,
+            "created_at": vehicle.created_at,
+            "updated_at": vehicle.updated_at,
+            "is_active": vehicle.is_active
+        }
+
+    def _store(self, vehicle: Dict):
+        self._vehicles[vehicle["vehicle_id"]] = vehicle
+        self._vehicles.move_to_end(vehicle["vehicle_id"])
+        while len(self._vehicles) > self.max_size:
+            self._vehicles.popitem(last=False)
+            self._complete = False
+
+    def _lookup(self, vehicle_id: str) -> Optional[Dict]:
+        vehicle = self._vehicles.get(vehicle_id)
+        if vehicle is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._vehicles.move_to_end(vehicle_id)
+        return vehicle
+
+    async def load(self, db: AsyncSession):
+        """(Re)load the registry from the database"""
+        result = await db.execute(select(Vehicle).order_by(Vehicle.id).limit(self.max_size + 1))
+        vehicles = list(result.scalars())
+        self._vehicles.clear()
+        for vehicle in vehicles[:self.max_size]:
+            self._store(self._to_dict(vehicle))
+        self._complete = len(vehicles) <= self.max_size
+        self._loaded = True
+        logger.info(f"Vehicle registry loaded with {len(self._vehicles)} vehicles")
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if not self._loaded:
+            await self.load(db)
+
+    def __contains__(self, vehicle_id: str) -> bool:
+        return vehicle_id in self._vehicles
+
+    async def get(self, vehicle_id: str, db: Optional[AsyncSession] = None) -> Optional[Dict]:
+        """Return vehicle metadata, falling back to the database on a miss"""
+        vehicle = self._lookup(vehicle_id)
+        if vehicle is not None or db is None or self._complete:
+            return vehicle
+
+        result = await db.execute(select(Vehicle).where(Vehicle.vehicle_id == vehicle_id))
+        row = result.scalars().first()
+        if row is None:
+            return None
+        vehicle = self._to_dict(row)
+        self._store(vehicle)
+        return vehicle
+
+    async def get_many(self, vehicle_ids: Iterable[str], db: Optional[AsyncSession] = None) -> Dict[str, Dict]:
+        """Return metadata for several vehicles with at most one query for the misses"""
+        found = {}
+        missing = []
+        for vehicle_id in set(vehicle_ids):
+            vehicle = self._lookup(vehicle_id)
+            if vehicle is not None:
+                found[vehicle_id] = vehicle
+            else:
+                missing.append(vehicle_id)
+
+        if missing and db is not None and not self._complete:
+            result = await db.execute(select(Vehicle).where(Vehicle.vehicle_id.in_(missing)))
+            for row in result.scalars():
+                vehicle = self._to_dict(row)
+                self._store(vehicle)
+                found[row.vehicle_id] = vehicle
+        return found
+
+    async def all_active(self, db: AsyncSession) -> List[Dict]:
+        """Return every active vehicle, from memory when the registry holds the whole fleet"""
+        await self.ensure_loaded(db)
+        if not self._complete:
+            result = await db.execute(select(Vehicle).where(Vehicle.is_active == True))
+            return [self._to_dict(vehicle) for vehicle in result.scalars()]
+        return sorted(
+            (vehicle for vehicle in self._vehicles.values() if vehicle["is_active"]),
+            key=lambda vehicle: vehicle["id"]
+        )
+
+    async def refresh(self, db: AsyncSession, vehicle_ids: Iterable[str]):
+        """Re-read the given vehicles after they were written, in one query"""
+        vehicle_ids = set(vehicle_ids)
+        if not vehicle_ids:
+            return
+        for vehicle_id in vehicle_ids:
+            self._vehicles.pop(vehicle_id, None)
+        result = await db.execute(select(Vehicle).where(Vehicle.vehicle_id.in_(vehicle_ids)))
+        for row in result.scalars():
+            self._store(self._to_dict(row))
+
+    def invalidate(self, vehicle_id: Optional[str] = None):
+        """Drop one vehicle (or the whole registry) after a write"""
+        if vehicle_id is None:
+            self._vehicles.clear()
+            self._loaded = False
+            self._complete = False
+            return
+        self._vehicles.pop(vehicle_id, None)
+        self._complete = False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._vehicles),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Create a singleton instance
+vehicle_registry = VehicleRegistry()
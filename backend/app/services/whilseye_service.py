@@ -1,12 +1,112 @@
 import httpx
 import asyncio
+import base64
+import json
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional
 from ..core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Floor for proactive refreshes so short-lived (or expires_in=0) tokens can't loop logins
+MIN_REFRESH_DELAY = 10.0  # seconds
+
+
+class TokenManager:
+    """Single access token shared by every WHILSEYE API call.
+
+    Only one login runs at a time; callers that need a token while a login
+    is in flight wait for its result instead of starting their own. When the
+    token's expiry is known, a background refresh is scheduled
+    ``refresh_margin`` seconds ahead of it so polling never pays for auth.
+    """
+
+    def __init__(self, login: Callable[[], Awaitable[Optional[Dict]]], refresh_margin: float = 60.0):
+        self._login = login
+        self.refresh_margin = refresh_margin  # seconds
+        self.access_token: Optional[str] = None
+        self.expires_at: Optional[float] = None  # time.monotonic() deadline
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def _is_valid(self) -> bool:
+        if not self.access_token:
+            return False
+        return self.expires_at is None or time.monotonic() < self.expires_at
+
+    @staticmethod
+    def _token_lifetime(data: Dict, token: str) -> Optional[float]:
+        """Seconds until the token expires, from the login payload or the JWT exp claim"""
+        if data.get("expires_in") is not None:
+            return float(data["expires_in"])
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            return float(claims["exp"]) - time.time()
+        except Exception:
+            return None
+
+    async def get_token(self) -> Optional[str]:
+        """Return a usable access token, logging in only if there is none"""
+        if self._is_valid():
+            return self.access_token
+        return await self.refresh()
+
+    async def refresh(self, stale_token: Optional[str] = None) -> Optional[str]:
+        """Log in again, collapsing concurrent requests into a single login.
+
+        ``stale_token`` is the token a caller saw rejected; if another caller
+        has already replaced it, the fresh token is returned without a login.
+        """
+        async with self._lock:
+            if self._is_valid() and (stale_token is None or self.access_token != stale_token):
+                return self.access_token
+            return await self._do_login()
+
+    async def _do_login(self) -> Optional[str]:
+        data = await self._login()
+        if not data or not data.get("access_token"):
+            self.access_token = None
+            self.expires_at = None
+            return None
+
+        self.access_token = data["access_token"]
+        lifetime = self._token_lifetime(data, self.access_token)
+        self.expires_at = time.monotonic() + lifetime if lifetime is not None else None
+        self._schedule_refresh(lifetime)
+        return self.access_token
+
+    def _schedule_refresh(self, lifetime: Optional[float]):
+        current = asyncio.current_task()
+        if self._refresh_task and self._refresh_task is not current and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        self._refresh_task = None
+        if lifetime is None:
+            return
+        # Short lifetimes refresh halfway through instead of immediately
+        delay = max(lifetime - self.refresh_margin, lifetime / 2, MIN_REFRESH_DELAY)
+        self._refresh_task = asyncio.create_task(self._refresh_later(delay))
+
+    async def _refresh_later(self, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            async with self._lock:
+                logger.info("Proactively refreshing WHILSEYE access token")
+                await self._do_login()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Proactive token refresh failed: {str(e)}")
+
+    def close(self):
+        """Cancel any scheduled refresh"""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        self._refresh_task = None
+
 
 class WhilseyeService:
     def __init__(self):
@@ -14,11 +114,31 @@ class WhilseyeService:
         self.username = settings.whilseye_username
         self.password = settings.whilseye_password
         self.api_key = settings.whilseye_api_key
-        self.access_token = None
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.token_manager = TokenManager(
+            self._login,
+            refresh_margin=settings.whilseye_token_refresh_margin
+        )
+        self.max_concurrency = max(1, settings.whilseye_max_concurrency)
+        self.poll_deadline = settings.whilseye_poll_deadline  # seconds
+        self.roster_ttl = settings.whilseye_roster_ttl  # seconds
+        self._roster: Optional[List[Dict]] = None
+        self._roster_etag: Optional[str] = None
+        self._roster_last_modified: Optional[str] = None
+        self._roster_fetched_at = float("-inf")
+        self.client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
 
-    async def authenticate(self) -> bool:
-        """Authenticate with WHILSEYE API and get access token"""
+    @property
+    def access_token(self) -> Optional[str]:
+        return self.token_manager.access_token
+
+    async def _login(self) -> Optional[Dict]:
+        """Call the WHILSEYE login endpoint and return the token payload"""
         try:
             auth_data = {
                 "username": self.username,
@@ -33,69 +153,153 @@ class WhilseyeService:
             )
             
             if response.status_code == 200:
-                data = response.json()
-                self.access_token = data.get("access_token")
                 logger.info("Successfully authenticated with WHILSEYE API")
-                return True
+                return response.json()
             else:
                 logger.error(f"Authentication failed: {response.status_code} - {response.text}")
-                return False
+                return None
                 
         except Exception as e:
             logger.error(f"Authentication error: {str(e)}")
-            return False
+            return None
+
+    async def authenticate(self) -> bool:
+        """Authenticate with WHILSEYE API and get access token"""
+        return await self.token_manager.refresh(stale_token=self.access_token) is not None
+
+    async def _authorized_get(
+        self, path: str, headers: Optional[Dict] = None, stream: bool = False
+    ) -> httpx.Response:
+        """GET an API path with the shared token, re-authenticating at most once on 401.
+
+        With ``stream=True`` the body is not read; the caller must ``aclose()``
+        the returned response.
+        """
+        async def send(token: Optional[str]) -> httpx.Response:
+            request = self.client.build_request(
+                "GET",
+                f"{self.api_url}{path}",
+                headers={
+                    "Authorization": f"Bearer {token}",
+                    "Content-Type": "application/json",
+                    **(headers or {})
+                }
+            )
+            return await self.client.send(request, stream=stream)
+
+        token = await self.token_manager.get_token()
+        response = await send(token)
+
+        if response.status_code == 401:
+            # Token expired; wait for (or perform) a single shared re-auth and retry once
+            fresh_token = await self.token_manager.refresh(stale_token=token)
+            if fresh_token:
+                await response.aclose()
+                response = await send(fresh_token)
+        return response
+
+    @staticmethod
+    async def _iter_json_array(chunks: AsyncIterator[str], key: str) -> AsyncIterator[Dict]:
+        """Incrementally decode the items of the top-level ``key`` array.
+
+        Only one item's worth of text is buffered at a time, so a large roster
+        never has to be held (or parsed) as a single document.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ""
+        in_array = False
+        marker = f'"{key}"'
+
+        async for chunk in chunks:
+            buffer += chunk
+            if not in_array:
+                key_pos = buffer.find(marker)
+                if key_pos == -1:
+                    # Keep a tail in case the key is split across chunks
+                    buffer = buffer[-len(marker):]
+                    continue
+                array_pos = buffer.find("[", key_pos + len(marker))
+                if array_pos == -1:
+                    continue
+                buffer = buffer[array_pos + 1:]
+                in_array = True
+
+            pos = 0
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos >= len(buffer):
+                    break
+                if buffer[pos] == "]":
+                    return
+                try:
+                    item, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Item is incomplete; wait for the next chunk
+                    break
+                yield item
+            buffer = buffer[pos:]
+
+    def _roster_is_fresh(self) -> bool:
+        return (
+            self._roster is not None
+            and time.monotonic() - self._roster_fetched_at < self.roster_ttl
+        )
+
+    def invalidate_roster(self):
+        """Force the next get_vehicles() call to revalidate with the API"""
+        self._roster_fetched_at = float("-inf")
 
     async def get_vehicles(self) -> List[Dict]:
-        """Get list of all vehicles from WHILSEYE API"""
-        if not self.access_token:
-            await self.authenticate()
-            
+        """Get list of all vehicles from WHILSEYE API.
+
+        The roster is cached for ``roster_ttl`` seconds and then revalidated
+        with a conditional request, so an unchanged roster costs a 304.
+        """
+        if self._roster_is_fresh():
+            return list(self._roster)
+
+        conditional_headers = {}
+        if self._roster is not None:
+            if self._roster_etag:
+                conditional_headers["If-None-Match"] = self._roster_etag
+            if self._roster_last_modified:
+                conditional_headers["If-Modified-Since"] = self._roster_last_modified
+
         try:
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            response = await self.client.get(
-                f"{self.api_url}/vehicles",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                return response.json().get("vehicles", [])
-            elif response.status_code == 401:
-                # Token expired, re-authenticate
-                await self.authenticate()
-                return await self.get_vehicles()
-            else:
-                logger.error(f"Failed to get vehicles: {response.status_code}")
-                return []
+            response = await self._authorized_get("/vehicles", headers=conditional_headers, stream=True)
+            try:
+                if response.status_code == 304 and self._roster is not None:
+                    self._roster_fetched_at = time.monotonic()
+                    return list(self._roster)
+                elif response.status_code == 200:
+                    roster = [
+                        vehicle
+                        async for vehicle in self._iter_json_array(response.aiter_text(), "vehicles")
+                    ]
+                    self._roster = roster
+                    self._roster_etag = response.headers.get("ETag")
+                    self._roster_last_modified = response.headers.get("Last-Modified")
+                    self._roster_fetched_at = time.monotonic()
+                    return list(roster)
+                else:
+                    logger.error(f"Failed to get vehicles: {response.status_code}")
+            finally:
+                await response.aclose()
                 
         except Exception as e:
             logger.error(f"Error getting vehicles: {str(e)}")
-            return []
+
+        # Fall back to the last known roster rather than dropping the whole fleet
+        return list(self._roster) if self._roster is not None else []
 
     async def get_vehicle_location(self, vehicle_id: str) -> Optional[Dict]:
         """Get current location of a specific vehicle"""
-        if not self.access_token:
-            await self.authenticate()
-            
         try:
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            response = await self.client.get(
-                f"{self.api_url}/vehicles/{vehicle_id}/location",
-                headers=headers
-            )
+            response = await self._authorized_get(f"/vehicles/{vehicle_id}/location")
             
             if response.status_code == 200:
                 return response.json()
-            elif response.status_code == 401:
-                await self.authenticate()
-                return await self.get_vehicle_location(vehicle_id)
             else:
                 logger.error(f"Failed to get vehicle location: {response.status_code}")
                 return None
@@ -104,36 +308,90 @@ class WhilseyeService:
             logger.error(f"Error getting vehicle location: {str(e)}")
             return None
 
-    async def get_all_vehicle_locations(self) -> List[Dict]:
-        """Get current locations of all vehicles"""
-        vehicles = await self.get_vehicles()
-        locations = []
-        
+    def _standardize_location(self, vehicle: Dict, vehicle_id: str, location: Dict) -> Dict:
+        """Standardize the location data format"""
+        return {
+            "vehicle_id": vehicle_id,
+            "latitude": location.get("lat") or location.get("latitude"),
+            "longitude": location.get("lng") or location.get("longitude"),
+            "speed": location.get("speed", 0.0),
+            "heading": location.get("heading") or location.get("bearing", 0.0),
+            "altitude": location.get("altitude", 0.0),
+            "accuracy": location.get("accuracy", 0.0),
+            "timestamp": location.get("timestamp") or datetime.utcnow().isoformat(),
+            "driver_name": vehicle.get("driver_name"),
+            "license_plate": vehicle.get("license_plate"),
+            "vehicle_type": vehicle.get("vehicle_type")
+        }
+
+    async def _fetch_standardized_location(
+        self, semaphore: asyncio.Semaphore, vehicle: Dict, vehicle_id: str
+    ) -> Optional[Dict]:
+        """Fetch one vehicle location while holding a concurrency slot"""
+        async with semaphore:
+            location = await self.get_vehicle_location(vehicle_id)
+        if not location:
+            return None
+        return self._standardize_location(vehicle, vehicle_id, location)
+
+    async def iter_vehicle_locations(
+        self,
+        vehicles: Optional[List[Dict]] = None,
+        max_concurrency: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[Dict]:
+        """Yield standardized vehicle locations as soon as each fetch completes.
+
+        At most ``max_concurrency`` location requests are in flight at once.
+        Fetches still outstanding when ``deadline`` seconds have elapsed are
+        cancelled, so a cycle never runs past its polling slot.
+        """
+        if vehicles is None:
+            vehicles = await self.get_vehicles()
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or self.max_concurrency))
+        deadline = self.poll_deadline if deadline is None else deadline
+
+        tasks = []
         for vehicle in vehicles:
             vehicle_id = vehicle.get("id") or vehicle.get("vehicle_id")
             if vehicle_id:
-                location = await self.get_vehicle_location(vehicle_id)
+                tasks.append(asyncio.create_task(
+                    self._fetch_standardized_location(semaphore, vehicle, vehicle_id)
+                ))
+
+        if not tasks:
+            return
+
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=deadline or None):
+                try:
+                    location = await next_done
+                except asyncio.TimeoutError:
+                    pending = sum(1 for task in tasks if not task.done())
+                    logger.warning(
+                        f"Poll deadline of {deadline}s reached with {pending} of "
+                        f"{len(tasks)} vehicle locations outstanding"
+                    )
+                    break
                 if location:
-                    # Standardize the location data format
-                    standardized_location = {
-                        "vehicle_id": vehicle_id,
-                        "latitude": location.get("lat") or location.get("latitude"),
-                        "longitude": location.get("lng") or location.get("longitude"),
-                        "speed": location.get("speed", 0.0),
-                        "heading": location.get("heading") or location.get("bearing", 0.0),
-                        "altitude": location.get("altitude", 0.0),
-                        "accuracy": location.get("accuracy", 0.0),
-                        "timestamp": location.get("timestamp") or datetime.utcnow().isoformat(),
-                        "driver_name": vehicle.get("driver_name"),
-                        "license_plate": vehicle.get("license_plate"),
-                        "vehicle_type": vehicle.get("vehicle_type")
-                    }
-                    locations.append(standardized_location)
-                    
+                    yield location
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_all_vehicle_locations(self) -> List[Dict]:
+        """Get current locations of all vehicles"""
+        locations = []
+        async for location in self.iter_vehicle_locations():
+            locations.append(location)
         return locations
 
     async def close(self):
         """Close the HTTP client"""
+        self.token_manager.close()
         await self.client.aclose()
 
 
@@ -10,6 +10,8 @@ import uvicorn
 import random
 import math
 import base64
+import os
+from app.geo import EtaEngine, PoiIndex, RouteRegistry, SpeedZoneMap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -76,6 +78,46 @@ DESTINATION = {
     "radius": 200
 }
 
+# Predefined route waypoints (NTPC Talcher to Chandilkhol)
+ROUTE_WAYPOINTS = [
+    {"latitude": 20.9463, "longitude": 85.2190, "name": "NTPC Talcher"},
+    {"latitude": 20.9520, "longitude": 85.2380, "name": "Talcher Junction"},
+    {"latitude": 20.9680, "longitude": 85.2890, "name": "Boinda"},
+    {"latitude": 20.9850, "longitude": 85.3450, "name": "Dhenkanal Road"},
+    {"latitude": 20.9950, "longitude": 85.4200, "name": "Dhenkanal"},
+    {"latitude": 21.0100, "longitude": 85.5100, "name": "Kamakhyanagar"},
+    {"latitude": 20.9800, "longitude": 85.6200, "name": "Parjang"},
+    {"latitude": 20.9500, "longitude": 85.7800, "name": "Hindol Road"},
+    {"latitude": 20.9200, "longitude": 85.8900, "name": "Bhuban"},
+    {"latitude": 20.8950, "longitude": 86.0200, "name": "Jajpur Road"},
+    {"latitude": 20.8739, "longitude": 86.0891, "name": "Chandilkhol Industrial Area"}
+]
+
+# Routes compiled once (and cached on disk) for O(1) on-route checks and route
+# progress. The built-in lane is the default for vehicles without an assignment;
+# more lanes are loaded from GeoJSON/GPX files in ROUTES_DIR.
+ROUTE_REGISTRY = RouteRegistry(cache_dir=os.getenv("ROUTE_CACHE_DIR", ".route_cache"), corridor_width=500)
+ROUTE_REGISTRY.register(
+    "talcher-chandilkhol", ROUTE_WAYPOINTS, name="NTPC Talcher to Chandilkhol",
+    plant=PLANT_STOCKYARD, destination=DESTINATION, default=True
+)
+if os.getenv("ROUTES_DIR"):
+    ROUTE_REGISTRY.load_directory(os.getenv("ROUTES_DIR"))
+
+# Destination ETAs from segment speeds learned as the trucks move
+ETA_ENGINE = EtaEngine(ROUTE_REGISTRY)
+
+# Nearest-landmark lookups for incident descriptions
+POI_INDEX = PoiIndex()
+POI_INDEX.add_layer("landmarks", [w for route in ROUTE_REGISTRY for w in route.landmarks])
+
+# Speed zones compiled once: 50 km/h within 5km of towns, 80 km/h on the highway
+CITY_WAYPOINTS = ["NTPC Talcher", "Dhenkanal", "Chandilkhol Industrial Area"]
+SPEED_ZONES = SpeedZoneMap(reference_latitude=ROUTE_WAYPOINTS[0]["latitude"], default_limit=80)
+for waypoint in ROUTE_WAYPOINTS:
+    if waypoint["name"] in CITY_WAYPOINTS:
+        SPEED_ZONES.add_circle(waypoint["latitude"], waypoint["longitude"], 5000, 50)
+
 # Critical contact list for incident paging
 CRITICAL_CONTACTS = [
     {
@@ -169,6 +211,11 @@ mock_vehicles = [
     }
 ]
 
+# Assign every vehicle to its route (the default lane unless it names one)
+for vehicle in mock_vehicles:
+    vehicle.setdefault("route_id", ROUTE_REGISTRY.default_route_id)
+    ROUTE_REGISTRY.assign(vehicle["vehicle_id"], vehicle["route_id"])
+
 # Storage for incidents and gate entries
 critical_incidents = []
 gate_entries = []
@@ -289,7 +336,7 @@ def check_critical_incidents(vehicle):
         incidents.append(incident)
     
     # Route deviation for extended period (>30 minutes)
-    if not is_on_route(vehicle["latitude"], vehicle["longitude"])[0] and vehicle["stop_duration"] > 30:
+    if not is_on_route(vehicle["latitude"], vehicle["longitude"], vehicle_id=vehicle["vehicle_id"])[0] and vehicle["stop_duration"] > 30:
         incident = {
             "id": f"CRITICAL_DEVIATION_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
@@ -343,57 +390,17 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return R * c
 
-def is_on_route(vehicle_lat, vehicle_lon, max_deviation=500):
+def is_on_route(vehicle_lat, vehicle_lon, max_deviation=500, vehicle_id=None):
     """Check if vehicle is on route"""
-    route_waypoints = [
-        {"latitude": 20.9463, "longitude": 85.2190, "name": "NTPC Talcher"},
-        {"latitude": 20.9520, "longitude": 85.2380, "name": "Talcher Junction"},
-        {"latitude": 20.9680, "longitude": 85.2890, "name": "Boinda"},
-        {"latitude": 20.9850, "longitude": 85.3450, "name": "Dhenkanal Road"},
-        {"latitude": 20.9950, "longitude": 85.4200, "name": "Dhenkanal"},
-        {"latitude": 21.0100, "longitude": 85.5100, "name": "Kamakhyanagar"},
-        {"latitude": 20.9800, "longitude": 85.6200, "name": "Parjang"},
-        {"latitude": 20.9500, "longitude": 85.7800, "name": "Hindol Road"},
-        {"latitude": 20.9200, "longitude": 85.8900, "name": "Bhuban"},
-        {"latitude": 20.8950, "longitude": 86.0200, "name": "Jajpur Road"},
-        {"latitude": 20.8739, "longitude": 86.0891, "name": "Chandilkhol Industrial Area"}
-    ]
-    
-    for waypoint in route_waypoints:
-        distance = calculate_distance(
-            vehicle_lat, vehicle_lon,
-            waypoint["latitude"], waypoint["longitude"]
-        )
-        if distance <= max_deviation:
-            return True, waypoint["name"], distance
-    return False, None, float('inf')
+    route = ROUTE_REGISTRY.route_for(vehicle_id)
+    if route is None:
+        return True, None, 0.0  # no route assigned: nothing to deviate from
+    return route.corridor.is_on_route(vehicle_lat, vehicle_lon, max_deviation)
 
 def get_nearest_landmark(lat, lng):
     """Get nearest landmark for location context"""
-    waypoints = [
-        {"latitude": 20.9463, "longitude": 85.2190, "name": "NTPC Talcher"},
-        {"latitude": 20.9520, "longitude": 85.2380, "name": "Talcher Junction"},
-        {"latitude": 20.9680, "longitude": 85.2890, "name": "Boinda"},
-        {"latitude": 20.9850, "longitude": 85.3450, "name": "Dhenkanal Road"},
-        {"latitude": 20.9950, "longitude": 85.4200, "name": "Dhenkanal"},
-        {"latitude": 21.0100, "longitude": 85.5100, "name": "Kamakhyanagar"},
-        {"latitude": 20.9800, "longitude": 85.6200, "name": "Parjang"},
-        {"latitude": 20.9500, "longitude": 85.7800, "name": "Hindol Road"},
-        {"latitude": 20.9200, "longitude": 85.8900, "name": "Bhuban"},
-        {"latitude": 20.8950, "longitude": 86.0200, "name": "Jajpur Road"},
-        {"latitude": 20.8739, "longitude": 86.0891, "name": "Chandilkhol Industrial Area"}
-    ]
-    
-    min_distance = float('inf')
-    nearest = "Unknown location"
-    
-    for waypoint in waypoints:
-        distance = calculate_distance(lat, lng, waypoint["latitude"], waypoint["longitude"])
-        if distance < min_distance:
-            min_distance = distance
-            nearest = waypoint["name"]
-    
-    return nearest
+    nearest = POI_INDEX.nearest(lat, lng, "landmarks")
+    return nearest[0][1]["name"] if nearest else "Unknown location"
 
 # API Routes
 @app.get("/")
@@ -521,6 +528,32 @@ async def acknowledge_critical_incident(incident_id: str):
     
     raise HTTPException(status_code=404, detail="Incident not found")
 
+@app.get("/api/v1/routes")
+async def get_routes():
+    """Get all registered routes and the vehicles assigned to each"""
+    return {
+        "routes": [
+            {**route.to_dict(), "vehicles": ROUTE_REGISTRY.vehicles_on(route.route_id)}
+            for route in ROUTE_REGISTRY
+        ],
+        "count": len(ROUTE_REGISTRY),
+        "default_route_id": ROUTE_REGISTRY.default_route_id
+    }
+
+@app.put("/api/v1/vehicles/{vehicle_id}/route/{route_id}")
+async def assign_vehicle_route(vehicle_id: str, route_id: str):
+    """Assign a vehicle to a registered route"""
+    vehicle = next((v for v in mock_vehicles if v["vehicle_id"] == vehicle_id), None)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if route_id not in ROUTE_REGISTRY:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    ROUTE_REGISTRY.assign(vehicle_id, route_id)
+    ETA_ENGINE.forget(vehicle_id)
+    vehicle["route_id"] = route_id
+    return {"message": f"Vehicle {vehicle_id} assigned to route {route_id}", "route": ROUTE_REGISTRY.get(route_id).to_dict()}
+
 @app.get("/api/v1/cameras/status")
 async def get_camera_status():
     return {
@@ -537,23 +570,34 @@ def generate_mock_camera_image():
 
 def simulate_enhanced_vehicle_movement(vehicle):
     """Enhanced vehicle simulation with gate tracking"""
-    if vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
+    route = ROUTE_REGISTRY.route_for(vehicle["vehicle_id"])
+    if route and vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
         progress = vehicle["route_progress"]
         if progress < 100:
-            base_progress = random.uniform(0.3, 1.5)
-            vehicle["route_progress"] = min(progress + base_progress, 100)
+            # Distance covered at the current speed since the last update
+            elapsed = (datetime.utcnow() - datetime.fromisoformat(vehicle["timestamp"])).total_seconds()
+            travelled = vehicle["speed"] / 3.6 * min(max(elapsed, 0), 60)
             
-            # Update position
-            if vehicle["route_progress"] < 100:
-                # Simulate movement along route
-                vehicle["latitude"] += random.uniform(-0.0001, 0.0001)
-                vehicle["longitude"] += random.uniform(-0.0001, 0.0001)
+            # Simulate movement along route
+            vehicle["latitude"], vehicle["longitude"] = route.corridor.advance(
+                vehicle["latitude"], vehicle["longitude"], travelled
+            )
+            vehicle["latitude"] += random.uniform(-0.0001, 0.0001)
+            vehicle["longitude"] += random.uniform(-0.0001, 0.0001)
     
     # Add realistic variation
     if vehicle["speed"] > 0:
         vehicle["speed"] = max(0, vehicle["speed"] + random.uniform(-8, 8))
         vehicle["fuel_level"] = max(0, vehicle["fuel_level"] - random.uniform(0.1, 0.3))
     
+    # Route progress and destination ETA from where the truck actually is on the route
+    estimate = ETA_ENGINE.update(vehicle["vehicle_id"], vehicle["latitude"], vehicle["longitude"], datetime.utcnow())
+    if estimate:
+        vehicle["route_progress"] = round(estimate["progress"], 1)
+        vehicle["destination_eta"] = estimate["eta"].isoformat()
+    elif route is None:
+        vehicle["destination_eta"] = None
+    
     # Update stop duration
     if vehicle["speed"] == 0:
         last_movement = datetime.fromisoformat(vehicle["last_movement"].replace('Z', '+00:00'))
@@ -569,11 +613,12 @@ def simulate_enhanced_vehicle_movement(vehicle):
             vehicle["route_status"] = "on_route"
     
     # Update route status based on speed
+    speed_limit = SPEED_ZONES.limit_at(vehicle["latitude"], vehicle["longitude"])
     if vehicle["speed"] > 90:
         vehicle["route_status"] = "critical_speed"
-    elif vehicle["speed"] > 80:
+    elif vehicle["speed"] > speed_limit:
         vehicle["route_status"] = "speed_violation"
-    elif vehicle["route_status"] in ["critical_speed", "speed_violation"] and vehicle["speed"] <= 80:
+    elif vehicle["route_status"] in ["critical_speed", "speed_violation"] and vehicle["speed"] <= speed_limit:
         vehicle["route_status"] = "on_route"
     
     vehicle["timestamp"] = datetime.utcnow().isoformat()
@@ -3,12 +3,14 @@ import json
 import logging
 from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 import random
 import math
+import os
+from app.geo import EtaEngine, RouteRegistry, SpeedZoneMap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -87,6 +89,23 @@ ROUTE_WAYPOINTS = [
     {"latitude": 40.7831, "longitude": -73.9712, "name": "Destination Site"}
 ]
 
+# Routes compiled once (and cached on disk) for O(1) on-route checks and route
+# progress. The built-in lane is the default for vehicles without an assignment;
+# more lanes are loaded from GeoJSON/GPX files in ROUTES_DIR.
+ROUTE_REGISTRY = RouteRegistry(cache_dir=os.getenv("ROUTE_CACHE_DIR", ".route_cache"), corridor_width=200)
+ROUTE_REGISTRY.register(
+    "stockyard-destination", ROUTE_WAYPOINTS, name="Plant Stockyard to Destination Site",
+    plant=PLANT_STOCKYARD, destination=DESTINATION, default=True
+)
+if os.getenv("ROUTES_DIR"):
+    ROUTE_REGISTRY.load_directory(os.getenv("ROUTES_DIR"))
+
+# Destination ETAs from segment speeds learned as the trucks move
+ETA_ENGINE = EtaEngine(ROUTE_REGISTRY)
+
+# Speed zones: no local restrictions on this route yet, 80 km/h throughout
+SPEED_ZONES = SpeedZoneMap(reference_latitude=ROUTE_WAYPOINTS[0]["latitude"], default_limit=80)
+
 # Mock data with enhanced tracking
 mock_vehicles = [
     {
@@ -148,6 +167,11 @@ mock_vehicles = [
     }
 ]
 
+# Assign every vehicle to its route (the default lane unless it names one)
+for vehicle in mock_vehicles:
+    vehicle.setdefault("route_id", ROUTE_REGISTRY.default_route_id)
+    ROUTE_REGISTRY.assign(vehicle["vehicle_id"], vehicle["route_id"])
+
 # Alert storage
 active_alerts = []
 
@@ -167,16 +191,12 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return R * c
 
-def is_on_route(vehicle_lat, vehicle_lon, max_deviation=200):
+def is_on_route(vehicle_lat, vehicle_lon, max_deviation=200, vehicle_id=None):
     """Check if vehicle is within acceptable distance from route"""
-    for waypoint in ROUTE_WAYPOINTS:
-        distance = calculate_distance(
-            vehicle_lat, vehicle_lon,
-            waypoint["latitude"], waypoint["longitude"]
-        )
-        if distance <= max_deviation:
-            return True
-    return False
+    route = ROUTE_REGISTRY.route_for(vehicle_id)
+    if route is None:
+        return True  # no route assigned: nothing to deviate from
+    return route.corridor.is_on_route(vehicle_lat, vehicle_lon, max_deviation)[0]
 
 def check_for_alerts(vehicle):
     """Check vehicle for various alert conditions"""
@@ -195,7 +215,7 @@ def check_for_alerts(vehicle):
         })
     
     # Check for route deviation
-    if not is_on_route(vehicle["latitude"], vehicle["longitude"]):
+    if not is_on_route(vehicle["latitude"], vehicle["longitude"], vehicle_id=vehicle["vehicle_id"]):
         alerts.append({
             "id": f"deviation_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
@@ -206,13 +226,14 @@ def check_for_alerts(vehicle):
             "status": "active"
         })
     
-    # Check for speed violations (>80 km/h)
-    if vehicle["speed"] > 80:
+    # Check for speed violations against the local limit
+    speed_limit = SPEED_ZONES.limit_at(vehicle["latitude"], vehicle["longitude"])
+    if vehicle["speed"] > speed_limit:
         alerts.append({
             "id": f"speed_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
             "alert_type": "speed_violation",
-            "message": f"Vehicle {vehicle['vehicle_id']} exceeding speed limit: {vehicle['speed']:.1f} km/h",
+            "message": f"Vehicle {vehicle['vehicle_id']} exceeding speed limit: {vehicle['speed']:.1f} km/h (Limit: {speed_limit})",
             "severity": "medium",
             "timestamp": datetime.utcnow().isoformat(),
             "status": "active"
@@ -222,27 +243,18 @@ def check_for_alerts(vehicle):
 
 def simulate_vehicle_movement(vehicle):
     """Simulate realistic vehicle movement along route"""
+    route = ROUTE_REGISTRY.route_for(vehicle["vehicle_id"])
     # Simulate movement for vehicles that are "on_route"
-    if vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
-        # Move vehicle slightly along route
+    if route and vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
+        # Move vehicle along route
         progress = vehicle["route_progress"]
         if progress < 100:
-            # Simple linear interpolation between waypoints
-            progress += random.uniform(0.5, 2.0)  # Progress 0.5-2% per update
-            vehicle["route_progress"] = min(progress, 100)
-            
-            # Calculate position based on progress
-            waypoint_index = int(progress / 20)  # 5 waypoints, 20% each
-            if waypoint_index < len(ROUTE_WAYPOINTS) - 1:
-                start_point = ROUTE_WAYPOINTS[waypoint_index]
-                end_point = ROUTE_WAYPOINTS[waypoint_index + 1]
-                
-                # Interpolate position
-                local_progress = (progress % 20) / 20
-                vehicle["latitude"] = (start_point["latitude"] + 
-                                    (end_point["latitude"] - start_point["latitude"]) * local_progress)
-                vehicle["longitude"] = (start_point["longitude"] + 
-                                      (end_point["longitude"] - start_point["longitude"]) * local_progress)
+            # Distance covered at the current speed since the last update
+            elapsed = (datetime.utcnow() - datetime.fromisoformat(vehicle["timestamp"])).total_seconds()
+            travelled = vehicle["speed"] / 3.6 * min(max(elapsed, 0), 60)
+            vehicle["latitude"], vehicle["longitude"] = route.corridor.advance(
+                vehicle["latitude"], vehicle["longitude"], travelled
+            )
     
     # Add some random variation
     if vehicle["speed"] > 0:
@@ -250,6 +262,14 @@ def simulate_vehicle_movement(vehicle):
         vehicle["longitude"] += random.uniform(-0.0002, 0.0002)
         vehicle["speed"] = max(0, vehicle["speed"] + random.uniform(-5, 5))
     
+    # Route progress and destination ETA from where the vehicle actually is on the route
+    estimate = ETA_ENGINE.update(vehicle["vehicle_id"], vehicle["latitude"], vehicle["longitude"], datetime.utcnow())
+    if estimate:
+        vehicle["route_progress"] = round(estimate["progress"], 1)
+        vehicle["destination_eta"] = estimate["eta"].isoformat()
+    elif route is None:
+        vehicle["destination_eta"] = None
+    
     # Update stop duration
     if vehicle["speed"] == 0:
         last_movement = datetime.fromisoformat(vehicle["last_movement"].replace('Z', '+00:00'))
@@ -328,6 +348,32 @@ async def get_route_info():
         "estimated_time_minutes": 45
     }
 
+@app.get("/api/v1/routes")
+async def get_routes():
+    """Get all registered routes and the vehicles assigned to each"""
+    return {
+        "routes": [
+            {**route.to_dict(), "vehicles": ROUTE_REGISTRY.vehicles_on(route.route_id)}
+            for route in ROUTE_REGISTRY
+        ],
+        "count": len(ROUTE_REGISTRY),
+        "default_route_id": ROUTE_REGISTRY.default_route_id
+    }
+
+@app.put("/api/v1/vehicles/{vehicle_id}/route/{route_id}")
+async def assign_vehicle_route(vehicle_id: str, route_id: str):
+    """Assign a vehicle to a registered route"""
+    vehicle = next((v for v in mock_vehicles if v["vehicle_id"] == vehicle_id), None)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if route_id not in ROUTE_REGISTRY:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    ROUTE_REGISTRY.assign(vehicle_id, route_id)
+    ETA_ENGINE.forget(vehicle_id)
+    vehicle["route_id"] = route_id
+    return {"message": f"Vehicle {vehicle_id} assigned to route {route_id}", "route": ROUTE_REGISTRY.get(route_id).to_dict()}
+
 @app.get("/api/v1/alerts/")
 async def get_alerts(status: str = "active"):
     filtered_alerts = [a for a in active_alerts if a["status"] == status]
@@ -352,15 +398,16 @@ async def get_vehicle_status(vehicle_id: str):
         return {"error": "Vehicle not found"}, 404
     
     # Calculate additional status info
+    route = ROUTE_REGISTRY.route_for(vehicle_id)
     distance_to_destination = calculate_distance(
         vehicle["latitude"], vehicle["longitude"],
-        DESTINATION["latitude"], DESTINATION["longitude"]
-    )
+        route.destination["latitude"], route.destination["longitude"]
+    ) if route else None
     
     return {
         **vehicle,
         "distance_to_destination_m": distance_to_destination,
-        "is_on_route": is_on_route(vehicle["latitude"], vehicle["longitude"]),
+        "is_on_route": is_on_route(vehicle["latitude"], vehicle["longitude"], vehicle_id=vehicle["vehicle_id"]),
         "alerts": [a for a in active_alerts if a["vehicle_id"] == vehicle_id and a["status"] == "active"]
     }
 
@@ -11,6 +11,8 @@ import random
 import math
 import requests
 import base64
+import os
+from app.geo import EtaEngine, PoiIndex, RouteRegistry, SpeedZoneMap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -162,6 +164,20 @@ ROUTE_WAYPOINTS = [
     {"latitude": 20.8739, "longitude": 86.0891, "name": "Chandilkhol Industrial Area", "speed_limit": 40}
 ]
 
+# Routes compiled once (and cached on disk) for O(1) on-route checks and route
+# progress. The built-in lane is the default for vehicles without an assignment;
+# more lanes are loaded from GeoJSON/GPX files in ROUTES_DIR.
+ROUTE_REGISTRY = RouteRegistry(cache_dir=os.getenv("ROUTE_CACHE_DIR", ".route_cache"), corridor_width=500)
+ROUTE_REGISTRY.register(
+    "talcher-chandilkhol", ROUTE_WAYPOINTS, name="NTPC Talcher to Chandilkhol",
+    plant=PLANT_STOCKYARD, destination=DESTINATION, default=True
+)
+if os.getenv("ROUTES_DIR"):
+    ROUTE_REGISTRY.load_directory(os.getenv("ROUTES_DIR"))
+
+# Destination ETAs from segment speeds learned as the trucks move
+ETA_ENGINE = EtaEngine(ROUTE_REGISTRY)
+
 # Enhanced mock vehicles - ALL 13 heavy coal transport trucks
 mock_vehicles = [
     {
@@ -353,6 +369,11 @@ mock_vehicles = [
     }
 ]
 
+# Assign every vehicle to its route (the default lane unless it names one)
+for vehicle in mock_vehicles:
+    vehicle.setdefault("route_id", ROUTE_REGISTRY.default_route_id)
+    ROUTE_REGISTRY.assign(vehicle["vehicle_id"], vehicle["route_id"])
+
 # Gas Stations along the route
 GAS_STATIONS = [
     {"id": "HP_TALCHER", "name": "HP Petrol Pump", "latitude": 20.9500, "longitude": 85.2300, "brand": "HP", "services": ["Fuel", "Air", "Water"]},
@@ -371,6 +392,20 @@ TOLL_GATES = [
     {"id": "JAJPUR_TOLL", "name": "Jajpur Road Toll Plaza", "latitude": 20.8920, "longitude": 86.0050, "fee_heavy": 85, "operator": "NHAI"}
 ]
 
+# Nearest-POI lookups for landmarks, gas stations and toll gates
+POI_INDEX = PoiIndex()
+POI_INDEX.add_layer("landmarks", [w for route in ROUTE_REGISTRY for w in route.landmarks])
+POI_INDEX.add_layer("gas_stations", GAS_STATIONS)
+POI_INDEX.add_layer("toll_gates", TOLL_GATES)
+
+# Speed zones compiled once: per-waypoint limits along each route corridor,
+# 40 km/h within 2km of toll gates and 80 km/h everywhere else
+SPEED_ZONES = SpeedZoneMap(reference_latitude=ROUTE_WAYPOINTS[0]["latitude"], default_limit=80)
+for route in ROUTE_REGISTRY:
+    SPEED_ZONES.add_route(route.corridor, [w.get("speed_limit") for w in route.waypoints])
+for toll in TOLL_GATES:
+    SPEED_ZONES.add_circle(toll["latitude"], toll["longitude"], 2000, 40)
+
 # Activity log storage
 activity_log = []
 
@@ -592,7 +627,7 @@ def check_critical_incidents_with_pagerduty(vehicle):
         incidents.append(incident)
     
     # Route deviation for extended period (>30 minutes) - triggers PagerDuty
-    if not is_on_route(vehicle["latitude"], vehicle["longitude"])[0] and vehicle["stop_duration"] > 30:
+    if not is_on_route(vehicle["latitude"], vehicle["longitude"], vehicle_id=vehicle["vehicle_id"])[0] and vehicle["stop_duration"] > 30:
         incident = {
             "id": f"PD_CRITICAL_DEVIATION_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
@@ -630,29 +665,17 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return R * c
 
-def is_on_route(vehicle_lat, vehicle_lon, max_deviation=500):
+def is_on_route(vehicle_lat, vehicle_lon, max_deviation=500, vehicle_id=None):
     """Check if vehicle is on route"""
-    for waypoint in ROUTE_WAYPOINTS:
-        distance = calculate_distance(
-            vehicle_lat, vehicle_lon,
-            waypoint["latitude"], waypoint["longitude"]
-        )
-        if distance <= max_deviation:
-            return True, waypoint["name"], distance
-    return False, None, float('inf')
+    route = ROUTE_REGISTRY.route_for(vehicle_id)
+    if route is None:
+        return True, None, 0.0  # no route assigned: nothing to deviate from
+    return route.corridor.is_on_route(vehicle_lat, vehicle_lon, max_deviation)
 
 def get_nearest_landmark(lat, lng):
     """Get nearest landmark for location context"""
-    min_distance = float('inf')
-    nearest = "Unknown location"
-    
-    for waypoint in ROUTE_WAYPOINTS:
-        distance = calculate_distance(lat, lng, waypoint["latitude"], waypoint["longitude"])
-        if distance < min_distance:
-            min_distance = distance
-            nearest = waypoint["name"]
-    
-    return nearest
+    nearest = POI_INDEX.nearest(lat, lng, "landmarks")
+    return nearest[0][1]["name"] if nearest else "Unknown location"
 
 # API Routes
 @app.get("/")
@@ -804,6 +827,32 @@ async def get_escalation_status():
         "current_incidents": len([i for i in pagerduty_incidents if not i.get("acknowledged", False)])
     }
 
+@app.get("/api/v1/routes")
+async def get_routes():
+    """Get all registered routes and the vehicles assigned to each"""
+    return {
+        "routes": [
+            {**route.to_dict(), "vehicles": ROUTE_REGISTRY.vehicles_on(route.route_id)}
+            for route in ROUTE_REGISTRY
+        ],
+        "count": len(ROUTE_REGISTRY),
+        "default_route_id": ROUTE_REGISTRY.default_route_id
+    }
+
+@app.put("/api/v1/vehicles/{vehicle_id}/route/{route_id}")
+async def assign_vehicle_route(vehicle_id: str, route_id: str):
+    """Assign a vehicle to a registered route"""
+    vehicle = next((v for v in mock_vehicles if v["vehicle_id"] == vehicle_id), None)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if route_id not in ROUTE_REGISTRY:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    ROUTE_REGISTRY.assign(vehicle_id, route_id)
+    ETA_ENGINE.forget(vehicle_id)
+    vehicle["route_id"] = route_id
+    return {"message": f"Vehicle {vehicle_id} assigned to route {route_id}", "route": ROUTE_REGISTRY.get(route_id).to_dict()}
+
 @app.get("/api/v1/cameras/status")
 async def get_camera_status():
     """Get smart camera system status"""
@@ -865,6 +914,31 @@ async def get_toll_gates():
         "total_fee_heavy": sum(tg["fee_heavy"] for tg in TOLL_GATES)
     }
 
+@app.get("/api/v1/pois/nearby")
+async def get_nearby_pois(lat: float, lng: float, radius: Optional[float] = None, k: Optional[int] = None,
+                          layer: Optional[str] = None):
+    """Get landmarks, gas stations and toll gates within a radius (meters) and/or the k nearest"""
+    if radius is None and k is None:
+        raise HTTPException(status_code=400, detail="radius or k is required")
+    layers = [layer] if layer else POI_INDEX.layers
+    if layer and layer not in POI_INDEX.layers:
+        raise HTTPException(status_code=404, detail="Unknown POI layer")
+    
+    if k is not None:
+        results = [
+            (distance, name, poi)
+            for name in layers
+            for distance, poi in POI_INDEX.nearest(lat, lng, name, k=k, max_distance=radius)
+        ]
+        results = sorted(results, key=lambda result: result[0])[:k]
+    else:
+        results = POI_INDEX.within(lat, lng, radius, layers)
+    
+    return {
+        "pois": [{**poi, "layer": name, "distance_km": round(distance / 1000, 2)} for distance, name, poi in results],
+        "count": len(results)
+    }
+
 @app.get("/api/v1/activity-log")
 async def get_activity_log():
     """Get real-time activity log"""
@@ -884,23 +958,17 @@ async def get_fuel_recommendations(vehicle_id: str):
     if vehicle["fuel_level"] > 30:
         return {"message": "Vehicle has sufficient fuel", "fuel_level": vehicle["fuel_level"]}
     
-    # Find nearest gas stations
-    vehicle_lat, vehicle_lng = vehicle["latitude"], vehicle["longitude"]
-    nearest_stations = []
-    
-    for station in GAS_STATIONS:
-        distance = calculate_distance(vehicle_lat, vehicle_lng, station["latitude"], station["longitude"])
-        station_with_distance = {**station, "distance_km": round(distance / 1000, 1)}
-        nearest_stations.append(station_with_distance)
-    
-    # Sort by distance and take top 3
-    nearest_stations.sort(key=lambda x: x["distance_km"])
+    # Find the 3 nearest gas stations
+    nearest_stations = [
+        {**station, "distance_km": round(distance / 1000, 1)}
+        for distance, station in POI_INDEX.nearest(vehicle["latitude"], vehicle["longitude"], "gas_stations", k=3)
+    ]
     
     return {
         "vehicle_id": vehicle_id,
         "current_fuel": vehicle["fuel_level"],
         "status": "LOW_FUEL_ALERT" if vehicle["fuel_level"] < 15 else "FUEL_ADVISORY",
-        "recommended_stations": nearest_stations[:3],
+        "recommended_stations": nearest_stations,
         "total_stations_available": len(GAS_STATIONS)
     }
 
@@ -930,26 +998,38 @@ def log_activity(vehicle_id, activity_type, message, severity="info"):
 
 def simulate_enhanced_vehicle_movement(vehicle):
     """Enhanced vehicle simulation with realistic behavior and activity logging"""
+    route = ROUTE_REGISTRY.route_for(vehicle["vehicle_id"])
     old_status = vehicle["route_status"]
     old_speed = vehicle["speed"]
     old_fuel = vehicle["fuel_level"]
     
-    if vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
+    if route and vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
         progress = vehicle["route_progress"]
         if progress < 100:
-            base_progress = random.uniform(0.3, 1.5)
-            vehicle["route_progress"] = min(progress + base_progress, 100)
+            # Distance covered at the current speed since the last update
+            elapsed = (datetime.utcnow() - datetime.fromisoformat(vehicle["timestamp"])).total_seconds()
+            travelled = vehicle["speed"] / 3.6 * min(max(elapsed, 0), 60)
             
             # Update position along route
-            if vehicle["route_progress"] < 100:
-                vehicle["latitude"] += random.uniform(-0.0001, 0.0001)
-                vehicle["longitude"] += random.uniform(-0.0001, 0.0001)
+            vehicle["latitude"], vehicle["longitude"] = route.corridor.advance(
+                vehicle["latitude"], vehicle["longitude"], travelled
+            )
+            vehicle["latitude"] += random.uniform(-0.0001, 0.0001)
+            vehicle["longitude"] += random.uniform(-0.0001, 0.0001)
     
     # Add realistic variation
     if vehicle["speed"] > 0:
         vehicle["speed"] = max(0, vehicle["speed"] + random.uniform(-8, 8))
         vehicle["fuel_level"] = max(0, vehicle["fuel_level"] - random.uniform(0.1, 0.3))
     
+    # Route progress and destination ETA from where the truck actually is on the route
+    estimate = ETA_ENGINE.update(vehicle["vehicle_id"], vehicle["latitude"], vehicle["longitude"], datetime.utcnow())
+    if estimate:
+        vehicle["route_progress"] = round(estimate["progress"], 1)
+        vehicle["destination_eta"] = estimate["eta"].isoformat()
+    elif route is None:
+        vehicle["destination_eta"] = None
+    
     # Update stop duration and status
     if vehicle["speed"] == 0:
         last_movement = datetime.fromisoformat(vehicle["last_movement"].replace('Z', '+00:00'))
@@ -964,11 +1044,12 @@ def simulate_enhanced_vehicle_movement(vehicle):
             vehicle["route_status"] = "on_route"
     
     # Update route status based on speed
+    speed_limit = SPEED_ZONES.limit_at(vehicle["latitude"], vehicle["longitude"])
     if vehicle["speed"] > 90:
         vehicle["route_status"] = "critical_speed"
-    elif vehicle["speed"] > 80:
+    elif vehicle["speed"] > speed_limit:
         vehicle["route_status"] = "speed_violation"
-    elif vehicle["route_status"] in ["critical_speed", "speed_violation"] and vehicle["speed"] <= 80:
+    elif vehicle["route_status"] in ["critical_speed", "speed_violation"] and vehicle["speed"] <= speed_limit:
         vehicle["route_status"] = "on_route"
     
     # Log significant changes
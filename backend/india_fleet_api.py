@@ -3,13 +3,15 @@ import json
 import logging
 from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 import random
 import math
+import os
 import requests
+from app.geo import EtaEngine, PoiIndex, RouteRegistry, SpeedZoneMap
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -62,6 +64,20 @@ ROUTE_WAYPOINTS = [
     {"latitude": 20.8739, "longitude": 86.0891, "name": "Chandilkhol Industrial Area"}
 ]
 
+# Routes compiled once (and cached on disk) for O(1) on-route checks and route
+# progress. The built-in lane is the default for vehicles without an assignment;
+# more lanes are loaded from GeoJSON/GPX files in ROUTES_DIR.
+ROUTE_REGISTRY = RouteRegistry(cache_dir=os.getenv("ROUTE_CACHE_DIR", ".route_cache"), corridor_width=500)
+ROUTE_REGISTRY.register(
+    "talcher-chandilkhol", ROUTE_WAYPOINTS, name="NTPC Talcher to Chandilkhol",
+    plant=PLANT_STOCKYARD, destination=DESTINATION, default=True
+)
+if os.getenv("ROUTES_DIR"):
+    ROUTE_REGISTRY.load_directory(os.getenv("ROUTES_DIR"))
+
+# Destination ETAs from segment speeds learned as the trucks move
+ETA_ENGINE = EtaEngine(ROUTE_REGISTRY)
+
 # Points of Interest (Gas Stations, Toll Gates)
 POIS = [
     {"type": "gas_station", "name": "HP Petrol Pump Talcher", "latitude": 20.9480, "longitude": 85.2250},
@@ -76,6 +92,23 @@ POIS = [
     {"type": "gas_station", "name": "HP Petrol Pump Chandilkhol", "latitude": 20.8760, "longitude": 86.0870}
 ]
 
+# Nearest-POI lookups for landmarks, gas stations and toll gates
+POI_INDEX = PoiIndex()
+POI_INDEX.add_layer("landmarks", [w for route in ROUTE_REGISTRY for w in route.landmarks])
+POI_INDEX.add_layer("gas_stations", [poi for poi in POIS if poi["type"] == "gas_station"])
+POI_INDEX.add_layer("toll_gates", [poi for poi in POIS if poi["type"] == "toll_gate"])
+
+# Speed zones compiled once: NH16 and major highways 80 km/h for trucks,
+# city areas 50 km/h, within 2km of toll gates 40 km/h
+CITY_WAYPOINTS = ["NTPC Talcher", "Dhenkanal", "Chandilkhol Industrial Area"]
+SPEED_ZONES = SpeedZoneMap(reference_latitude=ROUTE_WAYPOINTS[0]["latitude"], default_limit=80)
+for poi in POIS:
+    if poi["type"] == "toll_gate":
+        SPEED_ZONES.add_circle(poi["latitude"], poi["longitude"], 2000, 40)
+for waypoint in ROUTE_WAYPOINTS:
+    if waypoint["name"] in CITY_WAYPOINTS:
+        SPEED_ZONES.add_circle(waypoint["latitude"], waypoint["longitude"], 5000, 50)
+
 # Enhanced mock vehicles - 13 trucks total
 mock_vehicles = [
     {
@@ -184,6 +217,11 @@ mock_vehicles = [
     }
 ]
 
+# Assign every vehicle to its route (the default lane unless it names one)
+for vehicle in mock_vehicles:
+    vehicle.setdefault("route_id", ROUTE_REGISTRY.default_route_id)
+    ROUTE_REGISTRY.assign(vehicle["vehicle_id"], vehicle["route_id"])
+
 # Alert storage and stakeholder contacts
 active_alerts = []
 stakeholder_contacts = [
@@ -209,42 +247,21 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return R * c
 
-def is_on_route(vehicle_lat, vehicle_lon, max_deviation=500):
+def is_on_route(vehicle_lat, vehicle_lon, max_deviation=500, vehicle_id=None):
     """Enhanced route checking with better tolerance for Indian roads"""
-    for i, waypoint in enumerate(ROUTE_WAYPOINTS):
-        distance = calculate_distance(
-            vehicle_lat, vehicle_lon,
-            waypoint["latitude"], waypoint["longitude"]
-        )
-        if distance <= max_deviation:
-            return True, waypoint["name"], distance
-    return False, None, float('inf')
+    route = ROUTE_REGISTRY.route_for(vehicle_id)
+    if route is None:
+        return True, None, 0.0  # no route assigned: nothing to deviate from
+    return route.corridor.is_on_route(vehicle_lat, vehicle_lon, max_deviation)
 
 def get_speed_limit_for_location(latitude, longitude):
-    """Get speed limit based on location (highway vs city)"""
-    # NH16 and major highways: 80 km/h for trucks
-    # City areas: 50 km/h
-    # Near toll gates/intersections: 40 km/h
-    
-    for poi in POIS:
-        if poi["type"] == "toll_gate":
-            distance = calculate_distance(latitude, longitude, poi["latitude"], poi["longitude"])
-            if distance < 2000:  # Within 2km of toll gate
-                return 40
-    
-    # Check if in city area (near major waypoints)
-    city_waypoints = ["NTPC Talcher", "Dhenkanal", "Chandilkhol Industrial Area"]
-    for waypoint in ROUTE_WAYPOINTS:
-        if waypoint["name"] in city_waypoints:
-            distance = calculate_distance(latitude, longitude, waypoint["latitude"], waypoint["longitude"])
-            if distance < 5000:  # Within 5km of city
-                return 50
-    
-    return 80  # Highway speed limit
+    """Get speed limit based on location (highway vs city vs toll gate)"""
+    return SPEED_ZONES.limit_at(latitude, longitude)
 
 def check_enhanced_alerts(vehicle):
     """Enhanced alert system with detailed categorization"""
     alerts = []
+    landmark = get_nearest_landmark(vehicle["latitude"], vehicle["longitude"])
     
     # Extended stop alert (>30 minutes)
     if vehicle["speed"] == 0 and vehicle["stop_duration"] > 30:
@@ -253,7 +270,7 @@ def check_enhanced_alerts(vehicle):
             "id": f"extended_stop_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
             "alert_type": "extended_stop",
-            "message": f"Vehicle {vehicle['vehicle_id']} stopped for {vehicle['stop_duration']} minutes at {get_nearest_landmark(vehicle['latitude'], vehicle['longitude'])}",
+            "message": f"Vehicle {vehicle['vehicle_id']} stopped for {vehicle['stop_duration']} minutes at {landmark}",
             "severity": severity,
             "timestamp": datetime.utcnow().isoformat(),
             "status": "active",
@@ -262,13 +279,13 @@ def check_enhanced_alerts(vehicle):
         })
     
     # Route deviation alert
-    on_route, nearest_waypoint, deviation_distance = is_on_route(vehicle["latitude"], vehicle["longitude"])
+    on_route, nearest_waypoint, deviation_distance = is_on_route(vehicle["latitude"], vehicle["longitude"], vehicle_id=vehicle["vehicle_id"])
     if not on_route and vehicle["route_status"] != "loading" and vehicle["route_status"] != "arrived":
         alerts.append({
             "id": f"route_deviation_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
             "alert_type": "route_deviation",
-            "message": f"Vehicle {vehicle['vehicle_id']} deviated {deviation_distance:.0f}m from route near {get_nearest_landmark(vehicle['latitude'], vehicle['longitude'])}",
+            "message": f"Vehicle {vehicle['vehicle_id']} deviated {deviation_distance:.0f}m from route near {landmark}",
             "severity": "high",
             "timestamp": datetime.utcnow().isoformat(),
             "status": "active",
@@ -285,7 +302,7 @@ def check_enhanced_alerts(vehicle):
             "id": f"speed_violation_{vehicle['vehicle_id']}_{int(datetime.utcnow().timestamp())}",
             "vehicle_id": vehicle["vehicle_id"],
             "alert_type": "speed_violation",
-            "message": f"Vehicle {vehicle['vehicle_id']} exceeding speed limit by {excess_speed:.1f} km/h (Current: {vehicle['speed']:.1f}, Limit: {speed_limit}) near {get_nearest_landmark(vehicle['latitude'], vehicle['longitude'])}",
+            "message": f"Vehicle {vehicle['vehicle_id']} exceeding speed limit by {excess_speed:.1f} km/h (Current: {vehicle['speed']:.1f}, Limit: {speed_limit}) near {landmark}",
             "severity": severity,
             "timestamp": datetime.utcnow().isoformat(),
             "status": "active",
@@ -313,64 +330,36 @@ def check_enhanced_alerts(vehicle):
 
 def get_nearest_landmark(lat, lng):
     """Get nearest landmark for location context"""
-    min_distance = float('inf')
-    nearest = "Unknown location"
-    
-    for waypoint in ROUTE_WAYPOINTS:
-        distance = calculate_distance(lat, lng, waypoint["latitude"], waypoint["longitude"])
-        if distance < min_distance:
-            min_distance = distance
-            nearest = waypoint["name"]
-    
-    return nearest
+    nearest = POI_INDEX.nearest(lat, lng, "landmarks")
+    return nearest[0][1]["name"] if nearest else "Unknown location"
 
 def get_nearest_gas_station(lat, lng):
     """Find nearest gas station"""
-    min_distance = float('inf')
-    nearest = None
-    
-    for poi in POIS:
-        if poi["type"] == "gas_station":
-            distance = calculate_distance(lat, lng, poi["latitude"], poi["longitude"]) / 1000  # Convert to km
-            if distance < min_distance:
-                min_distance = distance
-                nearest = {"name": poi["name"], "distance": distance}
-    
-    return nearest or {"name": "No gas station found", "distance": 0}
+    nearest = POI_INDEX.nearest(lat, lng, "gas_stations")
+    if not nearest:
+        return {"name": "No gas station found", "distance": 0}
+    distance, poi = nearest[0]
+    return {"name": poi["name"], "distance": distance / 1000}  # Convert to km
 
 def simulate_enhanced_vehicle_movement(vehicle):
     """Enhanced vehicle simulation with realistic Indian road conditions"""
-    if vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
+    route = ROUTE_REGISTRY.route_for(vehicle["vehicle_id"])
+    if route and vehicle["route_status"] == "on_route" and vehicle["speed"] > 0:
         # Simulate progress along route
         progress = vehicle["route_progress"]
         if progress < 100:
-            # Account for traffic, road conditions, etc.
-            base_progress = random.uniform(0.3, 1.5)
+            # Distance covered at the current speed since the last update
+            elapsed = (datetime.utcnow() - datetime.fromisoformat(vehicle["timestamp"])).total_seconds()
+            travelled = vehicle["speed"] / 3.6 * min(max(elapsed, 0), 60)
             
             # Reduce progress near toll gates (traffic slowdown)
-            for poi in POIS:
-                if poi["type"] == "toll_gate":
-                    distance = calculate_distance(vehicle["latitude"], vehicle["longitude"], poi["latitude"], poi["longitude"])
-                    if distance < 3000:  # Within 3km of toll gate
-                        base_progress *= 0.5
-            
-            vehicle["route_progress"] = min(progress + base_progress, 100)
+            for _ in POI_INDEX.within(vehicle["latitude"], vehicle["longitude"], 3000, ["toll_gates"]):
+                travelled *= 0.5  # Within 3km of toll gate
             
             # Update position along route
-            if vehicle["route_progress"] < 100:
-                total_waypoints = len(ROUTE_WAYPOINTS) - 1
-                current_segment = int((vehicle["route_progress"] / 100) * total_waypoints)
-                current_segment = min(current_segment, total_waypoints - 1)
-                
-                start_point = ROUTE_WAYPOINTS[current_segment]
-                end_point = ROUTE_WAYPOINTS[current_segment + 1]
-                
-                segment_progress = ((vehicle["route_progress"] / 100) * total_waypoints) - current_segment
-                
-                vehicle["latitude"] = (start_point["latitude"] + 
-                                    (end_point["latitude"] - start_point["latitude"]) * segment_progress)
-                vehicle["longitude"] = (start_point["longitude"] + 
-                                      (end_point["longitude"] - start_point["longitude"]) * segment_progress)
+            vehicle["latitude"], vehicle["longitude"] = route.corridor.advance(
+                vehicle["latitude"], vehicle["longitude"], travelled
+            )
     
     # Add realistic variation
     if vehicle["speed"] > 0:
@@ -379,6 +368,14 @@ def simulate_enhanced_vehicle_movement(vehicle):
         vehicle["speed"] = max(0, vehicle["speed"] + random.uniform(-8, 8))
         vehicle["fuel_level"] = max(0, vehicle["fuel_level"] - random.uniform(0.1, 0.3))
     
+    # Route progress and destination ETA from where the truck actually is on the route
+    estimate = ETA_ENGINE.update(vehicle["vehicle_id"], vehicle["latitude"], vehicle["longitude"], datetime.utcnow())
+    if estimate:
+        vehicle["route_progress"] = round(estimate["progress"], 1)
+        vehicle["destination_eta"] = estimate["eta"].isoformat()
+    elif route is None:
+        vehicle["destination_eta"] = None
+    
     # Update stop duration and movement
     if vehicle["speed"] == 0:
         last_movement = datetime.fromisoformat(vehicle["last_movement"].replace('Z', '+00:00'))
@@ -480,6 +477,32 @@ async def get_route_info():
         "route_description": "NTPC Talcher to Chandilkhol via NH16 and SH9A"
     }
 
+@app.get("/api/v1/routes")
+async def get_routes():
+    """Get all registered routes and the vehicles assigned to each"""
+    return {
+        "routes": [
+            {**route.to_dict(), "vehicles": ROUTE_REGISTRY.vehicles_on(route.route_id)}
+            for route in ROUTE_REGISTRY
+        ],
+        "count": len(ROUTE_REGISTRY),
+        "default_route_id": ROUTE_REGISTRY.default_route_id
+    }
+
+@app.put("/api/v1/vehicles/{vehicle_id}/route/{route_id}")
+async def assign_vehicle_route(vehicle_id: str, route_id: str):
+    """Assign a vehicle to a registered route"""
+    vehicle = next((v for v in mock_vehicles if v["vehicle_id"] == vehicle_id), None)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehicle not found")
+    if route_id not in ROUTE_REGISTRY:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    ROUTE_REGISTRY.assign(vehicle_id, route_id)
+    ETA_ENGINE.forget(vehicle_id)
+    vehicle["route_id"] = route_id
+    return {"message": f"Vehicle {vehicle_id} assigned to route {route_id}", "route": ROUTE_REGISTRY.get(route_id).to_dict()}
+
 @app.get("/api/v1/alerts/")
 async def get_alerts(status: str = "active"):
     filtered_alerts = [a for a in active_alerts if a["status"] == status]